@@ -0,0 +1,652 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Benchmarks du pipeline de capture
+Mesure le coût par paquet des étapes critiques, sans privilèges ni réseau (sauf `capture`, qui écoute lo)
+
+Chaque commande accepte --output pour écrire des résultats JSON (avec le
+commit courant) ; `compare` met deux fichiers de résultats côte à côte.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import websockets
+from scapy.all import Ether, IP, TCP, UDP, ICMP, Raw, PcapReader, wrpcap
+
+from sentinel_capture import NetworkFeatureExtractor, SentinelPacketCapture
+from sentinel_decode import decode_packet
+from sentinel_forest import CompiledForest
+from sentinel_model import predict_proba
+from sentinel_shards import FeatureShards
+from sentinel_wire import decode_columnar_frame, encode_columnar_frame, encode_json_frame, strip_features
+
+SERVICES = ['http', 'https', 'ssh', 'domain', 'smtp', 'other']
+
+
+def _host_ip(index: int) -> str:
+    return f"10.{(index >> 16) & 0xff}.{(index >> 8) & 0xff}.{index & 0xff}"
+
+
+def synthetic_packets(count: int, hosts: int = 50, seed: int = 42) -> List[Any]:
+    """Trafic synthétique : mélange TCP/UDP/ICMP entre `hosts` hôtes, avec payloads"""
+    rng = random.Random(seed)
+    packets = []
+    for _ in range(count):
+        ip = IP(src=_host_ip(rng.randrange(hosts)), dst=_host_ip(hosts + rng.randrange(max(1, hosts // 5))))
+        kind = rng.random()
+        if kind < 0.7:
+            layer = TCP(sport=rng.randrange(1024, 65535), dport=rng.choice([22, 80, 443, 8080]),
+                        flags=rng.choice(['S', 'SA', 'A', 'PA', 'FA', 'R']))
+        elif kind < 0.95:
+            layer = UDP(sport=rng.randrange(1024, 65535), dport=rng.choice([53, 123, 5353]))
+        else:
+            layer = ICMP()
+        packet = Ether() / ip / layer / Raw(load=bytes(rng.randrange(256) for _ in range(rng.randrange(0, 200))))
+        # Reconstruit depuis les octets, comme un paquet reçu par sniff ou lu dans un pcap
+        packet = Ether(bytes(packet))
+        packet.time = 1700000000.0 + len(packets) * 0.001
+        packets.append(packet)
+    return packets
+
+
+def load_packets(pcap: Optional[str], count: int) -> List[Any]:
+    """Lit au plus `count` paquets d'un pcap en streaming, ou génère un trafic synthétique"""
+    if not pcap:
+        return synthetic_packets(count)
+    packets = []
+    with PcapReader(pcap) as reader:
+        for packet in reader:
+            packets.append(packet)
+            if len(packets) >= count:
+                break
+    return packets
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss est en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def latency_summary(samples: List[float], unit: str = 'us') -> Dict[str, Any]:
+    """p50/p99/moyenne d'une liste de durées en secondes, exprimés en `unit` (us ou ms)"""
+    if not samples:
+        return {'calls': 0}
+    seconds = np.asarray(samples)
+    values = seconds * (1e6 if unit == 'us' else 1e3)
+    return {
+        'calls': len(values),
+        f'p50_{unit}': round(float(np.percentile(values, 50)), 3),
+        f'p99_{unit}': round(float(np.percentile(values, 99)), 3),
+        f'mean_{unit}': round(float(values.mean()), 3),
+        'total_s': round(float(seconds.sum()), 4),
+    }
+
+class StageTimer:
+    """Enveloppe les étapes d'un service pour chronométrer chaque appel dans le pipeline réel"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        samples = self.samples.setdefault(name, [])
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - start)
+        return timed
+
+    def instrument(self, service: SentinelPacketCapture):
+        service.packet_handler = self.wrap('packet_handler', service.packet_handler)
+        service._extract_packet_info = self.wrap('extract_packet_info', service._extract_packet_info)
+        service.feature_extractor.extract_features_into = self.wrap(
+            'extract_features', service.feature_extractor.extract_features_into)
+        service._predict_batch = self.wrap('predict_batch', service._predict_batch)
+        service._broadcast_packets = self.wrap('broadcast_packets', service._broadcast_packets)
+
+    def summary(self) -> Dict[str, Any]:
+        return {name: latency_summary(samples) for name, samples in self.samples.items()}
+
+def score_records(packets: List[Any]) -> List[Dict[str, Any]]:
+    """Fait passer les paquets dans l'extraction et le modèle, comme packet_handler, sans réseau"""
+    service = SentinelPacketCapture({'max_packet_queue': len(packets) + 1, 'log_level': 'WARNING'})
+    service.load_model('')
+    infos = [service._extract_packet_info(packet) for packet in packets]
+    matrix = service.schema.new_batch(len(packets))
+    for packet, row in zip(packets, matrix):
+        service.feature_extractor.extract_features_into(packet, row)
+    service._score_batch(infos, matrix, lambda: None)
+    return service.packet_queue.drain()
+
+
+def bench_wire(records: List[Dict[str, Any]], batch_size: int = 256, repeat: int = 5) -> List[Dict[str, Any]]:
+    """Taille et temps d'encodage des formats de diffusion, par paquet"""
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    encoders = [
+        ('json packet (historique)', lambda batch: [json.dumps({'type': 'packet', 'data': packet}) for packet in batch]),
+        ('json packets', lambda batch: [encode_json_frame(batch)]),
+        ('json packets sans features', lambda batch: [encode_json_frame([strip_features(packet) for packet in batch])]),
+        ('columnar + features', lambda batch: [encode_columnar_frame(batch, include_features=True)]),
+        ('columnar', lambda batch: [encode_columnar_frame(batch)]),
+    ]
+    results = []
+    for name, encode in encoders:
+        size = sum(len(message) for batch in batches for message in encode(batch))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for batch in batches:
+                encode(batch)
+        elapsed = (time.perf_counter() - start) / repeat
+        results.append({
+            'format': name,
+            'bytes_per_packet': size / len(records),
+            'us_per_packet': elapsed / len(records) * 1e6,
+        })
+    # Vérifie l'aller-retour de la trame colonnaire
+    decoded = decode_columnar_frame(encode_columnar_frame(batches[0], include_features=True))
+    assert [packet['sourceIp'] for packet in decoded] == [packet['sourceIp'] for packet in batches[0]]
+    return results
+
+
+def bench_stages(packets: List[Any], batch_size: int = 256) -> Dict[str, Any]:
+    """Chaque étape isolée, paquet par paquet, sur les mêmes paquets"""
+    service = SentinelPacketCapture({'max_packet_queue': len(packets) + 1, 'log_level': 'WARNING'})
+    service.load_model('')
+    timings: Dict[str, List[float]] = {name: [] for name in (
+        'extract_packet_info', 'extract_features', 'predict_anomaly', 'serialize_packet')}
+    infos = []
+    matrix = service.schema.new_batch(len(packets))
+    for packet, row in zip(packets, matrix):
+        start = time.perf_counter()
+        info = service._extract_packet_info(packet)
+        timings['extract_packet_info'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        service.feature_extractor.extract_features_into(packet, row)
+        timings['extract_features'].append(time.perf_counter() - start)
+        infos.append(info)
+
+    # Scoring historique : un appel au modèle par paquet (échantillon limité, c'est l'étape la plus lente)
+    for row in matrix[:min(len(matrix), 200)]:
+        features = service.schema.to_dict(row)
+        start = time.perf_counter()
+        service._predict_anomaly(features)
+        timings['predict_anomaly'].append(time.perf_counter() - start)
+
+    batch_timings = []
+    for i in range(0, len(matrix), batch_size):
+        start = time.perf_counter()
+        service._predict_batch(matrix[i:i + batch_size])
+        batch_timings.append(time.perf_counter() - start)
+
+    service._score_batch(infos, matrix, lambda: None)
+    for record in service.packet_queue.drain():
+        start = time.perf_counter()
+        json.dumps({'type': 'packet', 'data': record})
+        timings['serialize_packet'].append(time.perf_counter() - start)
+
+    stages = {name: latency_summary(samples) for name, samples in timings.items()}
+    stages['predict_batch'] = latency_summary(batch_timings)
+    stages['predict_batch']['batch_size'] = batch_size
+    for summary in stages.values():
+        if summary.get('calls'):
+            per_packet = summary['total_s'] / (len(packets) if summary is stages['predict_batch'] else summary['calls'])
+            summary['pps'] = round(1.0 / per_packet) if per_packet else None
+    return {'packets': len(packets), 'stages': stages, 'peak_rss_mb': round(peak_rss_mb(), 1)}
+
+def bench_model(packets: List[Any], batch_sizes: List[int], repeat: int = 3, max_batches: int = 200) -> Dict[str, Any]:
+    """predict_proba de sklearn contre la forêt compilée, sur les features extraites des paquets"""
+    service = SentinelPacketCapture({'max_packet_queue': len(packets) + 1, 'log_level': 'WARNING'})
+    service.load_model('')
+    matrix = service.schema.new_batch(len(packets))
+    for packet, row in zip(packets, matrix):
+        service.feature_extractor.extract_features_into(packet, row)
+
+    start = time.perf_counter()
+    forest = CompiledForest.from_sklearn(service.model)
+    compile_ms = (time.perf_counter() - start) * 1000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'forest.joblib')
+        forest.save(path, 'bench')
+        start = time.perf_counter()
+        CompiledForest.load(path, 'bench')
+        load_ms = (time.perf_counter() - start) * 1000
+        cache_bytes = os.path.getsize(path)
+
+    # Les deux évaluateurs doivent rendre exactement les mêmes probabilités
+    exact = bool(np.array_equal(predict_proba(service.model, matrix), forest.predict_proba(matrix)))
+    results = []
+    for batch_size in batch_sizes:
+        # Nombre de lots borné : en lots de 1, sklearn coûte plusieurs ms par appel
+        batches = [matrix[i:i + batch_size] for i in range(0, len(matrix), batch_size)][:max_batches]
+        rows = sum(len(batch) for batch in batches)
+        row = {'batch_size': batch_size}
+        for name, predict in (('sklearn', partial(predict_proba, service.model)), ('compiled', forest.predict_proba)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for batch in batches:
+                    predict(batch)
+            row[f'{name}_us_per_packet'] = (time.perf_counter() - start) / repeat / rows * 1e6
+        row['speedup'] = row['sklearn_us_per_packet'] / row['compiled_us_per_packet']
+        results.append(row)
+    return {
+        'packets': len(packets), 'trees': forest.n_trees, 'nodes': forest.n_nodes, 'max_depth': forest.max_depth,
+        'compile_ms': round(compile_ms, 2), 'cache_load_ms': round(load_ms, 2), 'cache_bytes': cache_bytes,
+        'exact': exact, 'batches': results
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _client_process(url: str, expected: int, delivery: str, encoding: str, idle_timeout: float, ready, conn):
+    """Client WebSocket dans un processus séparé : renvoie (id, instant monotone de réception)"""
+    async def run():
+        received = []
+        async with websockets.connect(url, max_size=None) as ws:
+            if delivery != 'packet' or encoding != 'json':
+                await ws.send(json.dumps({'type': 'configure', 'delivery': delivery, 'encoding': encoding}))
+            ready.set()
+            while len(received) < expected:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), idle_timeout)
+                except asyncio.TimeoutError:
+                    break
+                now = time.monotonic()
+                if isinstance(message, bytes):
+                    ids = [packet['id'] for packet in decode_columnar_frame(message)]
+                else:
+                    data = json.loads(message)
+                    if data.get('type') == 'packet':
+                        ids = [data['data']['id']]
+                    elif data.get('type') == 'packets':
+                        ids = [packet['id'] for packet in data['data']]
+                    else:
+                        continue
+                received.extend((packet_id, now) for packet_id in ids)
+        return received
+    conn.send(asyncio.run(run()))
+    conn.close()
+
+async def _run_pipeline(pcap_path: str, expected: int, clients: int, delivery: str, encoding: str,
+                        idle_timeout: float) -> Dict[str, Any]:
+    port = _free_port()
+    service = SentinelPacketCapture({
+        'log_level': 'WARNING', 'pcap': pcap_path, 'pcap_speed': 'fast',
+        'websocket_port': port, 'client_queue_size': expected + 16,
+        'client_max_lag_ms': 3600 * 1000.0, 'stats_interval': 0
+    })
+    service.load_model('')
+    timer = StageTimer()
+    timer.instrument(service)
+    ingest: Dict[str, float] = {}
+    extract_info = service._extract_packet_info
+    def stamped(packet):
+        info = extract_info(packet)
+        ingest[info['id']] = time.monotonic()
+        return info
+    service._extract_packet_info = stamped
+
+    service.packet_queue.bind(asyncio.get_running_loop())
+    context = multiprocessing.get_context('spawn')
+    loop = asyncio.get_running_loop()
+    async with websockets.serve(service.websocket_handler, '127.0.0.1', port, max_size=None):
+        broadcast_task = asyncio.create_task(service.broadcast_data())
+        processes = []
+        for _ in range(clients):
+            ready = context.Event()
+            parent_conn, child_conn = context.Pipe(duplex=False)
+            process = context.Process(target=_client_process, daemon=True, args=(
+                f"ws://127.0.0.1:{port}", expected, delivery, encoding, idle_timeout, ready, child_conn))
+            process.start()
+            processes.append((process, ready, parent_conn))
+        for _, ready, _ in processes:
+            await loop.run_in_executor(None, ready.wait, 60)
+        # Laisse le dernier message configure être traité avant de démarrer le rejeu
+        await asyncio.sleep(0.2)
+
+        started = time.monotonic()
+        service.start_capture()
+        results = await asyncio.gather(*(loop.run_in_executor(None, conn.recv) for _, _, conn in processes))
+        finished = max((max(t for _, t in received) for received in results if received), default=time.monotonic())
+        broadcast_task.cancel()
+        service.stop_capture()
+        for process, _, _ in processes:
+            process.join(timeout=5)
+
+    latencies = [t - ingest[packet_id] for received in results for packet_id, t in received if packet_id in ingest]
+    delivered = [len(received) for received in results]
+    elapsed = finished - started
+    summary = latency_summary(latencies, unit='ms')
+    return {
+        'clients': clients,
+        'delivery': delivery,
+        'encoding': encoding,
+        'packets': service.replay_stats['packets'],
+        'delivered_min': min(delivered) if delivered else 0,
+        'elapsed_s': round(elapsed, 3),
+        'pps': round(service.replay_stats['packets'] / elapsed, 1) if elapsed > 0 else None,
+        'end_to_end': summary,
+        'stages': timer.summary(),
+        'queue_dropped': service.packet_queue.get_stats()['dropped'],
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+def bench_pipeline(pcap: Optional[str], count: int, client_counts: List[int], delivery: str = 'packet',
+                   encoding: str = 'json', idle_timeout: float = 10.0) -> List[Dict[str, Any]]:
+    """Pipeline complet (rejeu pcap → extraction → modèle → diffusion) vers N clients WebSocket locaux"""
+    packets = load_packets(pcap, count)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.pcap')
+        wrpcap(path, packets)
+        return [
+            asyncio.run(_run_pipeline(path, len(packets), clients, delivery, encoding, idle_timeout))
+            for clients in client_counts
+        ]
+
+def bench_capture(backends: List[str], count: int, port: int = 47999) -> List[Dict[str, Any]]:
+    """Capture live sur l'interface loopback avec chaque backend (privilèges root requis).
+
+    Envoie `count` datagrammes UDP aussi vite que possible ; chacun est vu deux
+    fois sur lo (sortant puis entrant). Les infos paquet et les features sont
+    calculées, sans modèle ni diffusion.
+    """
+    results = []
+    for backend in backends:
+        service = SentinelPacketCapture({'log_level': 'WARNING', 'capture_backend': backend})
+        received = []
+        service._publish_packet = lambda packet: received.append(packet['destinationPort'] == port)
+        sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sink.bind(('127.0.0.1', port))
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        service.start_capture('lo', '')
+        time.sleep(0.5)
+        start = time.perf_counter()
+        for _ in range(count):
+            sender.sendto(b'sentinel', ('127.0.0.1', port))
+        elapsed = time.perf_counter() - start
+        # Laisse le pipeline vider ce que le noyau a déjà mis de côté
+        seen = -1
+        while len(received) != seen:
+            seen = len(received)
+            time.sleep(0.5)
+        service.stop_capture()
+        sink.close()
+        sender.close()
+        captured = sum(received)
+        source = service.get_source_stats()
+        results.append({
+            'backend': service.capture_backend,
+            'sent': count,
+            'expected_frames': 2 * count,
+            'captured': captured,
+            'capture_ratio': round(captured / (2 * count), 4),
+            'send_pps': round(count / elapsed, 1),
+            'kernel_drops': source['interfaces'][0]['kernel_drops'],
+        })
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(path: str, command: str, params: Dict[str, Any], results: Any):
+    document = {
+        'command': command,
+        'commit': git_revision(),
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'params': params,
+        'results': results,
+    }
+    with open(path, 'w') as handle:
+        json.dump(document, handle, indent=2)
+
+def _flatten(value: Any, prefix: str = '') -> Dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, list):
+        flat = {}
+        for index, item in enumerate(value):
+            flat.update(_flatten(item, f"{prefix}[{index}]"))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+def compare_results(before_path: str, after_path: str) -> List[Dict[str, Any]]:
+    """Métriques numériques communes à deux fichiers de résultats, avec l'écart relatif"""
+    with open(before_path) as handle:
+        before = json.load(handle)
+    with open(after_path) as handle:
+        after = json.load(handle)
+    old, new = _flatten(before['results']), _flatten(after['results'])
+    rows = []
+    for key in old:
+        if key in new:
+            change = (new[key] - old[key]) / old[key] * 100.0 if old[key] else None
+            rows.append({'metric': key, 'before': old[key], 'after': new[key], 'change_pct': change})
+    return rows
+
+def bench_shards(packets: List[Any], shard_counts: List[int], batch_size: int = 256,
+                 window_seconds: float = 120.0) -> Dict[str, Any]:
+    """Extraction shardée contre l'extracteur unique sur le même trafic : coût et égalité des features.
+
+    parent_us_per_packet est le temps CPU du thread appelant : la part qui ne
+    se répartit pas entre les shards, et qui borne le débit quand les cœurs
+    sont assez nombreux.
+    """
+    headers = [decode_packet(packet) for packet in packets]
+    reference = NetworkFeatureExtractor(window_seconds)
+    expected = reference.schema.new_batch(len(headers))
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    for packet, row in zip(headers, expected):
+        reference.extract_features_into(packet, row)
+    results = [{'shards': 0, 'us_per_packet': (time.perf_counter() - start) / len(headers) * 1e6,
+                'parent_us_per_packet': (time.thread_time() - cpu_start) / len(headers) * 1e6,
+                'identical': True, 'mismatched_rows': 0}]
+    for count in shard_counts:
+        extractor = NetworkFeatureExtractor(window_seconds)
+        shards = FeatureShards(count, window_seconds)
+        shards.start()
+        try:
+            matrix = extractor.schema.new_batch(len(headers))
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            for i in range(0, len(headers), batch_size):
+                extractor.extract_batch_into(headers[i:i + batch_size], matrix[i:i + batch_size], shards, extractor.schema)
+            elapsed, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+            stats = shards.get_stats()
+        finally:
+            shards.stop()
+        mismatched = int((matrix != expected).any(axis=1).sum())
+        results.append({
+            'shards': count, 'us_per_packet': elapsed / len(headers) * 1e6,
+            'parent_us_per_packet': cpu / len(headers) * 1e6, 'identical': mismatched == 0, 'mismatched_rows': mismatched,
+            'rows_per_shard': stats['rows_per_shard']
+        })
+    return {'packets': len(headers), 'window_s': window_seconds, 'batch_size': batch_size, 'runs': results}
+
+
+def bench_host_features(host_counts: List[int], packets: int, seed: int = 42) -> List[Dict[str, float]]:
+    """Coût par paquet de la mise à jour de l'historique + features dst_host_*"""
+    results = []
+    for hosts in host_counts:
+        rng = random.Random(seed)
+        extractor = NetworkFeatureExtractor()
+
+        # Pré-remplissage : une connexion par hôte actif dans la fenêtre
+        for i in range(hosts):
+            extractor._update_connection_history(_host_ip(i), _host_ip(hosts + i), rng.choice(SERVICES), 'tcp')
+
+        samples = [
+            (_host_ip(rng.randrange(hosts)), _host_ip(hosts + rng.randrange(hosts)), rng.choice(SERVICES))
+            for _ in range(packets)
+        ]
+        row = extractor.schema.new_row()
+        start = time.perf_counter()
+        for src_ip, dst_ip, service in samples:
+            extractor._update_connection_history(src_ip, dst_ip, service, 'tcp')
+            extractor._write_traffic_features(row, src_ip, service)
+            extractor._write_host_features(row, dst_ip, service)
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            'active_hosts': hosts,
+            'window_entries': len(extractor.host_history),
+            'us_per_packet': elapsed / packets * 1e6,
+        })
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks Sentinel IDS")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    host_parser = subparsers.add_parser('host-features', help="Coût des features dst_host_* selon le nombre d'hôtes actifs")
+    host_parser.add_argument('--hosts', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    host_parser.add_argument('--packets', type=int, default=20000)
+
+    wire_parser = subparsers.add_parser('wire', help="Taille et coût d'encodage des formats WebSocket")
+    wire_parser.add_argument('--pcap', help="Échantillon de trafic enregistré (sinon trafic synthétique)")
+    wire_parser.add_argument('--packets', type=int, default=5000)
+    wire_parser.add_argument('--batch-size', type=int, default=256)
+
+    stages_parser = subparsers.add_parser('stages', help="Latence p50/p99 de chaque étape isolée")
+    stages_parser.add_argument('--pcap', help="Échantillon de trafic enregistré (sinon trafic synthétique)")
+    stages_parser.add_argument('--packets', type=int, default=5000)
+    stages_parser.add_argument('--batch-size', type=int, default=256)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help="Débit et latence du pipeline complet avec N clients WebSocket")
+    pipeline_parser.add_argument('--pcap', help="Échantillon de trafic enregistré (sinon trafic synthétique)")
+    pipeline_parser.add_argument('--packets', type=int, default=5000)
+    pipeline_parser.add_argument('--clients', type=int, nargs='+', default=[1, 4])
+    pipeline_parser.add_argument('--delivery', choices=['packet', 'batch'], default='packet')
+    pipeline_parser.add_argument('--encoding', choices=['json', 'columnar'], default='json')
+
+    model_parser = subparsers.add_parser('model', help="predict_proba de sklearn contre la forêt compilée")
+    model_parser.add_argument('--pcap', help="Échantillon de trafic enregistré (sinon trafic synthétique)")
+    model_parser.add_argument('--packets', type=int, default=5000)
+    model_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 64, 256])
+
+    shards_parser = subparsers.add_parser('shards', help="Extraction shardée contre l'extracteur unique (vérifie l'égalité des features)")
+    shards_parser.add_argument('--pcap', help="Échantillon de trafic enregistré (sinon trafic synthétique)")
+    shards_parser.add_argument('--packets', type=int, default=20000)
+    shards_parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    shards_parser.add_argument('--batch-size', type=int, default=256)
+    shards_parser.add_argument('--window', type=float, default=120.0, help="Fenêtre de trafic en secondes")
+
+    capture_parser = subparsers.add_parser('capture', help="Taux de capture live sur lo selon le backend (root)")
+    capture_parser.add_argument('--backends', nargs='+', choices=['scapy', 'ring'], default=['scapy', 'ring'])
+    capture_parser.add_argument('--packets', type=int, default=20000)
+
+    for command_parser in (host_parser, wire_parser, stages_parser, model_parser, shards_parser, pipeline_parser, capture_parser):
+        command_parser.add_argument('--output', help="Fichier JSON de résultats")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare deux fichiers de résultats")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        print(f"{'métrique':<60} {'avant':>12} {'après':>12} {'écart':>8}")
+        for row in compare_results(args.before, args.after):
+            change = f"{row['change_pct']:+.1f}%" if row['change_pct'] is not None else '-'
+            print(f"{row['metric']:<60} {row['before']:>12.2f} {row['after']:>12.2f} {change:>8}")
+        return 0
+
+    if args.command == 'host-features':
+        results = bench_host_features(args.hosts, args.packets)
+        print(f"{'hôtes actifs':>14} {'entrées fenêtre':>16} {'µs/paquet':>10}")
+        for row in results:
+            print(f"{row['active_hosts']:>14} {row['window_entries']:>16} {row['us_per_packet']:>10.2f}")
+    elif args.command == 'wire':
+        records = score_records(load_packets(args.pcap, args.packets))
+        results = bench_wire(records, args.batch_size)
+        print(f"{len(records)} paquets, lots de {args.batch_size}")
+        print(f"{'format':>28} {'octets/paquet':>14} {'µs/paquet':>10}")
+        for row in results:
+            print(f"{row['format']:>28} {row['bytes_per_packet']:>14.1f} {row['us_per_packet']:>10.2f}")
+    elif args.command == 'stages':
+        results = bench_stages(load_packets(args.pcap, args.packets), args.batch_size)
+        print(f"{results['packets']} paquets, RSS max {results['peak_rss_mb']} Mo")
+        print(f"{'étape':>22} {'appels':>8} {'p50 µs':>10} {'p99 µs':>10} {'paquets/s':>10}")
+        for name, row in results['stages'].items():
+            print(f"{name:>22} {row['calls']:>8} {row['p50_us']:>10.1f} {row['p99_us']:>10.1f} {row.get('pps') or 0:>10}")
+    elif args.command == 'model':
+        results = bench_model(load_packets(args.pcap, args.packets), args.batch_sizes)
+        print(f"{results['trees']} arbres, {results['nodes']} nœuds, profondeur {results['max_depth']} : "
+              f"compilation {results['compile_ms']} ms, relecture du cache {results['cache_load_ms']} ms "
+              f"({results['cache_bytes'] / 1e6:.1f} Mo), probabilités identiques : {'oui' if results['exact'] else 'NON'}")
+        print(f"{'lot':>6} {'sklearn µs/paquet':>18} {'compilé µs/paquet':>18} {'gain':>7}")
+        for row in results['batches']:
+            print(f"{row['batch_size']:>6} {row['sklearn_us_per_packet']:>18.1f} "
+                  f"{row['compiled_us_per_packet']:>18.1f} {row['speedup']:>6.1f}x")
+    elif args.command == 'shards':
+        results = bench_shards(load_packets(args.pcap, args.packets), args.shards, args.batch_size, args.window)
+        print(f"{results['packets']} paquets, lots de {results['batch_size']}, fenêtre {results['window_s']}s")
+        print(f"{'shards':>7} {'µs/paquet':>10} {'µs/paquet (parent)':>19} {'features identiques':>20} {'lignes par shard':>20}")
+        for row in results['runs']:
+            identical = 'oui' if row['identical'] else f"NON ({row['mismatched_rows']} lignes)"
+            shares = ' '.join(str(rows) for rows in row.get('rows_per_shard', [])) or '-'
+            print(f"{row['shards'] or 'aucun':>7} {row['us_per_packet']:>10.2f} {row['parent_us_per_packet']:>19.2f} "
+                  f"{identical:>20} {shares:>20}")
+    elif args.command == 'pipeline':
+        results = bench_pipeline(args.pcap, args.packets, args.clients, args.delivery, args.encoding)
+        for row in results:
+            latency = row['end_to_end']
+            print(f"{row['clients']} client(s), {row['delivery']}/{row['encoding']} : {row['packets']} paquets en "
+                  f"{row['elapsed_s']}s, {row['pps']} paquets/s, livrés (min) {row['delivered_min']}, "
+                  f"RSS max {row['peak_rss_mb']} Mo")
+            print(f"   bout en bout : p50 {latency.get('p50_ms', 0)} ms, p99 {latency.get('p99_ms', 0)} ms")
+            print(f"   {'étape':>22} {'appels':>8} {'p50 µs':>10} {'p99 µs':>10} {'total s':>9}")
+            for name, stage in row['stages'].items():
+                if stage.get('calls'):
+                    print(f"   {name:>22} {stage['calls']:>8} {stage['p50_us']:>10.1f} {stage['p99_us']:>10.1f} {stage['total_s']:>9.3f}")
+    elif args.command == 'capture':
+        results = bench_capture(args.backends, args.packets)
+        print(f"{'backend':>8} {'envoyés':>9} {'trames capturées':>17} {'taux':>7} {'envoi/s':>10} {'pertes noyau':>13}")
+        for row in results:
+            drops = row['kernel_drops'] if row['kernel_drops'] is not None else '-'
+            print(f"{row['backend']:>8} {row['sent']:>9} {row['captured']:>17} {row['capture_ratio']:>7.1%} "
+                  f"{row['send_pps']:>10} {drops:>13}")
+
+    if args.output:
+        params = {key: value for key, value in vars(args).items() if key not in ('command', 'output')}
+        write_results(args.output, args.command, params, results)
+        print(f"Résultats écrits dans {args.output}")
+    if args.command == 'shards' and not all(row['identical'] for row in results['runs']):
+        # Sert de test de non-régression : code de sortie non nul si une ligne diffère
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
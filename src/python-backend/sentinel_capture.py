@@ -11,222 +11,1525 @@ import logging
 import signal
 import sys
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from queue import Queue
-from threading import Thread, Event
+from typing import Dict, List, Optional, Any, Callable, Tuple
+from queue import Queue, Empty, Full
+from threading import Thread, Event, Condition, Lock
 import os
-from pathlib import Path
+import ipaddress
+import itertools
+import multiprocessing
+import socket
+import weakref
+from collections import OrderedDict, deque
 import psutil
-from typing import List, Dict
 
 import numpy as np
-import pandas as pd
-from scapy.all import sniff, IP, TCP, UDP, ICMP
+from scapy.all import conf
 import websockets
 from sklearn.ensemble import RandomForestClassifier
 from colorama import init, Fore, Style
-import nest_asyncio
 
-# Appliquer la correction pour les boucles d'événements imbriquées
-nest_asyncio.apply()
+from sentinel_decode import DLT_EN10MB, PacketHeaders, TCP_ACK, TCP_FIN, TCP_PSH, TCP_RST, TCP_SYN, TCP_URG, decode_packet, decode_raw, read_pcap_frames
+from sentinel_flows import CLASSIFICATION_MODES, KDD_FLAGS, REJECT_FLAGS, SYN_ERROR_FLAGS, Flow, FlowTable
+from sentinel_forest import CompiledForest, cache_path, model_fingerprint
+from sentinel_model import load_artifact, predict_proba, save_artifact
+from sentinel_ring import TPacketRing, read_socket_stats, ring_available
+from sentinel_shards import PACKET_DTYPE, SHARD_COLUMNS, SHARD_FLAGS, SHARD_PROTOCOLS, FeatureShards
+from sentinel_windows import SlidingWindowCounter
+from sentinel_workers import InferencePool
+from sentinel_ipc import (FRAME_BROADCAST, FRAME_FLOWS, FRAME_HELLO, FRAME_PACKETS, FRAME_REPLY, FRAME_STATS, REQUEST_ID,
+                          CaptureEndpoint, CaptureLink, RemoteSession, decode_records, read_frame)
+from sentinel_wire import WIRE_ENCODINGS, encode_columnar_frame, encode_json_frame, strip_features
 
 init(autoreset=True)
 
+# Ordre exact des colonnes attendu par le modèle
+FEATURE_ORDER = [
+    "duration", "protocol_type", "service", "flag", "src_bytes", "dst_bytes", "land", "wrong_fragment",
+    "urgent", "hot", "num_failed_logins", "logged_in", "num_compromised", "root_shell", "su_attempted",
+    "num_root", "num_file_creations", "num_shells", "num_access_files", "num_outbound_cmds",
+    "is_host_login", "is_guest_login", "count", "srv_count", "serror_rate", "srv_serror_rate",
+    "rerror_rate", "srv_rerror_rate", "same_srv_rate", "diff_srv_rate", "srv_diff_host_rate",
+    "dst_host_count", "dst_host_srv_count", "dst_host_same_srv_rate", "dst_host_diff_srv_rate",
+    "dst_host_same_src_port_rate", "dst_host_srv_diff_host_rate", "dst_host_serror_rate",
+    "dst_host_srv_serror_rate", "dst_host_rerror_rate", "dst_host_srv_rerror_rate"
+]
+
+# Valeurs par défaut des features quand l'information n'est pas disponible
+DEFAULT_FEATURES = {
+    'duration': 0.0, 'protocol_type': 'other', 'service': 'other', 'flag': 'NONE',
+    'src_bytes': 0, 'dst_bytes': 0, 'land': 0, 'wrong_fragment': 0, 'urgent': 0, 'hot': 0,
+    'num_failed_logins': 0, 'logged_in': 0, 'num_compromised': 0, 'root_shell': 0,
+    'su_attempted': 0, 'num_root': 0, 'num_file_creations': 0, 'num_shells': 0,
+    'num_access_files': 0, 'num_outbound_cmds': 0, 'is_host_login': 0, 'is_guest_login': 0,
+    'count': 1, 'srv_count': 1, 'serror_rate': 0.0, 'srv_serror_rate': 0.0,
+    'rerror_rate': 0.0, 'srv_rerror_rate': 0.0, 'same_srv_rate': 1.0, 'diff_srv_rate': 0.0,
+    'srv_diff_host_rate': 0.0, 'dst_host_count': 1, 'dst_host_srv_count': 1,
+    'dst_host_same_srv_rate': 1.0, 'dst_host_diff_srv_rate': 0.0,
+    'dst_host_same_src_port_rate': 1.0, 'dst_host_srv_diff_host_rate': 0.0,
+    'dst_host_serror_rate': 0.0, 'dst_host_srv_serror_rate': 0.0,
+    'dst_host_rerror_rate': 0.0, 'dst_host_srv_rerror_rate': 0.0,
+}
+
+SERVICE_PORTS = {
+    20: 'ftp_data', 21: 'ftp', 22: 'ssh', 23: 'telnet', 25: 'smtp',
+    53: 'domain', 80: 'http', 110: 'pop_3', 111: 'sunrpc', 143: 'imap4',
+    443: 'https', 993: 'imaps', 995: 'pop3s'
+}
+
+# Tables d'encodage fixes des colonnes catégorielles (ordre alphabétique, comme un LabelEncoder)
+CATEGORY_TABLES = {
+    'protocol_type': ['icmp', 'other', 'tcp', 'udp'],
+    'service': sorted(set(SERVICE_PORTS.values()) | {'other'}),
+    'flag': ['ACK', 'FIN', 'NONE', 'PSH', 'RST', 'SYN', 'URG'],
+}
+# En mode flux, `flag` porte l'état de connexion NSL-KDD (SF, S0, REJ...)
+FLOW_CATEGORY_TABLES = {**CATEGORY_TABLES, 'flag': KDD_FLAGS}
+
+class FeatureSchema:
+    """Schéma compilé des features : ordre des colonnes et encodage catégoriel stable.
+
+    Construit une seule fois à partir des noms de features du modèle, il
+    fournit les index de colonnes et les buffers float32 préalloués dans
+    lesquels l'extracteur écrit directement.
+    """
+
+    def __init__(self, names: Optional[List[str]] = None, categories: Optional[Dict[str, List[str]]] = None):
+        self.names = list(names) if names is not None else list(FEATURE_ORDER)
+        if sorted(self.names) != sorted(FEATURE_ORDER):
+            raise ValueError(f"Le modèle doit utiliser les {len(FEATURE_ORDER)} features KDD, reçu: {self.names}")
+        self.size = len(self.names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.categories = {col: list(values) for col, values in (categories or CATEGORY_TABLES).items()}
+        self.encoders = {col: {value: float(code) for code, value in enumerate(values)}
+                         for col, values in self.categories.items()}
+        self.defaults = np.array([self.encode(name, DEFAULT_FEATURES[name]) for name in self.names], dtype=np.float32)
+
+    @classmethod
+    def from_model(cls, model, default_categories: Optional[Dict[str, List[str]]] = None,
+                   names: Optional[List[str]] = None) -> 'FeatureSchema':
+        """Schéma d'un modèle : noms des métadonnées de l'artefact, à défaut ceux de l'entraînement"""
+        if names is None:
+            names = getattr(model, 'feature_names_in_', None)
+        return cls(list(names) if names is not None else None, getattr(model, 'category_maps', None) or default_categories)
+
+    def encode(self, column: str, value: Any) -> float:
+        encoder = self.encoders.get(column)
+        if encoder is None:
+            return float(value)
+        # Catégorie inconnue : code réservé, identique d'un processus à l'autre
+        return encoder.get(value, -1.0)
+
+    def new_row(self) -> np.ndarray:
+        return self.defaults.copy()
+
+    def new_batch(self, rows: int) -> np.ndarray:
+        return np.tile(self.defaults, (rows, 1))
+
+    def row_from_dict(self, features: Dict[str, Any]) -> np.ndarray:
+        row = self.new_row()
+        for name, value in features.items():
+            if name in self.index:
+                row[self.index[name]] = self.encode(name, value)
+        return row
+
+    def to_dict(self, values) -> Dict[str, Any]:
+        """Reconstruit le dictionnaire de features (catégories décodées) pour l'affichage"""
+        features = dict(zip(self.names, values.tolist() if isinstance(values, np.ndarray) else values))
+        for col, table in self.categories.items():
+            code = int(features[col])
+            features[col] = table[code] if 0 <= code < len(table) else 'other'
+        return features
+
+# Backends de capture live : socket scapy (une trame par appel) ou anneau TPACKET_V3 (Linux)
+CAPTURE_BACKENDS = ('scapy', 'ring')
+
+# Topologies : un seul processus, ou capture/analyse et diffusion WebSocket séparées
+TOPOLOGIES = ('single', 'split')
+# Messages clients traités par le processus de capture (modèle en service)
+CAPTURE_COMMANDS = ('get_model_info', 'get_model_comparison', 'reload_model')
+
+# Verdict affiché pour les paquets d'un flux pas encore scoré (mode flux)
+PENDING_VERDICT = {'prediction': 'Normal', 'anomaly_score': 0.0, 'threat_level': 'Informationnel'}
+# Verdict d'une ligne que le modèle n'a pas pu scorer
+ERROR_VERDICT = {'prediction': 'Erreur', 'anomaly_score': 0.0, 'threat_level': 'Informationnel'}
+
+
+def parse_interfaces(value: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+    """Liste d'interfaces 'eth0,eth1=tcp port 80' : filtre BPF propre optionnel après '='"""
+    interfaces = []
+    for entry in (value or '').split(','):
+        name, _, filter_expr = entry.partition('=')
+        if name.strip():
+            interfaces.append((name.strip(), filter_expr.strip() or None))
+    return interfaces
+
+def shard_encoding(schema: FeatureSchema) -> Dict[str, Any]:
+    """Codes du schéma pour les shards : services indexés ('other' en dernier) et table des ports"""
+    services = sorted(set(SERVICE_PORTS.values()) - {'other'}) + ['other']
+    service_ids = {service: i for i, service in enumerate(services)}
+    return {
+        'defaults': [float(schema.defaults[schema.index[name]]) for name in SHARD_COLUMNS],
+        'protocols': [schema.encode('protocol_type', protocol) for protocol in SHARD_PROTOCOLS],
+        'services': [schema.encode('service', service) for service in services],
+        'flags': [schema.encode('flag', flag) for flag in SHARD_FLAGS],
+        'ports': {port: service_ids[service] for port, service in SERVICE_PORTS.items()}
+    }
+
+def parse_replay_speed(value: Any) -> float:
+    """Cadence de rejeu pcap : 'fast' (0, sans attente), 'realtime' (1) ou un multiplicateur ('10', '10x')"""
+    text = str(value).strip().lower()
+    if text in ('', 'fast', 'max'):
+        return 0.0
+    if text in ('realtime', 'real-time'):
+        return 1.0
+    speed = float(text.rstrip('x'))
+    if speed <= 0:
+        raise ValueError(f"Vitesse de rejeu invalide: {value}")
+    return speed
+
 class NetworkFeatureExtractor:
     """Extracteur de caractéristiques réseau pour le modèle RandomForest"""
     
-    def __init__(self):
-        self.connection_history = {}
-        self.service_history = {}
-        self.host_history = {}
+    def __init__(self, window_seconds: float = 120.0, schema: Optional[FeatureSchema] = None):
+        self.window_seconds = window_seconds
+        self.schema = schema or FeatureSchema()
+        # Connexions par source, ventilées par service
+        self.connection_history = SlidingWindowCounter(window_seconds)
+        # Index inversé par destination, ventilé par service (features dst_host_*)
+        self.host_history = SlidingWindowCounter(window_seconds)
+        # Mode flux : connexions en erreur SYN ('S') ou rejetées ('R'), par source et par
+        # destination, ventilées par classe et par (service, classe)
+        self.error_history = SlidingWindowCounter(window_seconds)
+        self.host_error_history = SlidingWindowCounter(window_seconds)
         
     def extract_features(self, packet) -> Dict[str, float]:
-        # Initialisation avec toutes les features attendues
-        features = {
-            'duration': 0.0,
-            'protocol_type': 'other',
-            'service': 'other',
-            'flag': 'NONE',
-            'src_bytes': 0,
-            'dst_bytes': 0,
-            'land': 0,
-            'wrong_fragment': 0,
-            'urgent': 0,
-            'hot': 0,
-            'num_failed_logins': 0,
-            'logged_in': 0,
-            'num_compromised': 0,
-            'root_shell': 0,
-            'su_attempted': 0,
-            'num_root': 0,
-            'num_file_creations': 0,
-            'num_shells': 0,
-            'num_access_files': 0,
-            'num_outbound_cmds': 0,
-            'is_host_login': 0,
-            'is_guest_login': 0,
-            'count': 1,
-            'srv_count': 1,
-            'serror_rate': 0.0,
-            'srv_serror_rate': 0.0,
-            'rerror_rate': 0.0,
-            'srv_rerror_rate': 0.0,
-            'same_srv_rate': 1.0,
-            'diff_srv_rate': 0.0,
-            'srv_diff_host_rate': 0.0,
-            'dst_host_count': 1,
-            'dst_host_srv_count': 1,
-            'dst_host_same_srv_rate': 1.0,
-            'dst_host_diff_srv_rate': 0.0,
-            'dst_host_same_src_port_rate': 1.0,
-            'dst_host_srv_diff_host_rate': 0.0,
-            'dst_host_serror_rate': 0.0,
-            'dst_host_srv_serror_rate': 0.0,
-            'dst_host_rerror_rate': 0.0,
-            'dst_host_srv_rerror_rate': 0.0,
-        }
+        row = self.schema.new_row()
+        self.extract_features_into(packet, row)
+        return self.schema.to_dict(row)
+    
+    def extract_features_into(self, packet, row: np.ndarray):
+        """Écrit les features du paquet dans `row` (float32, ordre du schéma).
+
+        `packet` est un paquet scapy, une trame brute ou un PacketHeaders déjà décodé.
+        """
+        schema = self.schema
+        col = schema.index
+        row[:] = schema.defaults
 
         try:
-            if IP in packet:
-                ip_packet = packet[IP]
-                src_ip = ip_packet.src
-                dst_ip = ip_packet.dst
-
-                features['land'] = 1 if src_ip == dst_ip else 0
-                features['src_bytes'] = len(packet)
-
-                protocol = self._get_protocol(packet)
-                service = self._get_service(packet)
-                features['protocol_type'] = protocol
-                features['service'] = service
-
-                self._update_connection_history(src_ip, dst_ip, service, protocol)
-                features.update(self._calculate_traffic_features(src_ip, dst_ip, service))
-                features.update(self._calculate_host_features(dst_ip, service))
-
-                if TCP in packet:
-                    tcp_packet = packet[TCP]
-                    features['urgent'] = 1 if tcp_packet.flags.U else 0
+            headers = decode_packet(packet)
+            if headers.ip_version:
+                src_ip = headers.src
+                dst_ip = headers.dst
+
+                row[col['land']] = 1 if src_ip == dst_ip else 0
+                row[col['src_bytes']] = headers.length
+
+                protocol = self._get_protocol(headers)
+                service = self._get_service(headers)
+                row[col['protocol_type']] = schema.encode('protocol_type', protocol)
+                row[col['service']] = schema.encode('service', service)
+
+                self._update_connection_history(src_ip, dst_ip, service, protocol, headers.timestamp)
+                self._write_traffic_features(row, src_ip, service)
+                self._write_host_features(row, dst_ip, service)
+
+                tcp_flags = headers.tcp_flags
+                if tcp_flags is not None:
+                    row[col['urgent']] = 1 if tcp_flags & TCP_URG else 0
                     # Détermination du flag principal TCP
-                    flags = []
-                    if hasattr(tcp_packet, 'flags'):
-                        if tcp_packet.flags.S: flags.append('SYN')
-                        if tcp_packet.flags.A: flags.append('ACK')
-                        if tcp_packet.flags.F: flags.append('FIN')
-                        if tcp_packet.flags.R: flags.append('RST')
-                        if tcp_packet.flags.P: flags.append('PSH')
-                        if tcp_packet.flags.U: flags.append('URG')
-                    features['flag'] = flags[0] if flags else 'NONE'
-                    if hasattr(ip_packet, 'frag') and ip_packet.frag > 0:
-                        features['wrong_fragment'] = 1
-                else:
-                    features['flag'] = 'NONE'
+                    if tcp_flags & TCP_SYN: flag = 'SYN'
+                    elif tcp_flags & TCP_ACK: flag = 'ACK'
+                    elif tcp_flags & TCP_FIN: flag = 'FIN'
+                    elif tcp_flags & TCP_RST: flag = 'RST'
+                    elif tcp_flags & TCP_PSH: flag = 'PSH'
+                    elif tcp_flags & TCP_URG: flag = 'URG'
+                    else: flag = 'NONE'
+                    row[col['flag']] = schema.encode('flag', flag)
+                    if headers.fragment > 0:
+                        row[col['wrong_fragment']] = 1
 
         except Exception as e:
             logging.warning(f"Erreur lors de l'extraction des caractéristiques: {e}")
 
-        return features
+    def extract_batch_into(self, packets: List[Any], matrix: np.ndarray, shards: FeatureShards,
+                           schema: FeatureSchema):
+        """Mode shardé : mêmes lignes que extract_features_into appelé paquet par paquet.
+
+        Ce thread ne fait qu'indexer les adresses du lot et ranger les champs
+        bruts des en-têtes en colonnes ; les features et toutes les fenêtres
+        sont calculées par les shards.
+        """
+        matrix[:] = schema.defaults
+        if shards.schema_key is not schema:
+            shards.set_schema(schema, shard_encoding(schema))
+        addresses: Dict[str, int] = {}
+        rows, records = [], []
+        for index, packet in enumerate(packets):
+            try:
+                headers = decode_packet(packet)
+                if headers.ip_version:
+                    tcp_flags = headers.tcp_flags
+                    records.append((
+                        addresses.setdefault(headers.src, len(addresses)),
+                        addresses.setdefault(headers.dst, len(addresses)),
+                        headers.dport or 0, headers.ip_proto, headers.fragment,
+                        -1 if tcp_flags is None else tcp_flags, headers.length,
+                        time.time() if headers.timestamp is None else headers.timestamp, 0
+                    ))
+                    rows.append(index)
+            except Exception as e:
+                logging.warning(f"Erreur lors de l'extraction des caractéristiques: {e}")
+        if not rows:
+            return
+        values = shards.extract(list(addresses), np.array(records, dtype=PACKET_DTYPE))
+        matrix[np.ix_(rows, [schema.index[name] for name in SHARD_COLUMNS])] = values
+
+    def extract_flow_features_into(self, flow: Flow, row: np.ndarray, final: bool = True):
+        """Écrit les features d'une connexion (mode flux) dans `row`.
+
+        Les fenêtres de trafic comptent alors des connexions et non des paquets :
+        un flux y entre une seule fois, à sa première émission non intermédiaire.
+        """
+        schema = self.schema
+        col = schema.index
+        row[:] = schema.defaults
+
+        try:
+            service = SERVICE_PORTS.get(flow.dport, 'other') if flow.protocol in ('tcp', 'udp') else 'other'
+            flag = flow.connection_flag()
+            row[col['duration']] = flow.duration
+            row[col['protocol_type']] = schema.encode('protocol_type', flow.protocol)
+            row[col['service']] = schema.encode('service', service)
+            row[col['flag']] = schema.encode('flag', flag)
+            row[col['src_bytes']] = flow.src_bytes
+            row[col['dst_bytes']] = flow.dst_bytes
+            row[col['land']] = 1 if flow.src == flow.dst and flow.sport == flow.dport else 0
+            row[col['wrong_fragment']] = flow.wrong_fragment
+            row[col['urgent']] = flow.urgent
+            row[col['logged_in']] = flow.logged_in()
+
+            if final and not flow.recorded:
+                flow.recorded = True
+                self._update_connection_history(flow.src, flow.dst, service, flow.protocol, flow.last_seen)
+                error = 'S' if flag in SYN_ERROR_FLAGS else 'R' if flag in REJECT_FLAGS else None
+                if error:
+                    for history, key in ((self.error_history, flow.src), (self.host_error_history, flow.dst)):
+                        history.add(flow.last_seen, key, error)
+                        history.add(flow.last_seen, key, (service, error))
+            self._write_traffic_features(row, flow.src, service)
+            self._write_host_features(row, flow.dst, service)
+            self._write_error_rates(row, flow.src, flow.dst, service)
+
+        except Exception as e:
+            logging.warning(f"Erreur lors de l'extraction des caractéristiques du flux: {e}")
     
-    def _get_protocol(self, packet) -> str:
-        if TCP in packet: return 'tcp'
-        if UDP in packet: return 'udp'
-        if ICMP in packet: return 'icmp'
-        return 'other'
+    def _get_protocol(self, headers: PacketHeaders) -> str:
+        return headers.protocol
     
-    def _get_service(self, packet) -> str:
-        if TCP in packet: port = packet[TCP].dport
-        elif UDP in packet: port = packet[UDP].dport
-        else: return 'other'
-        
-        service_map = {
-            20: 'ftp_data', 21: 'ftp', 22: 'ssh', 23: 'telnet', 25: 'smtp',
-            53: 'domain', 80: 'http', 110: 'pop_3', 111: 'sunrpc', 143: 'imap4',
-            443: 'https', 993: 'imaps', 995: 'pop3s'
-        }
-        return service_map.get(port, 'other')
+    def _get_service(self, headers: PacketHeaders) -> str:
+        if headers.protocol not in ('tcp', 'udp'):
+            return 'other'
+        return SERVICE_PORTS.get(headers.dport, 'other')
     
-    def _update_connection_history(self, src_ip: str, dst_ip: str, service: str, protocol: str):
-        current_time = time.time()
-        cutoff_time = current_time - 120
-        
-        if src_ip not in self.connection_history:
-            self.connection_history[src_ip] = []
-        self.connection_history[src_ip] = [conn for conn in self.connection_history[src_ip] if conn['time'] > cutoff_time]
-        self.connection_history[src_ip].append({'time': current_time, 'dst_ip': dst_ip, 'service': service, 'protocol': protocol})
-        
-        service_key = f"{dst_ip}:{service}"
-        if service_key not in self.service_history:
-            self.service_history[service_key] = []
-        self.service_history[service_key] = [conn for conn in self.service_history[service_key] if conn['time'] > cutoff_time]
-        self.service_history[service_key].append({'time': current_time, 'src_ip': src_ip})
-    
-    def _calculate_traffic_features(self, src_ip: str, dst_ip: str, service: str) -> Dict[str, float]:
-        features = {}
-        src_connections = self.connection_history.get(src_ip, [])
-        features['count'] = len(src_connections)
-        
-        if src_connections:
-            same_service = [c for c in src_connections if c['service'] == service]
-            features['srv_count'] = len(same_service)
-            features['same_srv_rate'] = len(same_service) / len(src_connections)
-            features['diff_srv_rate'] = 1.0 - features['same_srv_rate']
-        else:
-            features['srv_count'] = 1
-            features['same_srv_rate'] = 1.0
-            features['diff_srv_rate'] = 0.0
-            
-        return features
+    def _update_connection_history(self, src_ip: str, dst_ip: str, service: str, protocol: str,
+                                   timestamp: Optional[float] = None):
+        # Horodatage de capture du paquet : fenêtres identiques en direct et en rejeu pcap
+        current_time = time.time() if timestamp is None else timestamp
+        self.connection_history.add(current_time, src_ip, service)
+        self.host_history.add(current_time, dst_ip, service)
     
-    def _calculate_host_features(self, dst_ip: str, service: str) -> Dict[str, float]:
-        features = {}
-        host_connections, service_connections = 0, 0
-        
-        for _, connections in self.connection_history.items():
-            for conn in connections:
-                if conn['dst_ip'] == dst_ip:
-                    host_connections += 1
-                    if conn['service'] == service:
-                        service_connections += 1
+    def _write_traffic_features(self, row: np.ndarray, src_ip: str, service: str):
+        col = self.schema.index
+        count = self.connection_history.count(src_ip)
+        if count:
+            srv_count = self.connection_history.count_sub(src_ip, service)
+            same_srv_rate = srv_count / count
+            row[col['count']] = count
+            row[col['srv_count']] = srv_count
+            row[col['same_srv_rate']] = same_srv_rate
+            row[col['diff_srv_rate']] = 1.0 - same_srv_rate
+    
+    def _write_host_features(self, row: np.ndarray, dst_ip: str, service: str):
+        col = self.schema.index
+        host_connections = self.host_history.count(dst_ip)
+        service_connections = self.host_history.count_sub(dst_ip, service)
         
-        features['dst_host_count'] = max(1, host_connections)
-        features['dst_host_srv_count'] = max(1, service_connections)
+        row[col['dst_host_count']] = max(1, host_connections)
+        row[col['dst_host_srv_count']] = max(1, service_connections)
         
         if host_connections > 0:
-            features['dst_host_same_srv_rate'] = service_connections / host_connections
-            features['dst_host_diff_srv_rate'] = 1.0 - features['dst_host_same_srv_rate']
+            same_srv_rate = service_connections / host_connections
+            row[col['dst_host_same_srv_rate']] = same_srv_rate
+            row[col['dst_host_diff_srv_rate']] = 1.0 - same_srv_rate
+    
+    def _write_error_rates(self, row: np.ndarray, src_ip: str, dst_ip: str, service: str):
+        col = self.schema.index
+        rates = (
+            (self.error_history, src_ip, self.connection_history.count(src_ip),
+             self.connection_history.count_sub(src_ip, service), '', 'srv_'),
+            (self.host_error_history, dst_ip, self.host_history.count(dst_ip),
+             self.host_history.count_sub(dst_ip, service), 'dst_host_', 'dst_host_srv_'),
+        )
+        for history, key, total, service_total, prefix, service_prefix in rates:
+            for error, name in (('S', 'serror_rate'), ('R', 'rerror_rate')):
+                if total:
+                    row[col[prefix + name]] = history.count_sub(key, error) / total
+                if service_total:
+                    row[col[service_prefix + name]] = history.count_sub(key, (service, error)) / service_total
+
+class InferenceBatcher:
+    """Étage de micro-lots entre l'extraction des features et le modèle.
+
+    Les éléments soumis sont regroupés jusqu'à `batch_size` lignes ou jusqu'à
+    l'échéance `max_delay_ms` comptée depuis le premier élément du lot, puis
+    transmis d'un bloc à `score_batch` depuis un thread dédié. Les vecteurs
+    sont copiés dans un anneau float32 préalloué : aucun tableau n'est créé
+    par paquet et le lot est assemblé dans une matrice réutilisée.
+    `score_batch` appelle `done` une fois les verdicts du lot rendus, depuis
+    n'importe quel thread : la latence mesurée va du retrait du premier
+    élément de la file jusqu'aux verdicts, pool de processus compris.
+    """
+
+    def __init__(self, score_batch: Callable[[List[Any], np.ndarray, Callable[[], None]], None], n_features: int,
+                 batch_size: int = 256, max_delay_ms: float = 5.0, max_pending: int = 10000):
+        self.score_batch = score_batch
+        self.batch_size = max(1, batch_size)
+        self.max_delay_ms = max(0.0, max_delay_ms)
+        self.queue: Queue = Queue(maxsize=max_pending)
+        # Assez de lignes pour la file pleine, le lot en cours et la ligne en écriture
+        self.rows = np.zeros((max_pending + self.batch_size + 1, n_features), dtype=np.float32)
+        self.matrix = np.zeros((self.batch_size, n_features), dtype=np.float32)
+        self.next_row = 0
+        self.running = Event()
+        self.thread: Optional[Thread] = None
+        self.stats = {
+            'batches': 0, 'rows': 0, 'last_batch_size': 0,
+            'last_batch_latency_ms': 0.0, 'max_batch_latency_ms': 0.0
+        }
+
+    def submit(self, item: Any, row: np.ndarray):
+        # Un seul producteur (thread de capture) : pas de verrou sur l'anneau
+        slot = self.next_row
+        self.rows[slot] = row
+        self.next_row = (slot + 1) % len(self.rows)
+        self.queue.put((item, slot))
+
+    def barrier(self, callback: Callable[[], None]):
+        """Exécute `callback` dans le thread d'inférence une fois scorées toutes les lignes
+        soumises avant lui, et avant celles soumises après (même producteur que submit)"""
+        self.queue.put((callback, None))
+
+    def start(self):
+        if self.running.is_set():
+            return
+        self.running.set()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self.running.clear()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+
+    def _run(self):
+        # On continue tant que la file n'est pas vide pour ne perdre aucun paquet à l'arrêt
+        while self.running.is_set() or not self.queue.empty():
+            try:
+                entry = self.queue.get(timeout=0.1)
+            except Empty:
+                continue
+            if entry[1] is None:
+                entry[0]()
+                continue
+            batch = [entry]
+            barrier = None
+            started = time.perf_counter()
+            deadline = started + self.max_delay_ms / 1000.0
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self.queue.get_nowait()
+                except Empty:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    try:
+                        entry = self.queue.get(timeout=remaining)
+                    except Empty:
+                        break
+                if entry[1] is None:
+                    # Le lot s'arrête à la barrière, exécutée juste après lui
+                    barrier = entry[0]
+                    break
+                batch.append(entry)
+            items = [item for item, _ in batch]
+            matrix = self.matrix[:len(batch)]
+            np.take(self.rows, [slot for _, slot in batch], axis=0, out=matrix)
+            self.score_batch(items, matrix, self._completion(len(batch), started))
+            if barrier is not None:
+                barrier()
+
+    def _completion(self, size: int, started: float) -> Callable[[], None]:
+        return lambda: self._record(size, (time.perf_counter() - started) * 1000.0)
+
+    def _record(self, size: int, latency_ms: float):
+        self.stats['batches'] += 1
+        self.stats['rows'] += size
+        self.stats['last_batch_size'] = size
+        self.stats['last_batch_latency_ms'] = latency_ms
+        self.stats['max_batch_latency_ms'] = max(self.stats['max_batch_latency_ms'], latency_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats['batches']
+        return {
+            'batch_size': self.batch_size,
+            'batch_timeout_ms': self.max_delay_ms,
+            'batches_scored': batches,
+            'avg_batch_size': round(self.stats['rows'] / batches, 2) if batches else 0.0,
+            'last_batch_size': self.stats['last_batch_size'],
+            'last_batch_latency_ms': round(self.stats['last_batch_latency_ms'], 3),
+            'max_batch_latency_ms': round(self.stats['max_batch_latency_ms'], 3),
+            'inference_queue_size': self.queue.qsize()
+        }
+
+class VerdictCache:
+    """Cache LRU/TTL des verdicts du modèle, par 5-tuple et vecteur de features quantifié.
+
+    Les valeurs numériques sont ramenées sur une échelle logarithmique
+    (`resolution` pas par facteur e) : des vecteurs quasi identiques d'un même
+    flux partagent une entrée et ne repassent pas par le modèle. Les colonnes
+    catégorielles restent exactes. Une entrée expire après `ttl` secondes et,
+    si `rescore_every` est non nul, est rescorée après ce nombre de hits pour
+    suivre un flux dont le comportement dérive. Avec le pool de processus,
+    les verdicts sont rangés par le thread de collecte pendant que le thread
+    d'inférence consulte le cache : les accès passent par un verrou.
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl: float = 60.0, rescore_every: int = 100,
+                 resolution: float = 8.0, categorical: Optional[List[int]] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.rescore_every = max(0, rescore_every)
+        self.resolution = resolution
+        self.categorical = list(categorical or [])
+        self.entries: 'OrderedDict[Any, List[Any]]' = OrderedDict()  # clé -> [verdict, expiration, hits, octets]
+        self.memory_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'rescored': 0}
+        self._lock = Lock()
+
+    def quantize(self, feature_matrix: np.ndarray) -> List[bytes]:
+        quantized = np.log1p(np.abs(feature_matrix))
+        quantized *= self.resolution
+        np.rint(quantized, out=quantized)
+        np.copysign(quantized, feature_matrix, out=quantized)
+        if self.categorical:
+            quantized[:, self.categorical] = feature_matrix[:, self.categorical]
+        return [row.tobytes() for row in quantized.astype(np.int32)]
+
+    def lookup(self, key: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._lookup(key)
+
+    def _lookup(self, key: Any) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        if time.monotonic() >= entry[1]:
+            self._discard(key)
+            self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return None
+        if self.rescore_every and entry[2] >= self.rescore_every:
+            # Rescoring forcé : le verdict frais remplacera cette entrée
+            self._discard(key)
+            self.stats['rescored'] += 1
+            self.stats['misses'] += 1
+            return None
+        entry[2] += 1
+        self.entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return entry[0]
+
+    def store(self, key: Any, verdict: Dict[str, Any]):
+        with self._lock:
+            self._store(key, verdict)
+
+    def _store(self, key: Any, verdict: Dict[str, Any]):
+        if key in self.entries:
+            self._discard(key)
+        while len(self.entries) >= self.max_entries:
+            oldest, entry = next(iter(self.entries.items()))
+            self._discard(oldest)
+            if time.monotonic() >= entry[1]:
+                self.stats['expired'] += 1
+            else:
+                self.stats['evictions'] += 1
+        size = sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key) + sys.getsizeof(verdict)
+        self.entries[key] = [verdict, time.monotonic() + self.ttl, 0, size]
+        self.memory_bytes += size
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.memory_bytes = 0
+
+    def _discard(self, key: Any):
+        entry = self.entries.pop(key)
+        self.memory_bytes -= entry[3]
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'ttl_s': self.ttl,
+            'rescore_every': self.rescore_every,
+            'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else 0.0,
+            'memory_bytes': self.memory_bytes,
+            **self.stats
+        }
+
+# Politiques appliquées quand la file vers la boucle asyncio est pleine
+OVERFLOW_POLICIES = ('block', 'drop-oldest', 'drop-newest', 'sample')
+
+class LoopBridge:
+    """File bornée entre un thread producteur et la boucle asyncio du service.
+
+    Le producteur dépose les éléments dans un deque (opérations atomiques,
+    sans verrou sur le chemin rapide) ; le consommateur n'est réveillé par
+    `call_soon_threadsafe` que lorsqu'il est effectivement en attente.
+    Quand la file est pleine, la politique choisie décide : bloquer le
+    producteur, jeter le plus ancien, jeter le nouveau, ou n'admettre qu'un
+    élément sur `sample_rate` en remplacement du plus ancien.
+    """
+
+    def __init__(self, maxsize: int = 1000, policy: str = 'block', sample_rate: int = 10):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Politique de débordement inconnue: {policy} (attendu: {', '.join(OVERFLOW_POLICIES)})")
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.sample_rate = max(1, sample_rate)
+        self._items = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._waiting = False
+        self._not_full = Condition()
+        self._blocked_producers = 0
+        self._overflow_seen = 0
+        self.closed = False
+        self.stats = {'blocked': 0, 'dropped': {name: 0 for name in OVERFLOW_POLICIES if name != 'block'}}
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attache la file à la boucle consommatrice (à appeler depuis cette boucle)"""
+        self._loop = loop
+        self._ready = asyncio.Event()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        with self._not_full:
+            self._not_full.notify_all()
+
+    def put(self, item: Any) -> bool:
+        """Dépose un élément depuis n'importe quel thread ; False si l'élément est jeté"""
+        items = self._items
+        if len(items) >= self.maxsize:
+            if self.policy == 'drop-newest':
+                self.stats['dropped']['drop-newest'] += 1
+                return False
+            if self.policy == 'sample':
+                self._overflow_seen += 1
+                if self._overflow_seen % self.sample_rate:
+                    self.stats['dropped']['sample'] += 1
+                    return False
+                self._discard_oldest('sample')
+            elif self.policy == 'drop-oldest':
+                self._discard_oldest('drop-oldest')
+            elif not self._wait_for_room():
+                return False
+        items.append(item)
+        if self._waiting:
+            self._waiting = False
+            self._loop.call_soon_threadsafe(self._ready.set)
+        return True
+
+    def _discard_oldest(self, policy: str):
+        try:
+            self._items.popleft()
+            self.stats['dropped'][policy] += 1
+        except IndexError:
+            # Le consommateur a vidé la file entre-temps
+            pass
+
+    def _wait_for_room(self) -> bool:
+        self.stats['blocked'] += 1
+        with self._not_full:
+            self._blocked_producers += 1
+            try:
+                while len(self._items) >= self.maxsize:
+                    if self.closed:
+                        return False
+                    self._not_full.wait(timeout=0.1)
+            finally:
+                self._blocked_producers -= 1
+        return True
+
+    def get_nowait(self) -> Optional[Any]:
+        try:
+            item = self._items.popleft()
+        except IndexError:
+            return None
+        self._notify_producers()
+        return item
+
+    def drain(self, max_items: Optional[int] = None) -> List[Any]:
+        """Retire tous les éléments disponibles (au plus `max_items`)"""
+        items = self._items
+        count = len(items) if max_items is None else min(len(items), max_items)
+        drained = [items.popleft() for _ in range(count)]
+        if drained:
+            self._notify_producers()
+        return drained
+
+    async def wait(self):
+        """Attend qu'au moins un élément soit disponible, sans sonder la file"""
+        while not self._items:
+            self._ready.clear()
+            self._waiting = True
+            # Revérifie après avoir signalé l'attente pour ne pas manquer un dépôt concurrent
+            if self._items:
+                self._waiting = False
+                break
+            await self._ready.wait()
+
+    def _notify_producers(self):
+        if self._blocked_producers:
+            with self._not_full:
+                self._not_full.notify_all()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'policy': self.policy,
+            'maxsize': self.maxsize,
+            'size': len(self._items),
+            'blocked': self.stats['blocked'],
+            'dropped': dict(self.stats['dropped'])
+        }
+
+# Niveaux de délestage, cumulatifs : chaque niveau garde les réductions des précédents
+SHED_LEVELS = ('full', 'no-preview', 'sample-live', 'sample-flows')
+SHED_NO_PREVIEW, SHED_SAMPLE_LIVE, SHED_SAMPLE_FLOWS = 1, 2, 3
+
+class LoadShedder:
+    """Délestage progressif piloté par la profondeur des files et la latence des lots.
+
+    La pression est le maximum du remplissage de la file vers la boucle
+    asyncio, du remplissage de la file d'inférence et du rapport entre la
+    latence des lots et `latency_budget_ms`. Au-delà de chaque seuil, un
+    niveau de plus s'applique : plus d'aperçu de payload, puis un paquet
+    d'apparence normale sur `sample_rate` dans la vue live, puis un paquet
+    sur `sample_rate` par flux déjà scoré (les autres reprennent son dernier
+    verdict ; un flux nouveau est toujours scoré). Le niveau monte dès que la
+    pression l'exige et ne redescend que d'un cran à la fois, sous le seuil
+    moins `hysteresis` et après `dwell` secondes au même niveau.
+    """
+
+    def __init__(self, latency_budget_ms: float = 50.0, sample_rate: int = 10,
+                 thresholds: Tuple[float, ...] = (0.5, 0.7, 0.85), hysteresis: float = 0.2,
+                 dwell: float = 1.0, interval: float = 0.1, max_flows: int = 65536):
+        self.latency_budget_ms = max(1.0, latency_budget_ms)
+        self.sample_rate = max(1, sample_rate)
+        self.thresholds = thresholds
+        self.hysteresis = hysteresis
+        self.dwell = dwell
+        self.interval = interval
+        self.max_flows = max(1, max_flows)
+        self.level = 0
+        self.pressure = {'packet_queue': 0.0, 'inference_queue': 0.0, 'latency': 0.0}
+        self._next_check = 0.0
+        self._changed = time.monotonic()
+        self._live_seen = 0
+        # Dernier verdict des flux scorés au niveau sample-flows : clé -> [verdict, paquets repris]
+        self._flows: 'OrderedDict[Any, List[Any]]' = OrderedDict()
+        self._lock = Lock()
+        self.stats = {
+            'level_changes': 0, 'previews_skipped': 0, 'live_dropped': 0,
+            'flows_scored': 0, 'verdicts_reused': 0, 'seconds_at_level': [0.0] * len(SHED_LEVELS)
+        }
+
+    def due(self) -> bool:
+        """Vrai au plus une fois par `interval` : l'appelant mesure alors la charge"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.interval
+        return True
+
+    def observe(self, packet_fill: float, inference_fill: float, latency_ms: float) -> int:
+        self.pressure = {
+            'packet_queue': packet_fill, 'inference_queue': inference_fill,
+            'latency': latency_ms / self.latency_budget_ms
+        }
+        pressure = max(self.pressure.values())
+        target = sum(1 for threshold in self.thresholds if pressure >= threshold)
+        now = time.monotonic()
+        if target > self.level:
+            self._set_level(target, now)
+        elif (self.level > target and now - self._changed >= self.dwell
+              and pressure < self.thresholds[self.level - 1] - self.hysteresis):
+            self._set_level(self.level - 1, now)
+        return self.level
+
+    def _set_level(self, level: int, now: float):
+        self.stats['seconds_at_level'][self.level] += now - self._changed
+        self._changed = now
+        self.stats['level_changes'] += 1
+        if level < SHED_SAMPLE_FLOWS:
+            # Verdicts repris uniquement pendant la surcharge : rien de périmé au retour
+            self.forget_flows()
+        self.level = level
+
+    def keep_live(self) -> bool:
+        """Échantillonnage de la vue live : un paquet d'apparence normale sur `sample_rate`"""
+        self._live_seen += 1
+        if self._live_seen % self.sample_rate:
+            self.stats['live_dropped'] += 1
+            return False
+        return True
+
+    def reusable(self, keys: List[Any]) -> List[Optional[Dict[str, Any]]]:
+        """Pour chaque clé de flux, le verdict à reprendre, ou None si la ligne doit être scorée"""
+        reused: List[Optional[Dict[str, Any]]] = []
+        with self._lock:
+            for key in keys:
+                entry = self._flows.get(key)
+                if entry is None or entry[1] + 1 >= self.sample_rate:
+                    # Flux nouveau, ou son tour d'être rescoré
+                    reused.append(None)
+                    continue
+                entry[1] += 1
+                self._flows.move_to_end(key)
+                reused.append(entry[0])
+        self.stats['verdicts_reused'] += sum(1 for verdict in reused if verdict is not None)
+        self.stats['flows_scored'] += sum(1 for verdict in reused if verdict is None)
+        return reused
+
+    def remember(self, keys: List[Any], verdicts: List[Dict[str, Any]]):
+        with self._lock:
+            for key, verdict in zip(keys, verdicts):
+                if verdict['prediction'] == 'Erreur':
+                    continue
+                self._flows[key] = [verdict, 0]
+                self._flows.move_to_end(key)
+            while len(self._flows) > self.max_flows:
+                self._flows.popitem(last=False)
+
+    def forget_flows(self):
+        with self._lock:
+            self._flows.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        seconds = list(self.stats['seconds_at_level'])
+        seconds[self.level] += time.monotonic() - self._changed
+        return {
+            'level': self.level,
+            'mode': SHED_LEVELS[self.level],
+            'pressure': {name: round(value, 3) for name, value in self.pressure.items()},
+            'thresholds': list(self.thresholds),
+            'latency_budget_ms': self.latency_budget_ms,
+            # Fidélité en cours : ce que reçoivent réellement les clients
+            'fidelity': {
+                'payload_preview': self.level < SHED_NO_PREVIEW,
+                'live_normal_sample_rate': self.sample_rate if self.level >= SHED_SAMPLE_LIVE else 1,
+                'repeat_flow_sample_rate': self.sample_rate if self.level >= SHED_SAMPLE_FLOWS else 1
+            },
+            'tracked_flows': len(self._flows),
+            'level_changes': self.stats['level_changes'],
+            'previews_skipped': self.stats['previews_skipped'],
+            'live_dropped': self.stats['live_dropped'],
+            'flows_scored': self.stats['flows_scored'],
+            'verdicts_reused': self.stats['verdicts_reused'],
+            'seconds_at_level': {name: round(value, 1) for name, value in zip(SHED_LEVELS, seconds)}
+        }
+
+# Modes de livraison des paquets : un message 'packet' par paquet (compatibilité
+# avec real-packet-capture-service.ts) ou un message 'packets' par fenêtre de flush
+DELIVERY_MODES = ('packet', 'batch')
+
+# Publication des stats : instantané complet à chaque tick, ou deltas entre deux instantanés
+STATS_MODES = ('full', 'delta')
+
+# Flux auxquels un client peut s'abonner
+SUBSCRIPTION_STREAMS = ('packets', 'anomalies', 'stats', 'interfaces', 'flows')
+# Flux reçus sans abonnement explicite : les enregistrements de flux restent sur demande
+DEFAULT_STREAMS = ('packets', 'anomalies', 'stats', 'interfaces')
+
+class Subscription:
+    """Abonnement d'un client : flux souhaités et prédicats sur les paquets.
+
+    Les clients ayant le même abonnement partagent une seule instance : les
+    prédicats sont évalués une fois par paquet et par abonnement distinct, et
+    le plafond `max_rate` (éléments/s, compté à part pour les paquets et pour
+    les enregistrements de flux) s'applique au groupe entier.
+    """
+
+    def __init__(self, streams: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None):
+        streams = list(DEFAULT_STREAMS) if streams is None else list(streams)
+        unknown = [stream for stream in streams if stream not in SUBSCRIPTION_STREAMS]
+        if unknown:
+            raise ValueError(f"Flux inconnu(s): {', '.join(map(str, unknown))}")
+        filters = dict(filters or {})
+        unknown = [name for name in filters if name not in ('protocol', 'cidr', 'port', 'interface', 'min_anomaly_score', 'max_rate')]
+        if unknown:
+            raise ValueError(f"Filtre(s) inconnu(s): {', '.join(map(str, unknown))}")
+        self.streams = frozenset(streams)
+        self.protocols = self._as_set(filters.get('protocol'), lambda value: str(value).upper())
+        self.networks = tuple(ipaddress.ip_network(value, strict=False)
+                              for value in sorted(self._as_set(filters.get('cidr'), str) or ()))
+        self.ports = self._as_set(filters.get('port'), int)
+        self.interfaces = self._as_set(filters.get('interface'), str)
+        self.min_anomaly_score = float(filters['min_anomaly_score']) if filters.get('min_anomaly_score') is not None else None
+        self.max_rate = float(filters['max_rate']) if filters.get('max_rate') else None
+        self.key = (
+            self.streams, self.protocols, tuple(str(network) for network in self.networks),
+            self.ports, self.interfaces, self.min_anomaly_score, self.max_rate
+        )
+        self.wants_packets = bool(self.streams & {'packets', 'anomalies'})
+        self.anomalies_only = 'anomalies' in self.streams and 'packets' not in self.streams
+        self.has_predicates = bool(self.anomalies_only or self.protocols or self.networks or self.ports
+                                   or self.interfaces or self.min_anomaly_score is not None)
+        # Seau à jetons par flux diffusé (paquets, enregistrements de flux) : (jetons, dernier remplissage)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    @staticmethod
+    def _as_set(value, convert) -> Optional[frozenset]:
+        if value is None or value == []:
+            return None
+        values = value if isinstance(value, (list, tuple)) else [value]
+        return frozenset(convert(item) for item in values)
+
+    def matches(self, packet: Dict[str, Any], ip_cache: Dict[str, Any]) -> bool:
+        if self.anomalies_only and packet.get('prediction') != 'Anomalie':
+            return False
+        if self.protocols and str(packet.get('protocol', '')).upper() not in self.protocols:
+            return False
+        if self.ports and packet.get('sourcePort') not in self.ports and packet.get('destinationPort') not in self.ports:
+            return False
+        if self.interfaces and packet.get('interface') not in self.interfaces:
+            return False
+        if self.min_anomaly_score is not None and packet.get('anomaly_score', 0.0) < self.min_anomaly_score:
+            return False
+        if self.networks:
+            return self._in_networks(packet.get('sourceIp'), ip_cache) or self._in_networks(packet.get('destinationIp'), ip_cache)
+        return True
+
+    def _in_networks(self, ip: Optional[str], ip_cache: Dict[str, Any]) -> bool:
+        address = ip_cache.get(ip, False)
+        if address is False:
+            # Chaque adresse n'est analysée qu'une fois par flush, tous abonnements confondus
+            try:
+                address = ipaddress.ip_address(ip)
+            except ValueError:
+                address = None
+            ip_cache[ip] = address
+        return address is not None and any(address in network for network in self.networks)
+
+    def select(self, packets: List[Dict[str, Any]], ip_cache: Dict[str, Any], stream: str = 'packets') -> List[Dict[str, Any]]:
+        selected = [packet for packet in packets if self.matches(packet, ip_cache)] if self.has_predicates else packets
+        if self.max_rate is None or not selected:
+            return selected
+        # Seau à jetons : `max_rate` éléments par seconde et par flux, rafale d'une seconde au plus
+        now = time.monotonic()
+        tokens, refilled_at = self._buckets.get(stream, (self.max_rate, now))
+        tokens = min(self.max_rate, tokens + (now - refilled_at) * self.max_rate)
+        allowed = int(tokens)
+        self._buckets[stream] = (tokens - min(allowed, len(selected)), now)
+        return selected[:allowed]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'streams': sorted(self.streams),
+            'filters': {
+                'protocol': sorted(self.protocols) if self.protocols else None,
+                'cidr': [str(network) for network in self.networks] or None,
+                'port': sorted(self.ports) if self.ports else None,
+                'interface': sorted(self.interfaces) if self.interfaces else None,
+                'min_anomaly_score': self.min_anomaly_score,
+                'max_rate': self.max_rate
+            }
+        }
+
+# Politiques appliquées à un client qui ne suit plus le débit de diffusion
+SLOW_CLIENT_POLICIES = ('drop', 'sample', 'disconnect')
+
+class ClientSession:
+    """État d'un client WebSocket connecté et sa file d'envoi dédiée.
+
+    Chaque client possède une file bornée vidée par sa propre tâche
+    d'écriture : un client lent n'accumule du retard que dans sa file, sans
+    ralentir les autres clients ni la capture.
+    """
+
+    def __init__(self, websocket, max_queue: int = 4096, max_lag_ms: float = 2000.0,
+                 policy: str = 'drop', sample_rate: int = 10):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Politique client lent inconnue: {policy} (attendu: {', '.join(SLOW_CLIENT_POLICIES)})")
+        self.websocket = websocket
+        self.address = websocket.remote_address
+        self.delivery = 'packet'
+        self.encoding = 'json'
+        self.include_features = True
+        self.stats_mode = 'full'
+        self.subscription = Subscription()
+        self.max_queue = max(1, max_queue)
+        self.max_lag_ms = max_lag_ms
+        self.policy = policy
+        self.sample_rate = max(1, sample_rate)
+        self.queue = deque()  # (instant de mise en file, message)
+        self.ready = asyncio.Event()
+        self.writer_task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.lag_ms = 0.0
+        self.close_reason: Optional[str] = None
+        self._lagging_seen = 0
+
+    def lag(self) -> float:
+        """Âge en ms du plus ancien message en attente"""
+        if not self.queue:
+            return 0.0
+        return (time.monotonic() - self.queue[0][0]) * 1000.0
+
+    def is_lagging(self) -> bool:
+        return len(self.queue) >= self.max_queue or self.lag() >= self.max_lag_ms
+
+    def enqueue(self, message: str, droppable: bool = True) -> bool:
+        """Met un message en file ; les réponses directes (droppable=False) ne sont jamais jetées"""
+        if self.close_reason:
+            return False
+        if droppable and self.is_lagging():
+            if self.policy == 'disconnect':
+                self.close_reason = f"Client trop lent: {len(self.queue)} messages en attente, retard {self.lag():.0f} ms"
+                self.dropped += 1 + len(self.queue)
+                self.queue.clear()
+                asyncio.ensure_future(self.disconnect())
+                return False
+            if self.policy == 'drop':
+                self.dropped += 1
+                return False
+            self._lagging_seen += 1
+            if self._lagging_seen % self.sample_rate:
+                self.dropped += 1
+                return False
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft()
+                self.dropped += 1
+        self.queue.append((time.monotonic(), message))
+        self.ready.set()
+        return True
+
+    async def disconnect(self, timeout: float = 2.0):
+        """Ferme la connexion avec `close_reason`, sans attendre indéfiniment un client bloqué"""
+        if self.writer_task:
+            self.writer_task.cancel()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=1008, reason=self.close_reason or ''), timeout)
+        except Exception:
+            # Tampon d'envoi saturé : la trame de fermeture ne peut pas partir
+            self.websocket.transport.abort()
+
+    async def run_writer(self):
+        """Vide la file du client dans l'ordre, au rythme de sa connexion"""
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.queue:
+                enqueued_at, message = self.queue.popleft()
+                await self.websocket.send(message)
+                self.sent += 1
+                self.lag_ms = (time.monotonic() - enqueued_at) * 1000.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        host, port = self.address[:2] if self.address else ('?', 0)
+        return {
+            'address': f"{host}:{port}",
+            'delivery': self.delivery,
+            'encoding': self.encoding,
+            'include_features': self.include_features,
+            'stats_mode': self.stats_mode,
+            'subscription': self.subscription.describe(),
+            'queue_depth': len(self.queue),
+            'lag_ms': round(max(self.lag_ms, self.lag()), 1),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'policy': self.policy
+        }
+
+def diff_stats(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Différence entre deux instantanés de stats : seules les valeurs modifiées.
+
+    Les dictionnaires imbriqués sont comparés récursivement ; les listes et
+    scalaires modifiés sont renvoyés en entier ; une clé disparue vaut None.
+    """
+    delta = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            nested = diff_stats(old, value)
+            if nested:
+                delta[key] = nested
+        elif key not in previous or value != old:
+            delta[key] = value
+    for key in previous.keys() - current.keys():
+        delta[key] = None
+    return delta
+
+class PeriodicScheduler:
+    """Planificateur des messages de contrôle (stats, interfaces).
+
+    Une seule tâche dort jusqu'à la prochaine échéance. Les échéances sont
+    calculées sur l'horloge monotone de la boucle : pas de dérive, et une
+    échéance manquée est reportée au lieu d'être rattrapée en rafale.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger('SentinelCapture')
+        self.jobs: List[Dict[str, Any]] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, interval: float, callback: Callable[[], Any], run_now: bool = False):
+        """Enregistre `callback` (fonction ou coroutine) toutes les `interval` secondes ; 0 la désactive"""
+        if interval <= 0:
+            self.logger.info(f"Tâche périodique désactivée: {name}")
+            return
+        self.jobs.append({
+            'name': name, 'interval': interval, 'callback': callback,
+            'run_now': run_now, 'next_run': None, 'runs': 0, 'errors': 0, 'last_ms': 0.0
+        })
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        for job in self.jobs:
+            job['next_run'] = now if job['run_now'] else now + job['interval']
+        if not self.jobs:
+            await asyncio.Future()
+        while True:
+            job = min(self.jobs, key=lambda entry: entry['next_run'])
+            delay = job['next_run'] - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            start = time.perf_counter()
+            try:
+                result = job['callback']()
+                if asyncio.iscoroutine(result):
+                    await result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job['errors'] += 1
+                self.logger.error(f"Erreur dans la tâche périodique {job['name']}: {e}")
+            job['runs'] += 1
+            job['last_ms'] = (time.perf_counter() - start) * 1000.0
+            job['next_run'] += job['interval']
+            if job['next_run'] <= loop.time():
+                job['next_run'] = loop.time() + job['interval']
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            job['name']: {
+                'interval_s': job['interval'], 'runs': job['runs'],
+                'errors': job['errors'], 'last_ms': round(job['last_ms'], 2)
+            }
+            for job in self.jobs
+        }
+
+def file_signature(path: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Date de modification et taille d'un fichier, None s'il n'existe pas"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+class ModelRelease:
+    """Modèle prêt à servir : estimateur, schéma, forêt compilée et provenance, préparés
+    ensemble hors du chemin critique puis installés d'un bloc"""
+
+    __slots__ = ('model', 'schema', 'forest', 'info', 'signature')
+
+    def __init__(self, model, schema: FeatureSchema, forest: Optional[CompiledForest],
+                 info: Dict[str, Any], signature: Optional[Tuple[int, int]]):
+        self.model = model
+        self.schema = schema
+        self.forest = forest
+        self.info = info
+        self.signature = signature
+
+def latency_percentiles(samples) -> Dict[str, float]:
+    if not samples:
+        return {'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    values = np.fromiter(samples, dtype=np.float64)
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+class ShadowScorer:
+    """Modèle fantôme : rescore un échantillon des lots du modèle principal dans son propre
+    thread et compare les verdicts, qui ne sont jamais diffusés.
+
+    Un lot sur `sample_rate` est copié dans une file bornée ; si le thread
+    fantôme est en retard, le lot est ignoré (compté dans `dropped`) plutôt
+    que de ralentir le chemin principal. Les colonnes et les codes
+    catégoriels sont convertis si le fantôme utilise un autre schéma.
+    """
+
+    def __init__(self, release: 'ModelRelease', sample_rate: int = 10, max_pending: int = 8, window: int = 1000):
+        self.release = release
+        self.sample_rate = max(1, sample_rate)
+        self.queue: Queue = Queue(maxsize=max_pending)
+        self.window = window
+        self.running = Event()
+        self.thread: Optional[Thread] = None
+        self._tick = 0
+        self._lock = Lock()
+        self._source: Optional[FeatureSchema] = None
+        self._columns: Optional[np.ndarray] = None
+        self._lookups: Dict[int, np.ndarray] = {}
+        self.reset()
+
+    def reset(self):
+        """Repart de zéro, par exemple quand le modèle principal change"""
+        with self._lock:
+            self.counts = {
+                'batches': 0, 'rows': 0, 'dropped': 0, 'errors': 0, 'disagreements': 0,
+                'primary_only_anomalies': 0, 'shadow_only_anomalies': 0,
+                'primary_anomalies': 0, 'shadow_anomalies': 0
+            }
+            self.score_delta = 0.0
+            self.latency = {'primary': deque(maxlen=self.window), 'shadow': deque(maxlen=self.window)}
+            self.last_error: Optional[str] = None
+            self.since = datetime.now().isoformat()
+
+    def start(self):
+        if self.running.is_set():
+            return
+        self.running.set()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self.running.clear()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+
+    def offer(self, schema: FeatureSchema, matrix: np.ndarray, anomalous: np.ndarray,
+              scores: np.ndarray, latency_ms: float):
+        """Appelé par le thread d'inférence après chaque lot scoré par le modèle principal"""
+        self._tick += 1
+        if self._tick % self.sample_rate:
+            return
+        try:
+            self.queue.put_nowait((schema, matrix.copy(), anomalous, scores, latency_ms))
+        except Full:
+            with self._lock:
+                self.counts['dropped'] += 1
+
+    def _run(self):
+        while self.running.is_set():
+            try:
+                schema, matrix, primary_anomalous, primary_scores, primary_ms = self.queue.get(timeout=0.5)
+            except Empty:
+                continue
+            try:
+                release = self.release
+                rows = self._translate(schema, matrix)
+                started = time.perf_counter()
+                if release.forest is not None and np.isfinite(rows).all():
+                    probabilities = release.forest.predict_proba(rows)
+                else:
+                    probabilities = predict_proba(release.model, rows)
+                shadow_ms = (time.perf_counter() - started) * 1000.0
+                anomalous = release.model.classes_[probabilities.argmax(axis=1)] == 1
+                scores = probabilities[:, 1] if probabilities.shape[1] > 1 else probabilities[:, 0]
+                self._record(primary_anomalous, primary_scores, primary_ms, anomalous, scores, shadow_ms)
+            except Exception as e:
+                with self._lock:
+                    self.counts['errors'] += 1
+                    self.last_error = str(e)
+
+    def _translate(self, schema: FeatureSchema, matrix: np.ndarray) -> np.ndarray:
+        """Réordonne les colonnes et recode les catégories du schéma principal vers celui du fantôme"""
+        target = self.release.schema
+        if schema is not self._source:
+            self._columns = np.array([schema.index[name] for name in target.names])
+            self._lookups = {}
+            for column, values in target.categories.items():
+                source_values = schema.categories.get(column, [])
+                if source_values != values:
+                    # Dernière entrée : code inconnu (-1 côté principal) reste inconnu côté fantôme
+                    self._lookups[target.index[column]] = np.array(
+                        [target.encode(column, value) for value in source_values] + [-1.0], dtype=np.float32)
+            self._source = schema
+        rows = matrix[:, self._columns]
+        for column, table in self._lookups.items():
+            codes = rows[:, column].astype(np.int64)
+            codes[(codes < 0) | (codes >= len(table) - 1)] = len(table) - 1
+            rows[:, column] = table[codes]
+        return rows
+
+    def _record(self, primary_anomalous: np.ndarray, primary_scores: np.ndarray, primary_ms: float,
+                anomalous: np.ndarray, scores: np.ndarray, shadow_ms: float):
+        with self._lock:
+            counts = self.counts
+            counts['batches'] += 1
+            counts['rows'] += len(anomalous)
+            counts['disagreements'] += int((primary_anomalous != anomalous).sum())
+            counts['primary_only_anomalies'] += int((primary_anomalous & ~anomalous).sum())
+            counts['shadow_only_anomalies'] += int((anomalous & ~primary_anomalous).sum())
+            counts['primary_anomalies'] += int(primary_anomalous.sum())
+            counts['shadow_anomalies'] += int(anomalous.sum())
+            self.score_delta += float(np.abs(primary_scores - scores).sum())
+            self.latency['primary'].append(primary_ms)
+            self.latency['shadow'].append(shadow_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.counts)
+            rows = counts['rows']
+            primary_latency = latency_percentiles(self.latency['primary'])
+            shadow_latency = latency_percentiles(self.latency['shadow'])
+            score_delta, last_error, since = self.score_delta, self.last_error, self.since
+        info = self.release.info
+        return {
+            'model': {
+                'version': getattr(self.release.model, 'version', 'N/A'), 'path': info.get('path'),
+                'evaluator': 'compiled' if self.release.forest is not None else 'sklearn'
+            },
+            'sample_rate': self.sample_rate,
+            'since': since,
+            **counts,
+            'disagreement_rate': round(counts['disagreements'] / rows, 6) if rows else 0.0,
+            'primary_anomaly_rate': round(counts['primary_anomalies'] / rows, 6) if rows else 0.0,
+            'shadow_anomaly_rate': round(counts['shadow_anomalies'] / rows, 6) if rows else 0.0,
+            'mean_score_delta': round(score_delta / rows, 6) if rows else 0.0,
+            'latency': {'primary': primary_latency, 'shadow': shadow_latency},
+            'last_error': last_error
+        }
+
+class CaptureSource:
+    """Une source de capture (interface ou pcap rejoué) : son thread, son filtre et ses compteurs.
+
+    Avec un état de features par interface, la source possède aussi son
+    extracteur ; sinon `extractor` vaut None et l'extracteur du service est
+    partagé par toutes les interfaces.
+    """
+
+    def __init__(self, name: Optional[str], filter_expr: str = '',
+                 extractor: Optional[NetworkFeatureExtractor] = None):
+        self.name = name
+        self.filter_expr = filter_expr
+        self.extractor = extractor
+        self.feature_row = extractor.schema.new_row() if extractor is not None else None
+        self.thread: Optional[Thread] = None
+        self.ring: Optional[TPacketRing] = None
+        self.socket = None
+        self._lock = Lock()
+        self.started: Optional[float] = None
+        self.error: Optional[str] = None
+        self.stats = {'packets': 0, 'bytes': 0, 'kernel_packets': 0, 'kernel_drops': 0}
+
+    def attach_socket(self, sock):
+        with self._lock:
+            self.socket = sock
+
+    def detach_socket(self):
+        self.read_kernel_stats()
+        with self._lock:
+            self.socket = None
+
+    def read_kernel_stats(self):
+        """Cumule les compteurs du noyau du socket scapy (remis à zéro à chaque lecture)"""
+        with self._lock:
+            if self.socket is None:
+                return
+            counters = read_socket_stats(getattr(self.socket, 'ins', self.socket))
+        if counters is not None:
+            self.stats['kernel_packets'] += counters[0]
+            self.stats['kernel_drops'] += counters[1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        elapsed = time.time() - self.started if self.started else 0.0
+        if self.ring is not None:
+            ring = self.ring.get_stats()
+            kernel_packets, kernel_drops = ring['packets'], ring['drops']
         else:
-            features['dst_host_same_srv_rate'] = 1.0
-            features['dst_host_diff_srv_rate'] = 0.0
-            
-        return features
+            self.read_kernel_stats()
+            kernel_packets, kernel_drops = self.stats['kernel_packets'], self.stats['kernel_drops']
+        return {
+            'interface': self.name or 'par défaut',
+            'filter': self.filter_expr or None,
+            'capturing': self.thread is not None and self.thread.is_alive(),
+            'packets': self.stats['packets'],
+            'bytes': self.stats['bytes'],
+            'packets_per_second': round(self.stats['packets'] / max(elapsed, 1), 2),
+            'kernel_packets': kernel_packets,
+            'kernel_drops': kernel_drops,
+            'feature_state': 'interface' if self.extractor is not None else 'shared',
+            'error': self.error
+        }
 
 class SentinelPacketCapture:
-    def get_model_info(self) -> dict:
-        """Retourne les infos du modèle chargé (nom, version, features, hyperparams, etc.)"""
-        info = {
-            'name': type(self.model).__name__ if self.model else 'None',
-            'version': getattr(self.model, 'version', 'N/A'),
-            'features': getattr(self.model, 'feature_names_in_', []),
-            'hyperparameters': self.model.get_params() if self.model else {},
-            'is_dummy': getattr(self.model, 'is_dummy', False),
-        }
-        return info
     """Service principal de capture et d'analyse de paquets"""
     
     def __init__(self, config: Dict[str, Any]):
         self.config = config
-        self.feature_extractor = NetworkFeatureExtractor()
+        # 'all' : un seul processus ; 'serve' / 'capture' : les deux moitiés de la topologie split
+        self.role = config.get('role', 'all')
+        self.started_at = time.time()
+        # Capture : liaison vers le processus de diffusion ; diffusion : état du processus de capture
+        self.link: Optional[CaptureLink] = None
+        self.endpoint: Optional[CaptureEndpoint] = None
+        self._capture_stats: Optional[Dict[str, Any]] = None
+        self._capture_process: Optional[multiprocessing.Process] = None
+        self._request_ids = itertools.count(1)
+        self._requesters: 'weakref.WeakValueDictionary[int, ClientSession]' = weakref.WeakValueDictionary()
+        # Commandes relayées encore sans réponse : une erreur leur est renvoyée si la liaison tombe
+        self._unanswered: set = set()
+        self.schema = FeatureSchema()
+        self.feature_extractor = NetworkFeatureExtractor(schema=self.schema)
+        self.feature_row = self.schema.new_row()
         self.model: Optional[RandomForestClassifier] = None
-        self.packet_queue = asyncio.Queue(maxsize=1000)
-        self.connected_clients = set()
+        # Forêt aplatie évaluée en NumPy vectorisé (None : predict_proba de sklearn)
+        self.forest: Optional[CompiledForest] = None
+        # Provenance et temps de chargement du modèle, repris par get_model_info
+        self.model_load: Dict[str, Any] = {}
+        # Rechargement à chaud : modèle préparé en attente de bascule par le thread de capture
+        self._pending_release: Optional[ModelRelease] = None
+        self._swap_lock = Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._model_signature: Optional[Tuple[int, int]] = None
+        self._model_file_seen: Optional[Tuple[int, int]] = None
+        self.reload_stats = {'reloads': 0, 'failed': 0, 'last_error': None}
+        # Modèle fantôme comparé au principal sur un échantillon de lots (jamais diffusé)
+        self.shadow: Optional[ShadowScorer] = None
+        # Incrémenté à chaque bascule : un verdict de l'ancien modèle n'entre pas dans le cache
+        self.model_generation = 0
+        self.packet_queue = LoopBridge(
+            maxsize=config.get('max_packet_queue', 1000),
+            policy=config.get('queue_policy', 'block'),
+            sample_rate=config.get('queue_sample_rate', 10)
+        )
+        self.connected_clients: Dict[Any, ClientSession] = {}
+        # Abonnements partagés entre clients identiques (libérés avec le dernier client)
+        self.subscriptions: 'weakref.WeakValueDictionary[Any, Subscription]' = weakref.WeakValueDictionary()
         self.is_capturing = Event()
-        self.capture_thread: Optional[Thread] = None
+        # Une source par interface capturée (ou le pcap rejoué), chacune avec son thread
+        self.sources: List[CaptureSource] = []
+        # Extraction, table de flux et batcher n'acceptent qu'un producteur à la fois
+        self._ingest_lock = Lock()
+        self._active_sources = 0
+        # Numéro de séquence des paquets : id(packet) est réutilisé dès qu'un paquet est libéré
+        self._packet_seq = itertools.count()
+        # Source des paquets : capture live (sniff) ou rejeu d'un fichier pcap/pcapng
+        self.pcap_path: Optional[str] = config.get('pcap') or None
+        self.replay_speed = parse_replay_speed(config.get('pcap_speed', 'fast'))
+        self.replay_stats = {'packets': 0, 'finished': False, 'started': None, 'ended': None}
+        self.capture_backend = config.get('capture_backend', 'scapy')
+        if self.capture_backend not in CAPTURE_BACKENDS:
+            raise ValueError(f"Backend de capture inconnu: {self.capture_backend} (attendu: {', '.join(CAPTURE_BACKENDS)})")
+        # Classification par paquet (historique) ou par connexion, via la table de flux
+        self.classification = config.get('classification', 'packet')
+        if self.classification not in CLASSIFICATION_MODES:
+            raise ValueError(f"Mode de classification inconnu: {self.classification} (attendu: {', '.join(CLASSIFICATION_MODES)})")
+        self.flow_table: Optional[FlowTable] = None
+        if self.classification == 'flow':
+            self.flow_table = FlowTable(
+                max_flows=config.get('flow_max', 100000),
+                idle_timeout=config.get('flow_idle_timeout', 30.0),
+                checkpoint_interval=config.get('flow_checkpoint_interval', 60.0)
+            )
+            self.schema = FeatureSchema(categories=FLOW_CATEGORY_TABLES)
+            self.feature_extractor.schema = self.schema
+            self.feature_row = self.schema.new_row()
+        self._pending_features = self.schema.to_dict(self.schema.defaults)
+        # Verdicts réutilisés pour les vecteurs quasi identiques d'un même flux (0 = désactivé)
+        self.verdict_cache: Optional[VerdictCache] = None
+        if config.get('verdict_cache_size', 50000) > 0:
+            self.verdict_cache = VerdictCache(
+                max_entries=config.get('verdict_cache_size', 50000),
+                ttl=config.get('verdict_cache_ttl', 60.0),
+                rescore_every=config.get('verdict_cache_rescore_every', 100),
+                resolution=config.get('verdict_cache_resolution', 8.0),
+                categorical=[self.schema.index[name] for name in self.schema.categories]
+            )
+        # Enregistrements de flux scorés, diffusés aux clients abonnés au flux `flows`
+        self.flow_queue = LoopBridge(maxsize=config.get('max_packet_queue', 1000), policy='drop-oldest')
+        self.batcher = InferenceBatcher(
+            self._score_flows if self.flow_table is not None else self._score_batch,
+            n_features=self.schema.size,
+            batch_size=config.get('batch_size', 256),
+            max_delay_ms=config.get('batch_timeout_ms', 5.0)
+        )
+        # Scoring dans des processus séparés, hors du GIL du service (0 = dans le thread d'inférence)
+        self.pool: Optional[InferencePool] = None
+        if config.get('inference_workers', 0) > 0:
+            self.pool = InferencePool(
+                config['inference_workers'], n_features=self.schema.size,
+                batch_rows=self.batcher.batch_size, logger=logging.getLogger('SentinelCapture')
+            )
+        # Features et fenêtres réparties entre des processus par adresse (0 = extraction dans le thread de capture)
+        self.shards: Optional[FeatureShards] = None
+        if config.get('feature_shards', 0) > 0:
+            if self.flow_table is not None:
+                logging.getLogger('SentinelCapture').warning("Extraction shardée ignorée en mode flux : les features y sont calculées par connexion")
+            else:
+                self.shards = FeatureShards(
+                    config['feature_shards'], window_seconds=self.feature_extractor.window_seconds,
+                    logger=logging.getLogger('SentinelCapture')
+                )
+        # Dégradation contrôlée en surcharge plutôt que des pertes silencieuses du noyau. Pas en
+        # rejeu : il attend le pipeline sans rien perdre et doit rester déterministe
+        self.shedder: Optional[LoadShedder] = None
+        if config.get('load_shedding', True) and not self.pcap_path:
+            self.shedder = LoadShedder(
+                latency_budget_ms=config.get('shed_latency_ms', 50.0),
+                sample_rate=config.get('shed_sample_rate', 10)
+            )
+        self._shed_batches = 0
         
         self.stats = {
             'total_packets': 0, 'packets_per_second': 0, 'anomalies_detected': 0, 'start_time': None
         }
         
         self._setup_logging()
+        # Messages de contrôle : stats à intervalle fixe, interfaces seulement si elles changent
+        self.scheduler = PeriodicScheduler(self.logger)
+        self.interfaces: Optional[List[Dict[str, str]]] = None
+        self._stats_snapshot: Optional[Dict[str, Any]] = None
+        self._stats_seq = 0
+        self._last_keyframe = 0.0
         
     def _setup_logging(self):
         log_level = getattr(logging, self.config.get('log_level', 'INFO').upper())
@@ -240,21 +1543,266 @@ class SentinelPacketCapture:
         )
         self.logger = logging.getLogger('SentinelCapture')
         
+    def get_model_info(self) -> dict:
+        """Retourne les infos du modèle chargé (nom, version, features, hyperparams, etc.)"""
+        info = {
+            'name': type(self.model).__name__ if self.model else 'None',
+            'version': getattr(self.model, 'version', 'N/A'),
+            'features': list(self.schema.names) if self.model else [],
+            'hyperparameters': self.model.get_params() if self.model else {},
+            'is_dummy': getattr(self.model, 'is_dummy', False),
+            'evaluator': 'compiled' if self.forest is not None else 'sklearn',
+            **self.model_load,
+            'reload': dict(self.reload_stats),
+            'shadow': self.shadow.get_stats() if self.shadow is not None else None
+        }
+        return info
+
+    def get_model_comparison(self) -> Dict[str, Any]:
+        """Modèle principal contre modèle fantôme, sur les lots échantillonnés depuis `since`"""
+        return {
+            'primary': {
+                'version': getattr(self.model, 'version', 'N/A'), 'path': self.model_load.get('path'),
+                'evaluator': 'compiled' if self.forest is not None else 'sklearn'
+            },
+            'shadow': self.shadow.get_stats() if self.shadow is not None else None
+        }
+
     def load_model(self, model_path: str) -> bool:
         try:
-            if not os.path.exists(model_path):
-                self.logger.warning(f"Modèle non trouvé: {model_path}")
-                self.logger.info("Utilisation d'un modèle factice pour la démonstration")
-                self.model = self._create_dummy_model()
-                return True
-                
-            self.logger.info("Modèle chargé (factice pour la démo)")
-            self.model = self._create_dummy_model()
-            return True
-            
+            release = self._prepare_model(model_path, dummy_fallback=True)
         except Exception as e:
             self.logger.error(f"Erreur lors du chargement du modèle: {e}")
             return False
+        self._model_signature = self._model_file_seen = release.signature
+        self._swap_model(release)
+        return True
+
+    def load_shadow_model(self, model_path: str) -> bool:
+        """Charge le modèle fantôme : il rescore un échantillon des lots, sans jamais produire de verdict"""
+        if not os.path.exists(model_path):
+            self.logger.error(f"Modèle fantôme non trouvé: {model_path}")
+            return False
+        try:
+            release = self._prepare_model(model_path)
+        except Exception as e:
+            self.logger.error(f"Erreur lors du chargement du modèle fantôme: {e}")
+            return False
+        if self.shadow is not None:
+            self.shadow.stop()
+        self.shadow = ShadowScorer(release, sample_rate=self.config.get('shadow_sample_rate', 10))
+        self.shadow.start()
+        self.logger.info(f"Modèle fantôme actif ({model_path}), un lot sur {self.shadow.sample_rate} comparé")
+        return True
+
+    def _prepare_model(self, model_path: str, dummy_fallback: bool = False) -> 'ModelRelease':
+        """Charge, compile et réchauffe un modèle sans toucher à celui en service (tout thread).
+
+        Le modèle factice ne remplace un fichier absent qu'au démarrage
+        (`dummy_fallback`) : un rechargement sans fichier lève une erreur.
+        """
+        started = time.perf_counter()
+        mmap = self.config.get('model_mmap', True)
+        signature = file_signature(model_path)
+        if signature is not None:
+            model, metadata = load_artifact(model_path, FEATURE_ORDER, mmap=mmap)
+            artifact_path, source = model_path, 'file'
+        elif not dummy_fallback:
+            raise FileNotFoundError(f"Modèle non trouvé: {model_path}")
+        else:
+            self.logger.warning(f"Modèle non trouvé: {model_path}")
+            self.logger.info("Utilisation d'un modèle factice pour la démonstration")
+            model, metadata, artifact_path, source = self._load_dummy_model()
+        if metadata['feature_order'] == 'assumed':
+            self.logger.warning("Le modèle ne nomme pas ses features : ordre KDD standard supposé")
+        elif metadata['feature_order'] == 'reordered':
+            self.logger.info("Features du modèle dans un ordre différent : colonnes réordonnées par le schéma")
+        load_ms = (time.perf_counter() - started) * 1000
+
+        categories = FLOW_CATEGORY_TABLES if self.flow_table is not None else CATEGORY_TABLES
+        schema = FeatureSchema.from_model(model, categories, metadata.get('feature_names'))
+        info = {
+            'path': artifact_path, 'source': source, 'format': metadata.get('format'),
+            'mmap': mmap and artifact_path is not None, 'load_time_ms': round(load_ms, 1)
+        }
+        forest = self._compile_forest(model, artifact_path, info)
+        # Premier lot hors service : pages mappées chargées et modèle vérifié avant la bascule
+        warm_started = time.perf_counter()
+        warm = schema.new_batch(self.batcher.batch_size)
+        predict_proba(model, warm[:1])
+        if forest is not None:
+            forest.predict_proba(warm)
+        info['warmup_time_ms'] = round((time.perf_counter() - warm_started) * 1000, 1)
+        self.logger.info(f"Modèle chargé ({source}: {artifact_path or 'mémoire'}, "
+                         f"version {getattr(model, 'version', 'N/A')}) en {load_ms:.1f} ms")
+        return ModelRelease(model, schema, forest, info, signature)
+
+    def _load_dummy_model(self) -> Tuple[RandomForestClassifier, Dict[str, Any], Optional[str], str]:
+        """Modèle factice relu depuis son cache disque ; entraîné et enregistré une seule fois"""
+        path = self.config.get('dummy_model_path', 'models/dummy_model.joblib')
+        if path and os.path.exists(path):
+            try:
+                model, metadata = load_artifact(path, FEATURE_ORDER, mmap=self.config.get('model_mmap', True))
+                return model, metadata, path, 'dummy-cache'
+            except Exception as e:
+                self.logger.warning(f"Modèle factice en cache illisible ({path}), réentraînement: {e}")
+        model = self._create_dummy_model()
+        metadata = {'format': 'estimator', 'feature_order': 'exact', 'feature_names': list(FEATURE_ORDER)}
+        if not path:
+            return model, metadata, None, 'dummy-trained'
+        try:
+            save_artifact(model, path, is_dummy=True)
+        except OSError as e:
+            self.logger.warning(f"Modèle factice non enregistré ({path}): {e}")
+            return model, metadata, None, 'dummy-trained'
+        return model, {**metadata, 'format': 'sentinel-model'}, path, 'dummy-trained'
+
+    def _compile_forest(self, model, model_path: Optional[str], info: Dict[str, Any]) -> Optional[CompiledForest]:
+        """Aplatit la forêt pour l'évaluateur vectorisé, en réutilisant la version compilée
+        enregistrée à côté du fichier modèle si elle correspond"""
+        if not self.config.get('compiled_forest', True):
+            return None
+        started = time.perf_counter()
+        persist = bool(model_path) and os.path.exists(model_path)
+        try:
+            forest, source = None, 'compilée'
+            if persist:
+                fingerprint = model_fingerprint(model, model_path)
+                forest = CompiledForest.load(cache_path(model_path), fingerprint,
+                                             mmap=self.config.get('model_mmap', True))
+                source = 'relue depuis le cache'
+            if forest is None:
+                forest, source = CompiledForest.from_sklearn(model), 'compilée'
+                if persist:
+                    try:
+                        forest.save(cache_path(model_path), fingerprint)
+                    except OSError as e:
+                        self.logger.warning(f"Forêt compilée non enregistrée ({cache_path(model_path)}): {e}")
+        except ValueError as e:
+            self.logger.info(f"Évaluateur compilé indisponible ({e}), predict_proba de sklearn utilisé")
+            return None
+        forest_ms = (time.perf_counter() - started) * 1000
+        info['forest_time_ms'] = round(forest_ms, 1)
+        self.logger.info(f"Forêt {source}: {forest.n_trees} arbres, {forest.n_nodes} nœuds, "
+                         f"profondeur {forest.max_depth} ({forest_ms:.1f} ms)")
+        return forest
+
+    def _swap_model(self, release: 'ModelRelease'):
+        """Met en service un modèle préparé, sans interrompre la capture.
+
+        Capture arrêtée : installation immédiate. Sinon le thread de capture
+        passe l'extraction au nouveau schéma entre deux paquets et place une
+        barrière dans le batcher : les lignes déjà en file sont scorées par
+        l'ancien modèle, les suivantes par le nouveau. Si plus aucune source ne
+        tourne (rejeu terminé, source en erreur), la bascule est faite ici.
+        """
+        if not self.is_capturing.is_set():
+            self._install_extraction(release)
+            self._install_scoring(release)
+            return
+        with self._swap_lock:
+            self._pending_release = release
+        # Sans attente : un thread de capture peut tenir le verrou en attendant cette boucle
+        # (politique block). S'il le tient, il appliquera la bascule, à la sortie au plus tard
+        if self._ingest_lock.acquire(blocking=False):
+            try:
+                if self._active_sources == 0:
+                    self._activate_pending_model()
+            finally:
+                self._ingest_lock.release()
+
+    def _activate_pending_model(self):
+        """Bascule demandée par _swap_model, appliquée par le thread de capture"""
+        with self._swap_lock:
+            release, self._pending_release = self._pending_release, None
+        if release is None:
+            return
+        self._install_extraction(release)
+        self.batcher.barrier(lambda: self._install_scoring(release))
+
+    def _install_extraction(self, release: 'ModelRelease'):
+        schema = release.schema
+        self.feature_extractor.schema = schema
+        self.feature_row = schema.new_row()
+        for source in self.sources:
+            if source.extractor is not None:
+                source.extractor.schema = schema
+                source.feature_row = schema.new_row()
+        self._pending_features = schema.to_dict(schema.defaults)
+
+    def _install_scoring(self, release: 'ModelRelease'):
+        """Côté inférence : appelé entre deux lots, seul lecteur du modèle à ce moment"""
+        self.model = release.model
+        self.schema = release.schema
+        self.forest = release.forest
+        self.model_load = release.info
+        self.model_generation += 1
+        pool = self.pool
+        if pool is not None and pool.running.is_set():
+            # Chaque processus change de modèle après les lots qu'il a déjà reçus
+            pool.set_model(release.model, release.forest)
+        if self.shadow is not None:
+            # La comparaison en cours portait sur l'ancien modèle principal
+            if pool is not None and pool.running.is_set():
+                pool.call_in_order(self.shadow.reset)
+            else:
+                self.shadow.reset()
+        if self.verdict_cache is not None:
+            # Nouveau modèle ou nouvel ordre de colonnes : les verdicts en cache ne valent plus
+            self.verdict_cache.categorical = [release.schema.index[name] for name in release.schema.categories]
+            self.verdict_cache.clear()
+        if self.shedder is not None:
+            self.shedder.forget_flows()
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._broadcast_model_info)
+            except RuntimeError:
+                # Boucle fermée pendant l'arrêt du service : plus personne à prévenir
+                pass
+
+    def request_model_reload(self, reason: str, session: Optional['ClientSession'] = None) -> bool:
+        """Lance le rechargement de SENTINEL_MODEL_PATH en tâche de fond (boucle asyncio)"""
+        if self._reload_task is not None and not self._reload_task.done():
+            return False
+        self._reload_task = asyncio.create_task(self._reload_model(reason, session))
+        return True
+
+    async def _reload_model(self, reason: str, session: Optional['ClientSession']):
+        model_path = self.config.get('model_path', '')
+        self.logger.info(f"Rechargement du modèle ({reason}): {model_path}")
+        self._model_signature = file_signature(model_path)
+        try:
+            release = await asyncio.to_thread(self._prepare_model, model_path)
+            self._model_signature = release.signature
+        except Exception as e:
+            self.reload_stats['failed'] += 1
+            self.reload_stats['last_error'] = str(e)
+            self.logger.error(f"Rechargement refusé, le modèle en service est conservé: {e}")
+            if session is not None:
+                session.enqueue(json.dumps({'type': 'error', 'data': f"Rechargement du modèle refusé: {e}"}), droppable=False)
+            return
+        self.reload_stats['reloads'] += 1
+        self.reload_stats['last_error'] = None
+        self._swap_model(release)
+
+    def _check_model_file(self):
+        """Surveille SENTINEL_MODEL_PATH : rechargement quand le fichier a changé puis est resté
+        identique d'un relevé au suivant (copie terminée)"""
+        signature = file_signature(self.config.get('model_path', ''))
+        previous, self._model_file_seen = self._model_file_seen, signature
+        if signature is None or signature == self._model_signature or signature != previous:
+            return
+        self.request_model_reload('fichier modifié')
+
+    def _broadcast_model_info(self):
+        message = json.dumps({'type': 'model_info', 'data': self.get_model_info()})
+        if self.link is not None:
+            # Topologie split : les clients sont servis par l'autre processus
+            self.link.send(FRAME_BROADCAST, message.encode('utf-8'))
+            return
+        for session in list(self.connected_clients.values()):
+            session.enqueue(message, droppable=False)
     
     def _create_dummy_model(self) -> RandomForestClassifier:
         np.random.seed(42)
@@ -264,16 +1812,7 @@ class SentinelPacketCapture:
         model.fit(X, y)
         model.is_dummy = True
         model.version = 'dummy-1.0'
-        model.feature_names_in_ = [
-            "duration", "protocol_type", "service", "flag", "src_bytes", "dst_bytes", "land", "wrong_fragment",
-            "urgent", "hot", "num_failed_logins", "logged_in", "num_compromised", "root_shell", "su_attempted",
-            "num_root", "num_file_creations", "num_shells", "num_access_files", "num_outbound_cmds",
-            "is_host_login", "is_guest_login", "count", "srv_count", "serror_rate", "srv_serror_rate",
-            "rerror_rate", "srv_rerror_rate", "same_srv_rate", "diff_srv_rate", "srv_diff_host_rate",
-            "dst_host_count", "dst_host_srv_count", "dst_host_same_srv_rate", "dst_host_diff_srv_rate",
-            "dst_host_same_src_port_rate", "dst_host_srv_diff_host_rate", "dst_host_serror_rate",
-            "dst_host_srv_serror_rate", "dst_host_rerror_rate", "dst_host_srv_rerror_rate"
-        ]
+        model.feature_names_in_ = list(FEATURE_ORDER)
         self.logger.info("Modèle factice créé pour la démonstration")
         return model
     
@@ -298,106 +1837,325 @@ class SentinelPacketCapture:
             self.logger.error(f"Erreur lors de la récupération des interfaces: {e}")
         return interfaces
     
-    def packet_handler(self, packet):
+    def packet_handler(self, packet, source: Optional[CaptureSource] = None):
         if not self.is_capturing.is_set(): return
+        with self._ingest_lock:
+            self._ingest(packet, source)
+
+    def _ingest(self, packet, source: Optional[CaptureSource]):
+        if self._pending_release is not None:
+            self._activate_pending_model()
+        if self.shedder is not None and self.shedder.due():
+            self._observe_load()
             
         try:
             self.stats['total_packets'] += 1
-            packet_info = self._extract_packet_info(packet)
-            features = self.feature_extractor.extract_features(packet)
-            packet_info['features'] = features
+            # En-têtes décodés une seule fois, partagés par les infos et les features
+            headers = decode_packet(packet)
+            packet_info = self._extract_packet_info(headers)
+            # Interface d'origine : le dashboard peut filtrer dessus
+            packet_info['interface'] = source.name if source is not None else None
+            if source is not None:
+                source.stats['packets'] += 1
+                source.stats['bytes'] += headers.length
+            if self.flow_table is not None:
+                # Mode flux : le paquet part tout de suite avec le dernier verdict de sa connexion
+                self._track_flow(headers, packet_info)
+                if not self._shed_live(packet_info):
+                    self._publish_packet(packet_info)
+                return
+            if self.shards is not None and self.model:
+                # Mode shardé : les features sont extraites par lot dans le thread d'inférence
+                self.batcher.submit((packet_info, headers), self.feature_row)
+                return
+            extractor, row = self.feature_extractor, self.feature_row
+            if source is not None and source.extractor is not None:
+                # État de features propre à l'interface
+                extractor, row = source.extractor, source.feature_row
+            extractor.extract_features_into(headers, row)
             
             if self.model:
-                prediction_result = self._predict_anomaly(features)
-                packet_info.update(prediction_result)
+                # Le score est calculé par lots dans le thread d'inférence
+                self.batcher.submit(packet_info, row)
             else:
+                packet_info['features'] = extractor.schema.to_dict(row)
                 packet_info.update({'prediction': 'Normal', 'anomaly_score': 0.1, 'threat_level': 'Informationnel'})
-            
-            asyncio.run(self.packet_queue.put(packet_info))
+                self._publish_packet(packet_info)
             
         except Exception as e:
             self.logger.error(f"Erreur lors du traitement du paquet: {e}")
     
+    def handle_frame(self, data: bytes, timestamp: Optional[float] = None, linktype: int = DLT_EN10MB,
+                     source: Optional[CaptureSource] = None):
+        """Point d'entrée des trames brutes (socket de capture, rejeu pcap) : aucune dissection scapy"""
+        if not self.is_capturing.is_set(): return
+        self.packet_handler(decode_raw(data, timestamp, linktype), source)
+    
+    def handle_frames(self, frames: List[Tuple[Any, float, int]], source: Optional[CaptureSource] = None):
+        """Traite un bloc entier de trames (data, horodatage, type de lien) lu dans l'anneau"""
+        for data, timestamp, linktype in frames:
+            self.handle_frame(data, timestamp, linktype, source)
+    
+    def _score_batch(self, batch: List[Any], feature_matrix: np.ndarray, done: Callable[[], None]):
+        if self.shards is not None:
+            # Éléments (infos paquet, en-têtes) : features du lot écrites dans la matrice, au schéma du modèle en service
+            self.feature_extractor.extract_batch_into(
+                [headers for _, headers in batch], feature_matrix, self.shards, self.schema
+            )
+            batch = [packet_info for packet_info, _ in batch]
+        # La matrice est réutilisée par le batcher : valeurs et schéma sont figés dès maintenant
+        schema, rows = self.schema, feature_matrix.tolist()
+
+        def publish(results: List[Dict[str, Any]]):
+            for packet_info, values, prediction_result in zip(batch, rows, results):
+                packet_info.update(prediction_result)
+                if self._shed_live(packet_info):
+                    continue
+                packet_info['features'] = schema.to_dict(values)
+                self._publish_packet(packet_info)
+            done()
+
+        self._predict_sampled([
+            (packet_info['protocol'], packet_info['sourceIp'], packet_info['sourcePort'],
+             packet_info['destinationIp'], packet_info['destinationPort'])
+            for packet_info in batch
+        ], feature_matrix, publish)
+    
+    def _publish_packet(self, packet_info: Dict[str, Any]):
+        self.packet_queue.put(packet_info)
+
+    def _shed_live(self, packet_info: Dict[str, Any]) -> bool:
+        """Vrai si un paquet d'apparence normale est écarté de la vue live (délestage sample-live)"""
+        shedder = self.shedder
+        return (shedder is not None and shedder.level >= SHED_SAMPLE_LIVE
+                and packet_info['prediction'] != 'Anomalie' and not shedder.keep_live())
+
+    def _observe_load(self):
+        """Mesure la charge du pipeline et ajuste le niveau de délestage"""
+        batcher = self.batcher
+        # Latence prise en compte seulement si des lots ont été scorés depuis la dernière mesure
+        batches = batcher.stats['batches']
+        latency_ms = batcher.stats['last_batch_latency_ms'] if batches != self._shed_batches else 0.0
+        self._shed_batches = batches
+        previous = self.shedder.level
+        level = self.shedder.observe(
+            self.packet_queue.qsize() / self.packet_queue.maxsize,
+            batcher.queue.qsize() / batcher.queue.maxsize,
+            latency_ms
+        )
+        if level != previous:
+            log = self.logger.warning if level > previous else self.logger.info
+            log(f"Délestage: niveau {level} ({SHED_LEVELS[level]}), pression {max(self.shedder.pressure.values()):.2f}")
+    
+    def _track_flow(self, headers: PacketHeaders, packet_info: Dict[str, Any]):
+        flow, emitted = self.flow_table.update(headers, packet_info['interface'])
+        for done, reason in emitted:
+            self._submit_flow(done, reason)
+        verdict = flow.verdict if flow is not None else None
+        packet_info['flowId'] = flow.id if flow is not None else None
+        packet_info['features'] = (flow.features if flow is not None and flow.features else None) or self._pending_features
+        packet_info.update(verdict or PENDING_VERDICT)
+        packet_info['verdictPending'] = verdict is None
+    
+    def _submit_flow(self, flow: Flow, reason: str):
+        """Extrait les features d'un flux émis et l'envoie au modèle (thread de capture uniquement)"""
+        record = flow.to_record(reason)
+        self.feature_extractor.extract_flow_features_into(flow, self.feature_row, final=reason != 'checkpoint')
+        if self.model:
+            self.batcher.submit((flow, record), self.feature_row)
+        else:
+            record['features'] = self.feature_extractor.schema.to_dict(self.feature_row)
+            record.update({'prediction': 'Normal', 'anomaly_score': 0.1, 'threat_level': 'Informationnel'})
+            self.flow_queue.put(record)
+    
+    def _score_flows(self, batch: List[Tuple[Flow, Dict[str, Any]]], feature_matrix: np.ndarray,
+                     done: Callable[[], None]):
+        schema, rows = self.schema, feature_matrix.tolist()
+
+        def publish(results: List[Dict[str, Any]]):
+            for (flow, record), values, prediction_result in zip(batch, rows, results):
+                record['features'] = schema.to_dict(values)
+                record.update(prediction_result)
+                # Repris par les paquets suivants du flux
+                flow.features = record['features']
+                flow.verdict = prediction_result
+                self.flow_queue.put(record)
+            done()
+
+        self._predict_sampled([flow.key for flow, _ in batch], feature_matrix, publish)
+    
+    def _capture_idle(self):
+        """Tâches d'un thread de capture quand aucun paquet n'arrive"""
+        with self._ingest_lock:
+            if self.shedder is not None and self.shedder.due():
+                self._observe_load()
+            self._expire_flows()
+            if self._pending_release is not None:
+                self._activate_pending_model()
+
+    def _expire_flows(self):
+        """Expiration sur inactivité quand aucun paquet n'arrive (appelé par le thread de capture)"""
+        if self.flow_table is None:
+            return
+        for flow, reason in self.flow_table.expire(self.flow_table.clock()):
+            self._submit_flow(flow, reason)
+    
+    def _run_source(self, target: Callable, source: CaptureSource):
+        try:
+            target(source)
+        except Exception as e:
+            source.error = str(e)
+            self.logger.error(f"Erreur pendant la capture ({source.name or 'par défaut'}): {e}")
+        finally:
+            with self._ingest_lock:
+                self._active_sources -= 1
+                # Fin de la dernière source : les flux encore ouverts sont émis
+                if self._active_sources == 0 and self.flow_table is not None:
+                    for flow, reason in self.flow_table.flush('end'):
+                        self._submit_flow(flow, reason)
+                # Plus aucun thread de capture pour appliquer un modèle en attente
+                if self._active_sources == 0 and self._pending_release is not None:
+                    self._activate_pending_model()
+    
     def _extract_packet_info(self, packet) -> Dict[str, Any]:
+        headers = decode_packet(packet)
         packet_info = {
-            'id': f"pkt_{int(time.time() * 1000)}_{id(packet)}",
-            'timestamp': datetime.now().isoformat(),
-            'size': len(packet),
+            'id': f"pkt_{int(time.time() * 1000)}_{next(self._packet_seq)}",
+            'timestamp': datetime.fromtimestamp(headers.timestamp).isoformat(),
+            'size': headers.length,
             'sourceIp': 'Unknown', 'destinationIp': 'Unknown',
             'sourcePort': 0, 'destinationPort': 0,
             'protocol': 'Unknown', 'flags': [], 'payloadPreview': ''
         }
         
         try:
-            if IP in packet:
-                ip_packet = packet[IP]
-                packet_info.update({'sourceIp': ip_packet.src, 'destinationIp': ip_packet.dst})
-                if TCP in packet:
-                    tcp_packet = packet[TCP]
+            if headers.ip_version:
+                packet_info.update({'sourceIp': headers.src, 'destinationIp': headers.dst})
+                protocol = headers.protocol
+                if protocol == 'tcp':
                     packet_info.update({
-                        'sourcePort': tcp_packet.sport, 'destinationPort': tcp_packet.dport,
-                        'protocol': 'TCP', 'flags': self._get_tcp_flags(tcp_packet)
+                        'sourcePort': headers.sport, 'destinationPort': headers.dport,
+                        'protocol': 'TCP', 'flags': headers.tcp_flag_names()
                     })
-                elif UDP in packet:
-                    udp_packet = packet[UDP]
-                    packet_info.update({'sourcePort': udp_packet.sport, 'destinationPort': udp_packet.dport, 'protocol': 'UDP', 'flags': []})
-                elif ICMP in packet:
+                elif protocol == 'udp':
+                    packet_info.update({'sourcePort': headers.sport, 'destinationPort': headers.dport, 'protocol': 'UDP', 'flags': []})
+                elif protocol == 'icmp':
                     packet_info.update({'protocol': 'ICMP', 'flags': []})
-            if hasattr(packet, 'payload') and packet.payload:
-                payload_str = str(packet.payload)[:100]
-                packet_info['payloadPreview'] = payload_str
+            shedder = self.shedder
+            if shedder is not None and shedder.level >= SHED_NO_PREVIEW:
+                shedder.stats['previews_skipped'] += 1
+            else:
+                packet_info['payloadPreview'] = headers.summary()[:100]
         except Exception as e:
             self.logger.warning(f"Erreur lors de l'extraction des infos paquet: {e}")
         return packet_info
     
-    def _get_tcp_flags(self, tcp_packet) -> List[str]:
-        flags = []
-        if hasattr(tcp_packet, 'flags'):
-            if tcp_packet.flags.S: flags.append('SYN')
-            if tcp_packet.flags.A: flags.append('ACK')
-            if tcp_packet.flags.F: flags.append('FIN')
-            if tcp_packet.flags.R: flags.append('RST')
-            if tcp_packet.flags.P: flags.append('PSH')
-            if tcp_packet.flags.U: flags.append('URG')
-        return flags
+    def _predict_sampled(self, flow_keys: List[Any], feature_matrix: np.ndarray,
+                         done: Callable[[List[Dict[str, Any]]], None]):
+        """Comme _predict_cached ; au délestage sample-flows, seule une ligne sur N d'un flux
+        déjà scoré passe par le modèle, les autres reprennent son dernier verdict"""
+        shedder = self.shedder
+        if shedder is None or shedder.level < SHED_SAMPLE_FLOWS:
+            self._predict_cached(flow_keys, feature_matrix, done)
+            return
+        results = shedder.reusable(flow_keys)
+        scored = [i for i, result in enumerate(results) if result is None]
+        for result in results:
+            if result is not None and result['prediction'] == 'Anomalie':
+                self.stats['anomalies_detected'] += 1
+
+        def complete(fresh: List[Dict[str, Any]]):
+            for i, result in zip(scored, fresh):
+                results[i] = result
+            shedder.remember([flow_keys[i] for i in scored], fresh)
+            done(results)
+
+        if len(scored) == len(results):
+            self._predict_cached(flow_keys, feature_matrix, complete)
+        else:
+            self._predict_cached([flow_keys[i] for i in scored], feature_matrix[scored], complete)
+
+    def _predict_cached(self, flow_keys: List[Any], feature_matrix: np.ndarray,
+                        done: Callable[[List[Dict[str, Any]]], None]):
+        """Comme _predict_rows, mais seules les lignes absentes du cache de verdicts passent par le modèle"""
+        cache = self.verdict_cache
+        if cache is None:
+            self._predict_rows(feature_matrix, done)
+            return
+        keys = list(zip(flow_keys, cache.quantize(feature_matrix)))
+        results: List[Optional[Dict[str, Any]]] = [cache.lookup(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        generation = self.model_generation
+
+        def complete(fresh: List[Dict[str, Any]]):
+            for result in results:
+                if result is not None and result['prediction'] == 'Anomalie':
+                    self.stats['anomalies_detected'] += 1
+            for i, result in zip(misses, fresh):
+                results[i] = result
+                # Verdict d'un modèle remplacé entre-temps : pas dans le cache du nouveau
+                if result['prediction'] != 'Erreur' and generation == self.model_generation:
+                    cache.store(keys[i], result)
+            done(results)
+
+        self._predict_rows(feature_matrix if len(misses) == len(results) else feature_matrix[misses], complete)
+
+    def _predict_rows(self, feature_matrix: np.ndarray, done: Callable[[List[Dict[str, Any]]], None]):
+        """Score les lignes puis passe les verdicts à `done` : aussitôt en interne, dans
+        l'ordre de soumission depuis le thread de collecte avec le pool de processus"""
+        pool = self.pool
+        if pool is None or not pool.running.is_set():
+            done(self._predict_batch(feature_matrix) if len(feature_matrix) else [])
+            return
+        schema = self.schema
+
+        def complete(rows: np.ndarray, anomalous: Optional[np.ndarray], anomaly_scores: Optional[np.ndarray],
+                     worker_ms: float):
+            if anomalous is None:
+                done([dict(ERROR_VERDICT) for _ in range(len(rows))])
+                return
+            if self.shadow is not None and len(rows):
+                self.shadow.offer(schema, rows, anomalous, anomaly_scores, worker_ms)
+            done(self._verdicts(anomalous, anomaly_scores))
+
+        pool.submit(feature_matrix if len(feature_matrix) else None, complete)
     
     def _predict_anomaly(self, features: Dict[str, float]) -> Dict[str, Any]:
+        return self._predict_batch(self.schema.row_from_dict(features).reshape(1, -1))[0]
+    
+    def _predict_batch(self, feature_matrix: np.ndarray) -> List[Dict[str, Any]]:
+        """Score un lot de vecteurs (float32, ordre du schéma) en un seul appel predict_proba"""
         try:
-            # Ordre exact des colonnes attendu par le modèle
-            feature_order = [
-                "duration", "protocol_type", "service", "flag", "src_bytes", "dst_bytes", "land", "wrong_fragment",
-                "urgent", "hot", "num_failed_logins", "logged_in", "num_compromised", "root_shell", "su_attempted",
-                "num_root", "num_file_creations", "num_shells", "num_access_files", "num_outbound_cmds",
-                "is_host_login", "is_guest_login", "count", "srv_count", "serror_rate", "srv_serror_rate",
-                "rerror_rate", "srv_rerror_rate", "same_srv_rate", "diff_srv_rate", "srv_diff_host_rate",
-                "dst_host_count", "dst_host_srv_count", "dst_host_same_srv_rate", "dst_host_diff_srv_rate",
-                "dst_host_same_src_port_rate", "dst_host_srv_diff_host_rate", "dst_host_serror_rate",
-                "dst_host_srv_serror_rate", "dst_host_rerror_rate", "dst_host_srv_rerror_rate"
-            ]
-            # Encodage simple pour les features catégorielles (protocol_type, service, flag)
-            # Ici, on fait un one-hot encoding minimal pour éviter les erreurs (à adapter selon le modèle réel)
-            # Pour la démo, on remplace les valeurs catégorielles par leur hash
-            feature_vector = []
-            for col in feature_order:
-                val = features.get(col, 0)
-                if col in ["protocol_type", "service", "flag"]:
-                    # Encodage simple (hash)
-                    val = hash(str(val)) % 1000
-                feature_vector.append(val)
-            feature_vector = np.array([feature_vector]).reshape(1, -1)
-            prediction = self.model.predict(feature_vector)[0]
-            prediction_proba = self.model.predict_proba(feature_vector)[0]
-            anomaly_score = prediction_proba[1] if len(prediction_proba) > 1 else prediction_proba[0]
-            threat_level = self._get_threat_level(anomaly_score)
-            if prediction == 1: self.stats['anomalies_detected'] += 1
-            return {
-                'prediction': 'Anomalie' if prediction == 1 else 'Normal',
-                'anomaly_score': float(anomaly_score),
-                'threat_level': threat_level
-            }
+            forest = self.forest
+            started = time.perf_counter()
+            # Les valeurs non finies suivent les règles de valeurs manquantes de sklearn,
+            # que l'évaluateur compilé ne reproduit pas
+            if forest is not None and np.isfinite(feature_matrix).all():
+                probabilities = forest.predict_proba(feature_matrix)
+            else:
+                probabilities = predict_proba(self.model, feature_matrix)
+            # Même règle que model.predict : classe de probabilité maximale
+            anomalous = self.model.classes_[probabilities.argmax(axis=1)] == 1
+            anomaly_scores = probabilities[:, 1] if probabilities.shape[1] > 1 else probabilities[:, 0]
+            if self.shadow is not None:
+                # Hors chemin critique : le fantôme reçoit une copie et ne bloque jamais
+                self.shadow.offer(self.schema, feature_matrix, anomalous, anomaly_scores,
+                                  (time.perf_counter() - started) * 1000.0)
+            return self._verdicts(anomalous, anomaly_scores)
         except Exception as e:
             self.logger.error(f"Erreur lors de la prédiction: {e}")
-            return {'prediction': 'Erreur', 'anomaly_score': 0.0, 'threat_level': 'Informationnel'}
+            return [dict(ERROR_VERDICT) for _ in range(len(feature_matrix))]
+
+    def _verdicts(self, anomalous: np.ndarray, anomaly_scores: np.ndarray) -> List[Dict[str, Any]]:
+        results = []
+        for is_anomaly, anomaly_score in zip(anomalous.tolist(), anomaly_scores.tolist()):
+            if is_anomaly: self.stats['anomalies_detected'] += 1
+            results.append({
+                'prediction': 'Anomalie' if is_anomaly else 'Normal',
+                'anomaly_score': anomaly_score,
+                'threat_level': self._get_threat_level(anomaly_score)
+            })
+        return results
     
     def _get_threat_level(self, score: float) -> str:
         if score >= 0.9: return 'Critique'
@@ -406,38 +2164,172 @@ class SentinelPacketCapture:
         if score >= 0.3: return 'Faible'
         return 'Informationnel'
     
-    def start_capture(self, interface: Optional[str] = None, filter_expr: str = ""):
+    def start_capture(self, interface: Optional[str] = None, filter_expr: str = "",
+                      interfaces: Optional[List[Tuple[str, Optional[str]]]] = None):
+        """Démarre un thread de capture par interface.
+
+        `interfaces` : liste (nom, filtre BPF ou None pour `filter_expr`) ; à
+        défaut, la seule interface `interface`. Le rejeu pcap ignore les deux.
+        """
         if self.is_capturing.is_set():
             self.logger.warning("Capture déjà en cours")
             return
-            
-        self.logger.info(f"Démarrage de la capture sur l'interface: {interface or 'par défaut'}")
-        self.logger.info(f"Filtre appliqué: {filter_expr or 'aucun'}")
         
+        if self.pcap_path:
+            pacing = f"x{self.replay_speed:g}" if self.replay_speed else 'aussi vite que possible'
+            self.logger.info(f"Rejeu du fichier {self.pcap_path} ({pacing})")
+            if filter_expr:
+                self.logger.info("Le filtre BPF ne s'applique pas au rejeu pcap")
+            target = self._replay_loop
+            self.sources = [CaptureSource(os.path.basename(self.pcap_path))]
+        else:
+            if self.capture_backend == 'ring' and not ring_available():
+                self.logger.warning("Anneau TPACKET_V3 indisponible sur ce système, repli sur le backend scapy")
+                self.capture_backend = 'scapy'
+            self.logger.info(f"Backend de capture: {self.capture_backend}")
+            target = self._ring_loop if self.capture_backend == 'ring' else self._capture_loop
+            entries = interfaces or [(interface, None)]
+            # État de features par interface : mode paquet, sans shards (qui tiennent les fenêtres de toutes les adresses)
+            separate = (len(entries) > 1 and not self.config.get('shared_features', True)
+                        and self.flow_table is None and self.shards is None)
+            if len(entries) > 1 and not self.config.get('shared_features', True) and not separate:
+                self.logger.warning("État de features par interface indisponible en mode flux ou shardé : état partagé")
+            self.sources = [
+                CaptureSource(name, filter_expr if own_filter is None else own_filter,
+                              NetworkFeatureExtractor(self.feature_extractor.window_seconds, self.feature_extractor.schema)
+                              if separate else None)
+                for name, own_filter in entries
+            ]
+            for source in self.sources:
+                self.logger.info(f"Démarrage de la capture sur l'interface: {source.name or 'par défaut'} "
+                                 f"(filtre: {source.filter_expr or 'aucun'})")
+        
+        if self.pool is not None and self.model is not None:
+            self.pool.start(self.model, self.forest)
+        if self.shards is not None:
+            self.shards.start()
         self.is_capturing.set()
         self.stats['start_time'] = time.time()
+        self.batcher.start()
         
-        self.capture_thread = Thread(
-            target=self._capture_loop,
-            args=(interface, filter_expr),
-            daemon=True
-        )
-        self.capture_thread.start()
+        self._active_sources = len(self.sources)
+        for source in self.sources:
+            source.started = time.time()
+            source.thread = Thread(target=self._run_source, args=(target, source),
+                                   name=f"capture-{source.name or 'default'}", daemon=True)
+            source.thread.start()
         
-    def _capture_loop(self, interface: Optional[str], filter_expr: str):
+    def _capture_loop(self, source: CaptureSource):
+        """Lit les trames brutes du socket de capture scapy (BPF appliqué par le noyau),
+        sans les disséquer : le décodage des en-têtes se fait dans handle_frame"""
         try:
-            self.logger.info("Début de la capture de paquets...")
-            sniff(
-                iface=interface,
-                filter=filter_expr or None,
-                prn=self.packet_handler,
-                stop_filter=lambda x: not self.is_capturing.is_set(),
-                store=False
+            self.logger.info(f"Début de la capture de paquets ({source.name or 'par défaut'})...")
+            sock = conf.L2listen(iface=source.name, filter=source.filter_expr or None)
+            linktype = conf.l2types.layer2num.get(sock.LL, DLT_EN10MB)
+            source.attach_socket(sock)
+            try:
+                while self.is_capturing.is_set():
+                    # Attente bornée pour remarquer stop_capture même sans trafic
+                    if not sock.select([sock], 0.5):
+                        self._capture_idle()
+                        continue
+                    _, data, timestamp = sock.recv_raw()
+                    if data:
+                        self.handle_frame(data, timestamp, linktype, source)
+            finally:
+                source.detach_socket()
+                sock.close()
+        except Exception as e:
+            source.error = str(e)
+            self.logger.error(f"Erreur pendant la capture ({source.name or 'par défaut'}): {e}")
+        finally:
+            self.logger.info(f"Fin de la capture de paquets ({source.name or 'par défaut'})")
+    
+    def _ring_loop(self, source: CaptureSource):
+        """Lit l'anneau TPACKET_V3 bloc par bloc : aucune copie ni appel système par trame"""
+        try:
+            self.logger.info(f"Début de la capture de paquets ({source.name or 'par défaut'}, anneau TPACKET_V3)...")
+            source.ring = TPacketRing(
+                source.name, source.filter_expr,
+                block_size=self.config.get('ring_block_size', 1 << 20),
+                block_count=self.config.get('ring_blocks', 64),
+                block_timeout_ms=self.config.get('ring_timeout_ms', 10)
             )
+            frames = []
+            with source.ring:
+                for frames in source.ring.blocks(timeout=0.5):
+                    if not self.is_capturing.is_set():
+                        break
+                    if frames:
+                        self.handle_frames(frames, source)
+                    else:
+                        self._capture_idle()
+                # Les trames pointent dans l'anneau : plus aucune référence avant sa fermeture
+                del frames
         except Exception as e:
-            self.logger.error(f"Erreur pendant la capture: {e}")
+            source.error = str(e)
+            self.logger.error(f"Erreur pendant la capture ({source.name or 'par défaut'}): {e}")
         finally:
-            self.logger.info("Fin de la capture de paquets")
+            self.logger.info(f"Fin de la capture de paquets ({source.name or 'par défaut'})")
+    
+    def _replay_loop(self, source: CaptureSource):
+        """Lit le pcap en streaming et rejoue les paquets dans le même pipeline que la capture live.
+
+        speed = 0 : aussi vite que le pipeline l'accepte (la file vers la boucle
+        asyncio applique sa politique de débordement) ; sinon les écarts entre
+        horodatages enregistrés sont respectés, divisés par `speed`.
+        """
+        pcap_path, speed = self.pcap_path, self.replay_speed
+        self.replay_stats.update({'packets': 0, 'finished': False, 'started': time.time(), 'ended': None})
+        try:
+            first_timestamp = None
+            started = time.monotonic()
+            for data, timestamp, linktype in read_pcap_frames(pcap_path):
+                if not self.is_capturing.is_set():
+                    break
+                if speed > 0 and timestamp is not None:
+                    if first_timestamp is None:
+                        first_timestamp = timestamp
+                    delay = started + (timestamp - first_timestamp) / speed - time.monotonic()
+                    # Attente découpée pour rester réactif à stop_capture
+                    while delay > 0 and self.is_capturing.is_set():
+                        time.sleep(min(delay, 0.2))
+                        self._capture_idle()
+                        delay = started + (timestamp - first_timestamp) / speed - time.monotonic()
+                self.handle_frame(data, timestamp, linktype, source)
+                self.replay_stats['packets'] += 1
+            self.replay_stats['finished'] = True
+        except Exception as e:
+            self.logger.error(f"Erreur pendant le rejeu de {pcap_path}: {e}")
+        finally:
+            self.replay_stats['ended'] = time.time()
+            elapsed = self.replay_stats['ended'] - self.replay_stats['started']
+            self.logger.info(
+                f"Fin du rejeu: {self.replay_stats['packets']} paquets en {elapsed:.2f}s "
+                f"({self.replay_stats['packets'] / max(elapsed, 1e-9):.0f} paquets/s)"
+            )
+    
+    def get_source_stats(self) -> Dict[str, Any]:
+        if not self.pcap_path:
+            source = {
+                'type': 'live',
+                'interface': ', '.join(source.name or 'par défaut' for source in self.sources)
+                             or self.config.get('interface') or 'par défaut',
+                'backend': self.capture_backend,
+                # Paquets, débit et pertes du noyau par interface
+                'interfaces': [source.get_stats() for source in self.sources]
+            }
+            rings = [source.ring for source in self.sources if source.ring is not None]
+            if len(rings) == 1:
+                source['ring'] = rings[0].get_stats()
+            return source
+        return {
+            'type': 'pcap',
+            'path': self.pcap_path,
+            'speed': self.replay_speed or 'fast',
+            'packets_replayed': self.replay_stats['packets'],
+            'finished': self.replay_stats['finished']
+        }
     
     def stop_capture(self):
         if not self.is_capturing.is_set():
@@ -447,22 +2339,40 @@ class SentinelPacketCapture:
         self.logger.info("Arrêt de la capture...")
         self.is_capturing.clear()
         
-        if self.capture_thread and self.capture_thread.is_alive():
-            self.capture_thread.join(timeout=5)
+        for source in self.sources:
+            if source.thread and source.thread.is_alive():
+                source.thread.join(timeout=5)
+        # Vide les derniers lots en attente avant de rendre la main
+        self.batcher.stop()
+        if self.pool is not None:
+            self.pool.drain()
+        # Modèle préparé pendant l'arrêt : plus de thread pour le basculer, installation directe
+        with self._swap_lock:
+            release, self._pending_release = self._pending_release, None
+        if release is not None:
+            self._swap_model(release)
             
     async def websocket_handler(self, websocket):
         client_addr = websocket.remote_address
         self.logger.info(f"Nouvelle connexion WebSocket: {client_addr}")
-        self.connected_clients.add(websocket)
+        session = ClientSession(
+            websocket,
+            max_queue=self.config.get('client_queue_size', 4096),
+            max_lag_ms=self.config.get('client_max_lag_ms', 2000.0),
+            policy=self.config.get('slow_client_policy', 'drop'),
+            sample_rate=self.config.get('client_sample_rate', 10)
+        )
+        session.subscription = self._intern_subscription(session.subscription)
+        session.writer_task = asyncio.create_task(self._run_client_writer(session))
+        self.connected_clients[websocket] = session
+        self._send_interfaces(session)
         try:
             try:
                 async for message in websocket:
-                    # Si le client demande les infos du modèle
                     try:
                         data = json.loads(message)
-                        if isinstance(data, dict) and data.get('type') == 'get_model_info':
-                            model_info = self.get_model_info()
-                            await websocket.send(json.dumps({'type': 'model_info', 'data': model_info}))
+                        if isinstance(data, dict):
+                            await self._handle_client_message(session, data)
                     except Exception as e:
                         self.logger.warning(f"Erreur lors du traitement du message WebSocket: {e}")
             except (websockets.exceptions.InvalidMessage, EOFError):
@@ -472,43 +2382,263 @@ class SentinelPacketCapture:
             except websockets.exceptions.ConnectionClosedError as e:
                 self.logger.debug(f"Erreur WebSocket ignorée {client_addr}: {e}")
         finally:
-            self.connected_clients.discard(websocket)
+            self.connected_clients.pop(websocket, None)
+            session.writer_task.cancel()
+            if session.close_reason:
+                self.logger.warning(f"Client {client_addr} déconnecté: {session.close_reason}")
             self.logger.info(f"Connexion fermée: {client_addr}")
     
+    async def _run_client_writer(self, session: ClientSession):
+        try:
+            await session.run_writer()
+        except websockets.exceptions.ConnectionClosed:
+            self.logger.info(f"Client déconnecté pendant l'envoi: {session.address}")
+    
+    async def _handle_client_message(self, session: ClientSession, data: Dict[str, Any]):
+        message_type = data.get('type')
+        if self.role == 'serve' and message_type in CAPTURE_COMMANDS:
+            # Le modèle vit dans le processus de capture : la réponse revient par la liaison
+            request_id = next(self._request_ids)
+            self._requesters[request_id] = session
+            if not self.endpoint.send_command(request_id, data):
+                session.enqueue(json.dumps({'type': 'error', 'data': "Processus de capture indisponible"}), droppable=False)
+                return
+            self._unanswered.add(request_id)
+            return
+        if message_type == 'get_model_info':
+            # Si le client demande les infos du modèle
+            model_info = self.get_model_info()
+            session.enqueue(json.dumps({'type': 'model_info', 'data': model_info}), droppable=False)
+        elif message_type == 'get_model_comparison':
+            session.enqueue(json.dumps({'type': 'model_comparison', 'data': self.get_model_comparison()}), droppable=False)
+        elif message_type == 'reload_model':
+            # Toujours SENTINEL_MODEL_PATH : un client ne choisit pas le fichier chargé
+            if not self.request_model_reload('commande WebSocket', session):
+                session.enqueue(json.dumps({'type': 'error', 'data': "Rechargement du modèle déjà en cours"}), droppable=False)
+                return
+            session.enqueue(json.dumps({'type': 'status', 'data': {'model_reload': 'started'}}), droppable=False)
+        elif message_type == 'configure':
+            delivery = data.get('delivery', session.delivery)
+            encoding = data.get('encoding', session.encoding)
+            stats_mode = data.get('stats', session.stats_mode)
+            if stats_mode not in STATS_MODES:
+                session.enqueue(json.dumps({'type': 'error', 'data': f"Mode de stats inconnu: {stats_mode}"}), droppable=False)
+                return
+            if delivery not in DELIVERY_MODES:
+                session.enqueue(json.dumps({'type': 'error', 'data': f"Mode de livraison inconnu: {delivery}"}), droppable=False)
+                return
+            if encoding not in WIRE_ENCODINGS:
+                session.enqueue(json.dumps({'type': 'error', 'data': f"Encodage inconnu: {encoding}"}), droppable=False)
+                return
+            session.delivery = delivery
+            session.encoding = encoding
+            # Les features (41 valeurs par paquet) ne sont envoyées en binaire que sur demande explicite
+            session.include_features = bool(data.get('include_features', encoding == 'json' and session.include_features))
+            switched_to_delta = stats_mode == 'delta' and session.stats_mode != 'delta'
+            session.stats_mode = stats_mode
+            session.enqueue(json.dumps({'type': 'status', 'data': {
+                'delivery': session.delivery, 'encoding': session.encoding,
+                'include_features': session.include_features, 'stats': session.stats_mode
+            }}), droppable=False)
+            if switched_to_delta and 'stats' in session.subscription.streams:
+                self._send_stats_keyframe(session)
+        elif message_type == 'subscribe':
+            try:
+                subscription = Subscription(data.get('streams'), data.get('filters'))
+            except (ValueError, TypeError) as e:
+                session.enqueue(json.dumps({'type': 'error', 'data': f"Abonnement invalide: {e}"}), droppable=False)
+                return
+            had_stats = 'stats' in session.subscription.streams
+            had_interfaces = 'interfaces' in session.subscription.streams
+            session.subscription = self._intern_subscription(subscription)
+            session.enqueue(json.dumps({'type': 'status', 'data': {'subscription': session.subscription.describe()}}), droppable=False)
+            if not had_interfaces:
+                self._send_interfaces(session)
+            if not had_stats and session.stats_mode == 'delta' and 'stats' in session.subscription.streams:
+                self._send_stats_keyframe(session)
+    
+    def _intern_subscription(self, subscription: Subscription) -> Subscription:
+        existing = self.subscriptions.get(subscription.key)
+        if existing is not None:
+            return existing
+        self.subscriptions[subscription.key] = subscription
+        return subscription
+    
     async def broadcast_data(self):
+        """Diffuse les paquets dès leur arrivée, regroupés par fenêtre de flush"""
+        flush_interval = self.config.get('flush_interval_ms', 20) / 1000.0
         while True:
             try:
-                # Gestion des paquets
-                if not self.packet_queue.empty():
-                    packet_data = await self.packet_queue.get()
-                    message = json.dumps({'type': 'packet', 'data': packet_data})
-                    for client in self.connected_clients.copy():
-                        try:
-                            await client.send(message)  # on tente l'envoi
-                        except websockets.exceptions.ConnectionClosed:
-                            self.connected_clients.remove(client)
-                            self.logger.info("Client déconnecté pendant broadcast")
-
-                # Envoi périodique des stats et interfaces toutes les 5 secondes
-                if int(time.time()) % 5 == 0:
-                    stats_message = json.dumps({'type': 'stats', 'data': self.get_current_stats()})
-                    interfaces_message = json.dumps({'type': 'interfaces', 'data': self.get_network_interfaces()})
-                    for client in self.connected_clients.copy():
-                        try:
-                            await client.send(stats_message)
-                            await client.send(interfaces_message)
-                        except websockets.exceptions.ConnectionClosed:
-                            self.connected_clients.remove(client)
-                            self.logger.info("Client déconnecté pendant broadcast")
-
-                await asyncio.sleep(0.01)
-
+                # Aucun réveil tant qu'aucun paquet n'est disponible
+                await self.packet_queue.wait()
+                if flush_interval > 0:
+                    await asyncio.sleep(flush_interval)
+                packets = self.packet_queue.drain()
+                if packets and self.connected_clients:
+                    self._broadcast_packets(packets)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 self.logger.error(f"Erreur dans broadcast_data: {e}")
-                await asyncio.sleep(0.01)
+    
+    def _broadcast_packets(self, packets: List[Dict[str, Any]], encoded: Optional[List[str]] = None):
+        # Regroupe les clients par abonnement distinct : filtrage et sérialisation une fois par groupe
+        groups: Dict[Any, List[ClientSession]] = {}
+        for session in self.connected_clients.values():
+            if session.subscription.wants_packets:
+                groups.setdefault(session.subscription.key, []).append(session)
+        ip_cache: Dict[str, Any] = {}
+        stripped: Dict[int, Dict[str, Any]] = {}
+        packet_messages: Dict[Tuple[int, bool], str] = {}
+        if encoded is not None:
+            # Paquets encodés par le processus de capture : le message complet se forme sans json.dumps
+            for packet_data, text in zip(packets, encoded):
+                packet_messages[(id(packet_data), True)] = f'{{"type": "packet", "data": {text}}}'
+        for sessions in groups.values():
+            selected = sessions[0].subscription.select(packets, ip_cache)
+            if not selected:
+                continue
+            frames: Dict[Tuple[str, bool], Any] = {}
+            for session in sessions:
+                if session.encoding == 'json' and session.delivery == 'packet':
+                    for packet_data in selected:
+                        key = (id(packet_data), session.include_features)
+                        message = packet_messages.get(key)
+                        if message is None:
+                            payload = self._wire_packet(packet_data, session.include_features, stripped)
+                            message = packet_messages[key] = json.dumps({'type': 'packet', 'data': payload})
+                        session.enqueue(message)
+                    continue
+                key = (session.encoding, session.include_features)
+                frame = frames.get(key)
+                if frame is None:
+                    if session.encoding == 'columnar':
+                        frame = encode_columnar_frame(selected, include_features=session.include_features)
+                    else:
+                        frame = encode_json_frame([self._wire_packet(packet_data, session.include_features, stripped)
+                                                   for packet_data in selected])
+                    frames[key] = frame
+                session.enqueue(frame)
+    
+    async def broadcast_flows(self):
+        """Diffuse les enregistrements de flux scorés aux clients abonnés au flux `flows`"""
+        while True:
+            try:
+                await self.flow_queue.wait()
+                records = self.flow_queue.drain()
+                if records and self.connected_clients:
+                    self._broadcast_flows(records)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Erreur dans broadcast_flows: {e}")
+    
+    def _broadcast_flows(self, records: List[Dict[str, Any]]):
+        ip_cache: Dict[str, Any] = {}
+        stripped: Dict[int, Dict[str, Any]] = {}
+        # Sélection une fois par abonnement distinct : son plafond de débit est partagé par le groupe
+        selections: Dict[Any, List[Dict[str, Any]]] = {}
+        messages: Dict[Tuple[Any, bool], Optional[str]] = {}
+        for session in self.connected_clients.values():
+            subscription = session.subscription
+            if 'flows' not in subscription.streams:
+                continue
+            selected = selections.get(subscription.key)
+            if selected is None:
+                selected = selections[subscription.key] = subscription.select(records, ip_cache, stream='flows')
+            key = (subscription.key, session.include_features)
+            if key not in messages:
+                messages[key] = json.dumps({'type': 'flows', 'data': [
+                    self._wire_packet(record, session.include_features, stripped) for record in selected
+                ]}) if selected else None
+            if messages[key] is not None:
+                session.enqueue(messages[key])
+    
+    def _wire_packet(self, packet_data: Dict[str, Any], include_features: bool,
+                     stripped: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+        if include_features:
+            return packet_data
+        packet = stripped.get(id(packet_data))
+        if packet is None:
+            packet = stripped[id(packet_data)] = strip_features(packet_data)
+        return packet
+    
+    async def _refresh_interfaces(self):
+        """Énumère les interfaces hors de la boucle et ne les diffuse que si la liste a changé"""
+        interfaces = await asyncio.to_thread(self.get_network_interfaces)
+        if interfaces == self.interfaces:
+            return
+        self.interfaces = interfaces
+        message = json.dumps({'type': 'interfaces', 'data': interfaces})
+        for session in list(self.connected_clients.values()):
+            if 'interfaces' in session.subscription.streams:
+                session.enqueue(message)
+    
+    def _send_interfaces(self, session: ClientSession):
+        """Envoie la liste en cache à un client qui vient de se connecter ou de s'abonner"""
+        if self.interfaces is not None and 'interfaces' in session.subscription.streams:
+            session.enqueue(json.dumps({'type': 'interfaces', 'data': self.interfaces}))
+    
+    def _publish_stats(self):
+        """Tick des stats : instantané complet pour les clients 'full', delta pour les clients 'delta'.
 
+        Un instantané complet est aussi envoyé aux clients 'delta' toutes les
+        `heartbeat_interval` secondes pour resynchroniser un client qui aurait
+        manqué un message (le champ `seq` permet de détecter un trou).
+        """
+        sessions = [session for session in self.connected_clients.values() if 'stats' in session.subscription.streams]
+        if not sessions:
+            return
+        stats = self.get_current_stats()
+        previous = self._stats_snapshot
+        self._stats_snapshot = stats
+        self._stats_seq += 1
+        heartbeat = self.config.get('heartbeat_interval', 30.0)
+        now = time.monotonic()
+        keyframe = previous is None or (heartbeat > 0 and now - self._last_keyframe >= heartbeat)
+        if keyframe:
+            self._last_keyframe = now
+        full_message = None
+        delta_message = None
+        for session in sessions:
+            if session.stats_mode == 'delta' and not keyframe:
+                if delta_message is None:
+                    delta = diff_stats(previous, stats)
+                    if not delta:
+                        continue
+                    delta_message = json.dumps({'type': 'stats_delta', 'seq': self._stats_seq, 'data': delta})
+                # Un delta perdu désynchronise le client : il n'est jamais jeté
+                session.enqueue(delta_message, droppable=False)
+                continue
+            if full_message is None:
+                full_message = json.dumps({'type': 'stats', 'seq': self._stats_seq, 'data': stats})
+            session.enqueue(full_message, droppable=session.stats_mode == 'full')
+    
+    def _send_stats_keyframe(self, session: ClientSession):
+        """Point de départ d'un client qui passe en mode delta : le dernier instantané publié"""
+        if self._stats_snapshot is None:
+            self._stats_snapshot = self.get_current_stats()
+        session.enqueue(json.dumps({'type': 'stats', 'seq': self._stats_seq, 'data': self._stats_snapshot}), droppable=False)
     
     def get_current_stats(self) -> Dict[str, Any]:
+        if self.role == 'serve':
+            # Dernier instantané reçu du processus de capture (vide tant qu'il ne s'est pas présenté)
+            stats = dict(self._capture_stats or {
+                'total_packets': 0, 'packets_per_second': 0, 'anomalies_detected': 0, 'is_capturing': False
+            })
+        else:
+            stats = self.get_capture_stats()
+        stats.update({
+            'connected_clients': len(self.connected_clients),
+            'clients': [session.get_stats() for session in list(self.connected_clients.values())],
+            'scheduler': self.scheduler.get_stats()
+        })
+        if self.role != 'all':
+            stats['topology'] = self.get_topology_health()
+        return stats
+
+    def get_capture_stats(self) -> Dict[str, Any]:
+        """Stats de la capture et de l'analyse, sans la partie clients WebSocket"""
         current_time = time.time()
         pps = 0
         if self.stats['start_time']:
@@ -520,35 +2650,275 @@ class SentinelPacketCapture:
             'packets_per_second': round(pps, 2),
             'anomalies_detected': self.stats['anomalies_detected'],
             'is_capturing': self.is_capturing.is_set(),
-            'connected_clients': len(self.connected_clients),
-            'queue_size': self.packet_queue.qsize()
+            'queue_size': self.packet_queue.qsize(),
+            'queue': self.packet_queue.get_stats(),
+            'inference': {
+                **self.batcher.get_stats(),
+                'workers': self.pool.get_stats() if self.pool is not None else None
+            },
+            'verdict_cache': self.verdict_cache.get_stats() if self.verdict_cache is not None else None,
+            'feature_shards': self.shards.get_stats() if self.shards is not None else None,
+            'load_shedding': self.shedder.get_stats() if self.shedder is not None else None,
+            'source': self.get_source_stats(),
+            'classification': self.classification,
+            'flows': self.flow_table.get_stats() if self.flow_table is not None else None
         }
+
+    def get_topology_health(self) -> Dict[str, Any]:
+        """Santé des deux processus de la topologie split, vue par celui qui répond"""
+        own = {'pid': os.getpid(), 'uptime_s': round(time.time() - self.started_at, 1)}
+        if self.role == 'serve':
+            # Vue du processus de capture (uptime, liaison) complétée par l'état de sa connexion
+            remote = ((self._capture_stats or {}).get('topology') or {}).get('capture') or {}
+            return {'topology': 'split', 'serving': own, 'capture': {**remote, **self.endpoint.get_stats()}}
+        return {'topology': 'split', 'capture': {**own, 'link': self.link.get_stats() if self.link else None}}
     
     async def run_service(self):
         """Fonction principale asynchrone pour démarrer toutes les tâches"""
+        if self.role == 'capture':
+            return await self.run_capture_service()
         host = self.config.get('websocket_host', 'localhost')
         port = self.config.get('websocket_port', 8765)
 
         self.logger.info(f"Démarrage du serveur WebSocket sur {host}:{port}")
 
-        # Démarre la capture
-        self.start_capture(
-            interface=self.config.get('interface'),
-            filter_expr=self.config.get('filter')
-        )
+        # Les paquets produits par les threads de capture arrivent dans cette boucle
+        self._loop = asyncio.get_running_loop()
+        self.packet_queue.bind(asyncio.get_running_loop())
+        self.flow_queue.bind(asyncio.get_running_loop())
+
+        ipc_server = None
+        supervisor = None
+        stats_interval = self.config.get('stats_interval', 5.0)
+        if self.role == 'serve':
+            # Topologie split : la capture tourne dans un processus enfant qui se connecte à ce socket
+            if not hasattr(socket, 'AF_UNIX'):
+                raise RuntimeError("La topologie split nécessite les sockets Unix")
+            path = self.config.get('ipc_socket')
+            if os.path.exists(path):
+                os.unlink(path)
+            self.endpoint = CaptureEndpoint(path, stale_after=3 * (stats_interval or 5.0))
+            ipc_server = await asyncio.start_unix_server(self._serve_capture_connection, path=path)
+            supervisor = asyncio.create_task(self._supervise_capture())
+        else:
+            # Démarre la capture
+            self.start_capture(
+                interface=self.config.get('interface'),
+                filter_expr=self.config.get('filter'),
+                interfaces=self.config.get('interfaces')
+            )
 
-        # Utilisation correcte de websockets.serve
-        async with websockets.serve(self.websocket_handler, host, port):
+        # Le heartbeat sert aussi d'intervalle de ping WebSocket (détection des clients morts)
+        heartbeat = self.config.get('heartbeat_interval', 30.0)
+        async with websockets.serve(self.websocket_handler, host, port, ping_interval=heartbeat or None):
             self.logger.info("Serveur WebSocket démarré")
-            # Lance broadcast_data en tâche parallèle
-            broadcast_task = asyncio.create_task(self.broadcast_data())
+            # Lance la diffusion des paquets et les messages de contrôle planifiés
+            tasks = []
+            if self.role == 'all':
+                tasks.append(asyncio.create_task(self.broadcast_data()))
+                tasks.append(asyncio.create_task(self.broadcast_flows()))
+            self.scheduler.add('interfaces', self.config.get('interfaces_interval', 10.0), self._refresh_interfaces, run_now=True)
+            self.scheduler.add('stats', stats_interval, self._publish_stats)
+            if self.role == 'all':
+                self.scheduler.add('model_watch', self.config.get('model_watch_interval', 2.0), self._check_model_file)
+            self.scheduler.start()
             try:
                 await asyncio.Future()  # bloque indéfiniment
             finally:
-                broadcast_task.cancel()
-                self.stop_capture()
+                for task in tasks:
+                    task.cancel()
+                self.scheduler.stop()
+                self.packet_queue.close()
+                self.flow_queue.close()
+                if self.role == 'serve':
+                    supervisor.cancel()
+                    self._stop_capture_process()
+                    ipc_server.close()
+                    if os.path.exists(self.endpoint.path):
+                        os.unlink(self.endpoint.path)
+                else:
+                    self.stop_capture()
+                if self.pool is not None:
+                    self.pool.stop()
+                if self.shards is not None:
+                    self.shards.stop()
+                if self.shadow is not None:
+                    self.shadow.stop()
                 self.logger.info("Service arrêté.")
 
+    async def _serve_capture_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Topologie split, côté diffusion : relaie les trames du processus de capture"""
+        endpoint = self.endpoint
+        if endpoint.connected:
+            self.logger.warning("Nouvelle connexion du processus de capture, l'ancienne est fermée")
+            endpoint.writer.close()
+        endpoint.writer = writer
+        endpoint.last_frame = time.monotonic()
+        endpoint.stats['connects'] += 1
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                endpoint.last_frame = time.monotonic()
+                endpoint.stats['frames'] += 1
+                try:
+                    if kind == FRAME_PACKETS or kind == FRAME_FLOWS:
+                        texts = decode_records(payload)
+                        endpoint.stats['records'] += len(texts)
+                        if not texts or not self.connected_clients:
+                            continue
+                        records = [json.loads(text) for text in texts]
+                        if kind == FRAME_PACKETS:
+                            # Le JSON reçu est réutilisé tel quel pour les clients json sans filtre de features
+                            self._broadcast_packets(records, texts)
+                        else:
+                            self._broadcast_flows(records)
+                    elif kind == FRAME_STATS:
+                        self._capture_stats = json.loads(payload)
+                    elif kind == FRAME_BROADCAST:
+                        message = payload.decode('utf-8')
+                        for session in list(self.connected_clients.values()):
+                            session.enqueue(message, droppable=False)
+                    elif kind == FRAME_REPLY:
+                        (request_id,) = REQUEST_ID.unpack_from(payload)
+                        self._unanswered.discard(request_id)
+                        session = self._requesters.get(request_id)
+                        if session is not None:
+                            session.enqueue(payload[REQUEST_ID.size:].decode('utf-8'), droppable=False)
+                    elif kind == FRAME_HELLO:
+                        endpoint.hello = json.loads(payload)
+                        self.logger.info(f"Processus de capture connecté (pid {endpoint.hello.get('pid')})")
+                except Exception as e:
+                    self.logger.error(f"Trame de capture ignorée ({kind!r}): {e}")
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self.logger.debug(f"Fin de connexion du processus de capture: {e}")
+        finally:
+            if endpoint.writer is writer:
+                endpoint.writer = None
+                self.logger.warning("Processus de capture déconnecté")
+                # Les réponses attendues ne viendront plus : le client n'attend pas indéfiniment
+                for request_id in self._unanswered:
+                    session = self._requesters.get(request_id)
+                    if session is not None:
+                        session.enqueue(json.dumps({'type': 'error', 'data': "Processus de capture déconnecté avant la réponse"}), droppable=False)
+                self._unanswered.clear()
+            writer.close()
+
+    async def _supervise_capture(self):
+        """Lance le processus de capture et le relance s'il s'arrête, avec un délai croissant"""
+        context = multiprocessing.get_context('spawn')
+        backoff = 1.0
+        while True:
+            process = context.Process(target=run_capture_process, args=(self.config, os.getpid()),
+                                      name='sentinel-capture', daemon=False)
+            process.start()
+            self._capture_process = process
+            started = time.monotonic()
+            self.logger.info(f"Processus de capture lancé (pid {process.pid})")
+            while process.is_alive():
+                await asyncio.sleep(0.5)
+            process.join()
+            self.endpoint.stats['last_exit_code'] = process.exitcode
+            self.endpoint.stats['restarts'] += 1
+            # Un processus resté vivant une minute repart du délai minimal
+            if time.monotonic() - started >= 60:
+                backoff = 1.0
+            self.logger.warning(f"Processus de capture arrêté (code {process.exitcode}), relance dans {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _stop_capture_process(self):
+        process = self._capture_process
+        if process is None or not process.is_alive():
+            return
+        process.terminate()
+        process.join(5)
+        if process.is_alive():
+            self.logger.warning("Processus de capture toujours actif, arrêt forcé")
+            process.kill()
+            process.join()
+
+    async def run_capture_service(self, parent_pid: Optional[int] = None):
+        """Topologie split, côté capture : capture et analyse, enregistrements envoyés au processus de diffusion"""
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self.packet_queue.bind(loop)
+        self.flow_queue.bind(loop)
+        self.link = CaptureLink(self.config.get('ipc_socket'), logger=self.logger)
+        stop = asyncio.Event()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        self.start_capture(
+            interface=self.config.get('interface'),
+            filter_expr=self.config.get('filter'),
+            interfaces=self.config.get('interfaces')
+        )
+        hello = lambda: {'pid': os.getpid(), 'started': self.started_at}
+        tasks = [
+            asyncio.create_task(self.link.run(hello, self._handle_capture_command)),
+            asyncio.create_task(self.forward_records(self.packet_queue, FRAME_PACKETS, flush=True)),
+            asyncio.create_task(self.forward_records(self.flow_queue, FRAME_FLOWS, flush=False))
+        ]
+        # Les stats servent de battement de cœur : le processus de diffusion juge la santé sur leur âge
+        self.scheduler.add('stats', self.config.get('stats_interval', 5.0) or 5.0, self._send_capture_stats, run_now=True)
+        self.scheduler.add('model_watch', self.config.get('model_watch_interval', 2.0), self._check_model_file)
+        if parent_pid is not None:
+            # Un processus de diffusion tué sans préavis ne laisse pas de capture orpheline
+            self.scheduler.add('parent_watch', 1.0, lambda: os.getppid() != parent_pid and stop.set())
+        self.scheduler.start()
+        try:
+            await stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.scheduler.stop()
+            self.packet_queue.close()
+            self.flow_queue.close()
+            self.stop_capture()
+            if self.pool is not None:
+                self.pool.stop()
+            if self.shards is not None:
+                self.shards.stop()
+            if self.shadow is not None:
+                self.shadow.stop()
+            self.logger.info("Processus de capture arrêté.")
+
+    async def forward_records(self, queue: LoopBridge, kind: bytes, flush: bool):
+        """Topologie split : envoie les enregistrements scorés au processus de diffusion"""
+        flush_interval = self.config.get('flush_interval_ms', 20) / 1000.0 if flush else 0
+        while True:
+            try:
+                await queue.wait()
+                if flush_interval > 0:
+                    await asyncio.sleep(flush_interval)
+                records = queue.drain()
+                if records:
+                    self.link.send_records(kind, records)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Erreur dans forward_records: {e}")
+
+    def _send_capture_stats(self):
+        self.link.send(FRAME_STATS, json.dumps(self.get_current_stats()).encode('utf-8'))
+
+    async def _handle_capture_command(self, request_id: int, data: Dict[str, Any]):
+        """Commande d'un client relayée par le processus de diffusion"""
+        await self._handle_client_message(RemoteSession(self.link, request_id), data)
+
+def run_capture_process(config: Dict[str, Any], parent_pid: int):
+    """Point d'entrée du processus de capture et d'analyse (topologie split)"""
+    # Ctrl+C atteint tout le groupe : c'est le processus de diffusion qui arrête celui-ci
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    service = SentinelPacketCapture({**config, 'role': 'capture'})
+    if not service.load_model(config['model_path']):
+        sys.exit(1)
+    if config.get('shadow_model_path') and not service.load_shadow_model(config['shadow_model_path']):
+        service.logger.warning("Modèle fantôme ignoré")
+    asyncio.run(service.run_capture_service(parent_pid))
+
 def is_root():
     if os.name == "nt":
         try:
@@ -564,9 +2934,51 @@ def load_config() -> Dict[str, Any]:
         'websocket_host': os.getenv('SENTINEL_HOST', 'localhost'),
         'websocket_port': int(os.getenv('SENTINEL_PORT', '8765')),
         'model_path': os.getenv('SENTINEL_MODEL_PATH', 'models/ids_model.pkl'),
+        'model_mmap': os.getenv('SENTINEL_MODEL_MMAP', 'true').lower() in ('1', 'true', 'yes'),
+        'dummy_model_path': os.getenv('SENTINEL_DUMMY_MODEL_PATH', 'models/dummy_model.joblib'),
+        'model_watch_interval': float(os.getenv('SENTINEL_MODEL_WATCH_INTERVAL', '2')),
+        'shadow_model_path': os.getenv('SENTINEL_SHADOW_MODEL_PATH') or None,
+        'shadow_sample_rate': int(os.getenv('SENTINEL_SHADOW_SAMPLE_RATE', '10')),
         'log_level': os.getenv('SENTINEL_LOG_LEVEL', 'INFO'),
         'interface': os.getenv('SENTINEL_INTERFACE', None),
-        'filter': os.getenv('SENTINEL_FILTER', 'net 192.168.0.0/16 or net 10.0.0.0/8 or net 172.16.0.0/12')
+        'interfaces': parse_interfaces(os.getenv('SENTINEL_INTERFACES')),
+        'shared_features': os.getenv('SENTINEL_SHARED_FEATURES', 'true').lower() in ('1', 'true', 'yes'),
+        'filter': os.getenv('SENTINEL_FILTER', 'net 192.168.0.0/16 or net 10.0.0.0/8 or net 172.16.0.0/12'),
+        'max_packet_queue': int(os.getenv('SENTINEL_MAX_PACKET_QUEUE', '1000')),
+        'queue_policy': os.getenv('SENTINEL_QUEUE_POLICY', 'block'),
+        'queue_sample_rate': int(os.getenv('SENTINEL_QUEUE_SAMPLE_RATE', '10')),
+        'flush_interval_ms': float(os.getenv('SENTINEL_FLUSH_INTERVAL_MS', '20')),
+        'client_queue_size': int(os.getenv('SENTINEL_CLIENT_QUEUE_SIZE', '4096')),
+        'client_max_lag_ms': float(os.getenv('SENTINEL_CLIENT_MAX_LAG_MS', '2000')),
+        'slow_client_policy': os.getenv('SENTINEL_SLOW_CLIENT_POLICY', 'drop'),
+        'client_sample_rate': int(os.getenv('SENTINEL_CLIENT_SAMPLE_RATE', '10')),
+        'batch_size': int(os.getenv('SENTINEL_BATCH_SIZE', '256')),
+        'batch_timeout_ms': float(os.getenv('SENTINEL_BATCH_TIMEOUT_MS', '5')),
+        'inference_workers': int(os.getenv('SENTINEL_INFERENCE_WORKERS', '0')),
+        'feature_shards': int(os.getenv('SENTINEL_FEATURE_SHARDS', '0')),
+        'topology': os.getenv('SENTINEL_TOPOLOGY', 'single'),
+        'ipc_socket': os.getenv('SENTINEL_IPC_SOCKET', '/tmp/sentinel-ipc.sock'),
+        'stats_interval': float(os.getenv('SENTINEL_STATS_INTERVAL', '5')),
+        'interfaces_interval': float(os.getenv('SENTINEL_INTERFACES_INTERVAL', '10')),
+        'heartbeat_interval': float(os.getenv('SENTINEL_HEARTBEAT_INTERVAL', '30')),
+        'pcap': os.getenv('SENTINEL_PCAP') or None,
+        'pcap_speed': os.getenv('SENTINEL_PCAP_SPEED', 'fast'),
+        'capture_backend': os.getenv('SENTINEL_CAPTURE_BACKEND', 'scapy'),
+        'ring_block_size': int(os.getenv('SENTINEL_RING_BLOCK_SIZE', str(1 << 20))),
+        'ring_blocks': int(os.getenv('SENTINEL_RING_BLOCKS', '64')),
+        'ring_timeout_ms': int(os.getenv('SENTINEL_RING_TIMEOUT_MS', '10')),
+        'classification': os.getenv('SENTINEL_CLASSIFICATION', 'packet'),
+        'flow_max': int(os.getenv('SENTINEL_FLOW_MAX', '100000')),
+        'flow_idle_timeout': float(os.getenv('SENTINEL_FLOW_IDLE_TIMEOUT', '30')),
+        'flow_checkpoint_interval': float(os.getenv('SENTINEL_FLOW_CHECKPOINT_INTERVAL', '60')),
+        'verdict_cache_size': int(os.getenv('SENTINEL_VERDICT_CACHE_SIZE', '50000')),
+        'verdict_cache_ttl': float(os.getenv('SENTINEL_VERDICT_CACHE_TTL', '60')),
+        'verdict_cache_rescore_every': int(os.getenv('SENTINEL_VERDICT_CACHE_RESCORE_EVERY', '100')),
+        'verdict_cache_resolution': float(os.getenv('SENTINEL_VERDICT_CACHE_RESOLUTION', '8')),
+        'load_shedding': os.getenv('SENTINEL_LOAD_SHEDDING', 'true').lower() in ('1', 'true', 'yes'),
+        'shed_latency_ms': float(os.getenv('SENTINEL_SHED_LATENCY_MS', '50')),
+        'shed_sample_rate': int(os.getenv('SENTINEL_SHED_SAMPLE_RATE', '10')),
+        'compiled_forest': os.getenv('SENTINEL_COMPILED_FOREST', 'true').lower() in ('1', 'true', 'yes')
     }
 
 def print_banner():
@@ -588,17 +3000,34 @@ def print_banner():
 
 async def main():
     print_banner()
-    if not is_root():
+    config = load_config()
+    # Le rejeu d'un pcap ne nécessite aucun privilège
+    if not config['pcap'] and not is_root():
         print("⚠️ Please run as Administrator (Windows) or Root (Linux)")
         sys.exit(1)
-        
-    config = load_config()
+    
+    if config['topology'] not in TOPOLOGIES:
+        print(f"{Fore.RED}❌ Topologie inconnue: {config['topology']}{Style.RESET_ALL}")
+        sys.exit(1)
+    
+    if config['topology'] == 'split':
+        # Le modèle est chargé par le processus de capture, lancé et surveillé par run_service
+        capture_service = SentinelPacketCapture({**config, 'role': 'serve'})
+        print(f"{Fore.GREEN}✅ Processus de diffusion initialisé{Style.RESET_ALL}")
+        print(f"{Fore.BLUE}🌐 Interface WebSocket: ws://{config['websocket_host']}:{config['websocket_port']}{Style.RESET_ALL}")
+        print(f"{Fore.BLUE}🔗 Liaison capture: {config['ipc_socket']}{Style.RESET_ALL}")
+        print()
+        await capture_service.run_service()
+        return
     
     capture_service = SentinelPacketCapture(config)
     
     if not capture_service.load_model(config['model_path']):
         print(f"{Fore.RED}❌ Impossible de charger le modèle{Style.RESET_ALL}")
         sys.exit(1)
+    # Un fantôme illisible n'empêche pas le service de démarrer
+    if config['shadow_model_path'] and not capture_service.load_shadow_model(config['shadow_model_path']):
+        print(f"{Fore.YELLOW}⚠️ Modèle fantôme ignoré{Style.RESET_ALL}")
     
     print(f"{Fore.GREEN}✅ Service initialisé avec succès{Style.RESET_ALL}")
     print(f"{Fore.BLUE}🌐 Interface WebSocket: ws://{config['websocket_host']}:{config['websocket_port']}{Style.RESET_ALL}")
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Décodage des en-têtes de paquets
+Lecture directe des en-têtes Ethernet/IPv4/IPv6/TCP/UDP/ICMP depuis les octets bruts,
+avec repli sur la dissection scapy pour les encapsulations inconnues
+"""
+
+import socket
+import struct
+import time
+from typing import Any, Iterator, Optional, Tuple
+
+from scapy.all import Packet, IP, TCP, UDP, ICMP, RawPcapReader, conf
+from scapy.layers.inet import icmpcodes
+from scapy.layers.inet6 import IPv6
+
+# Types de lien (DLT/LINKTYPE) reconnus par le décodeur rapide
+DLT_EN10MB = 1
+DLT_RAW = 101
+DLT_RAW_ALT = 12
+DLT_LINUX_SLL = 113
+DLT_IPV4 = 228
+DLT_IPV6 = 229
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+PROTOCOL_NAMES = {IPPROTO_TCP: 'tcp', IPPROTO_UDP: 'udp', IPPROTO_ICMP: 'icmp'}
+
+# Bits TCP, dans l'ordre des lettres de scapy (FSRPAUECN)
+TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK, TCP_URG = 0x01, 0x02, 0x04, 0x08, 0x10, 0x20
+_TCP_FLAG_LETTERS = 'FSRPAUECN'
+
+_IPV4 = struct.Struct('!BBHHHBBH4s4s')
+_PORTS = struct.Struct('!HH')
+
+# Noms des ports et types ICMP tels qu'affichés par scapy (aperçu du payload)
+_TCP_PORT_NAMES = TCP.sport.i2s or {}
+_UDP_PORT_NAMES = UDP.sport.i2s or {}
+_ICMP_TYPE_NAMES = ICMP.type.i2s or {}
+_IP_PROTO_NAMES = IP.proto.i2s or {}
+
+
+class PacketHeaders:
+    """En-têtes utiles d'un paquet, décodés une seule fois.
+
+    Partagé par les infos envoyées au dashboard et l'extraction des
+    features : plus aucun `TCP in packet` / `packet[IP]` répété.
+    `tcp_flags` vaut None hors TCP ; `ip_version` vaut 0 sans couche IP.
+    """
+
+    __slots__ = ('timestamp', 'length', 'ip_version', 'src', 'dst', 'ip_proto', 'fragment',
+                 'sport', 'dport', 'tcp_flags', 'icmp_type', 'icmp_code', 'payload_length',
+                 'padding_length', 'vlan_tags', 'summary_override')
+
+    def __init__(self, timestamp: float, length: int):
+        self.timestamp = timestamp
+        self.length = length
+        self.ip_version = 0
+        self.src = ''
+        self.dst = ''
+        self.ip_proto = -1
+        self.fragment = 0
+        self.sport = 0
+        self.dport = 0
+        self.tcp_flags: Optional[int] = None
+        self.icmp_type = -1
+        self.icmp_code = -1
+        self.payload_length = 0
+        self.padding_length = 0
+        self.vlan_tags = 0
+        self.summary_override: Optional[str] = None
+
+    @property
+    def protocol(self) -> str:
+        """'tcp', 'udp', 'icmp' ou 'other', comme NetworkFeatureExtractor._get_protocol"""
+        if self.fragment:
+            return 'other'
+        return PROTOCOL_NAMES.get(self.ip_proto, 'other')
+
+    def tcp_flag_names(self):
+        flags = self.tcp_flags
+        if flags is None:
+            return []
+        names = []
+        if flags & TCP_SYN: names.append('SYN')
+        if flags & TCP_ACK: names.append('ACK')
+        if flags & TCP_FIN: names.append('FIN')
+        if flags & TCP_RST: names.append('RST')
+        if flags & TCP_PSH: names.append('PSH')
+        if flags & TCP_URG: names.append('URG')
+        return names
+
+    def summary(self) -> str:
+        """Résumé au format scapy de la charge utile de la trame (`str(packet.payload)`).
+
+        Identique à scapy jusqu'à la couche transport ; les protocoles
+        applicatifs que scapy disséquerait (DNS, NTP...) et le paquet cité
+        dans un message ICMP d'erreur apparaissent ici comme `Raw`.
+        """
+        if self.summary_override is not None:
+            return self.summary_override
+        parts = ['Dot1Q'] * self.vlan_tags
+        if not self.ip_version:
+            return ' / '.join(parts)
+        ip_name = 'IP' if self.ip_version == 4 else 'IPv6'
+        protocol = self.protocol
+        if protocol in ('tcp', 'udp'):
+            names = _TCP_PORT_NAMES if protocol == 'tcp' else _UDP_PORT_NAMES
+            transport = (f"{protocol.upper()} {self.src}:{names.get(self.sport, self.sport)} > "
+                         f"{self.dst}:{names.get(self.dport, self.dport)}")
+            if protocol == 'tcp':
+                letters = ''.join(letter for bit, letter in enumerate(_TCP_FLAG_LETTERS) if self.tcp_flags & (1 << bit))
+                transport = f"{transport} {letters}"
+            parts += [ip_name, transport]
+        elif protocol == 'icmp':
+            codes = icmpcodes.get(self.icmp_type, {})
+            parts += [ip_name, f"ICMP {self.src} > {self.dst} "
+                               f"{_ICMP_TYPE_NAMES.get(self.icmp_type, self.icmp_type)} "
+                               f"{codes.get(self.icmp_code, self.icmp_code)}"]
+        else:
+            line = f"{self.src} > {self.dst} {_IP_PROTO_NAMES.get(self.ip_proto, self.ip_proto)}"
+            if self.fragment and self.ip_version == 4:
+                line = f"{line} frag:{self.fragment}"
+            parts.append(line)
+        if self.payload_length:
+            parts.append('Raw')
+        if self.padding_length:
+            parts.append('Padding')
+        return ' / '.join(parts)
+
+
+def _ipv4_address(raw: bytes) -> str:
+    return f"{raw[0]}.{raw[1]}.{raw[2]}.{raw[3]}"
+
+
+def _decode_transport(headers: PacketHeaders, data: memoryview, offset: int, end: int) -> bool:
+    proto = headers.ip_proto
+    if proto == IPPROTO_TCP:
+        if end - offset < 20:
+            return False
+        headers.sport, headers.dport = _PORTS.unpack_from(data, offset)
+        headers.tcp_flags = ((data[offset + 12] & 0x01) << 8) | data[offset + 13]
+        header_length = (data[offset + 12] >> 4) * 4
+        if header_length < 20:
+            return False
+        headers.payload_length = max(0, end - offset - header_length)
+    elif proto == IPPROTO_UDP:
+        if end - offset < 8:
+            return False
+        headers.sport, headers.dport = _PORTS.unpack_from(data, offset)
+        headers.payload_length = max(0, end - offset - 8)
+    elif proto == IPPROTO_ICMP:
+        if end - offset < 8:
+            return False
+        headers.icmp_type = data[offset]
+        headers.icmp_code = data[offset + 1]
+        headers.payload_length = end - offset - 8
+    else:
+        # GRE, ICMPv6, ESP... : rares, et scapy seul sait les résumer fidèlement
+        return False
+    return True
+
+
+def _decode_ipv4(headers: PacketHeaders, data: memoryview, offset: int) -> bool:
+    if len(data) - offset < 20:
+        return False
+    (version_ihl, _, total_length, _, flags_fragment, _, proto, _, src, dst) = _IPV4.unpack_from(data, offset)
+    header_length = (version_ihl & 0x0f) * 4
+    if version_ihl >> 4 != 4 or header_length < 20 or total_length < header_length:
+        return False
+    end = min(len(data), offset + total_length)
+    headers.ip_version = 4
+    headers.src = _ipv4_address(src)
+    headers.dst = _ipv4_address(dst)
+    headers.ip_proto = proto
+    headers.fragment = flags_fragment & 0x1fff
+    headers.padding_length = len(data) - end
+    if headers.fragment:
+        # Fragment non initial : pas d'en-tête transport, comme dans scapy
+        headers.payload_length = end - offset - header_length
+        return True
+    return _decode_transport(headers, data, offset + header_length, end)
+
+
+def _decode_ipv6(headers: PacketHeaders, data: memoryview, offset: int) -> bool:
+    if len(data) - offset < 40 or data[offset] >> 4 != 6:
+        return False
+    payload_length = struct.unpack_from('!H', data, offset + 4)[0]
+    next_header = data[offset + 6]
+    headers.ip_version = 6
+    headers.src = socket.inet_ntop(socket.AF_INET6, bytes(data[offset + 8:offset + 24]))
+    headers.dst = socket.inet_ntop(socket.AF_INET6, bytes(data[offset + 24:offset + 40]))
+    end = min(len(data), offset + 40 + payload_length)
+    headers.padding_length = len(data) - end
+    # Les en-têtes d'extension (hop-by-hop, fragment...) partent vers scapy, qui les résume en couches
+    headers.ip_proto = next_header
+    return _decode_transport(headers, data, offset + 40, end)
+
+
+def decode_frame(data: Any, timestamp: Optional[float] = None, linktype: int = DLT_EN10MB) -> Optional[PacketHeaders]:
+    """Décode une trame brute ; None si l'encapsulation n'est pas reconnue (repli scapy)"""
+    view = memoryview(data)
+    headers = PacketHeaders(time.time() if timestamp is None else timestamp, len(view))
+    offset = 0
+    if linktype == DLT_EN10MB:
+        if len(view) < 14:
+            return None
+        ethertype = (view[12] << 8) | view[13]
+        offset = 14
+        while ethertype in VLAN_ETHERTYPES:
+            if len(view) < offset + 4:
+                return None
+            headers.vlan_tags += 1
+            ethertype = (view[offset + 2] << 8) | view[offset + 3]
+            offset += 4
+    elif linktype == DLT_LINUX_SLL:
+        if len(view) < 16:
+            return None
+        ethertype = (view[14] << 8) | view[15]
+        offset = 16
+    elif linktype in (DLT_RAW, DLT_RAW_ALT, DLT_IPV4, DLT_IPV6):
+        if not len(view):
+            return None
+        ethertype = ETH_P_IP if view[0] >> 4 == 4 else ETH_P_IPV6
+    else:
+        return None
+
+    if ethertype == ETH_P_IP:
+        return headers if _decode_ipv4(headers, view, offset) else None
+    if ethertype == ETH_P_IPV6:
+        return headers if _decode_ipv6(headers, view, offset) else None
+    # Ni IPv4 ni IPv6 (ARP, LLDP...) : seule la dissection scapy donne un aperçu fidèle
+    return None
+
+
+def decode_scapy(packet: Packet, timestamp: Optional[float] = None) -> PacketHeaders:
+    """Même enregistrement à partir d'un paquet déjà disséqué par scapy"""
+    if timestamp is None:
+        timestamp = float(packet.time) if getattr(packet, 'time', None) else time.time()
+    headers = PacketHeaders(timestamp, len(packet))
+    if IP in packet:
+        ip_packet = packet[IP]
+        headers.ip_version = 4
+        headers.src, headers.dst = ip_packet.src, ip_packet.dst
+        headers.ip_proto = ip_packet.proto
+        headers.fragment = ip_packet.frag
+    elif IPv6 in packet:
+        ip_packet = packet[IPv6]
+        headers.ip_version = 6
+        headers.src, headers.dst = ip_packet.src, ip_packet.dst
+        headers.ip_proto = ip_packet.nh
+    if TCP in packet:
+        tcp_packet = packet[TCP]
+        headers.ip_proto = IPPROTO_TCP
+        headers.sport, headers.dport = tcp_packet.sport, tcp_packet.dport
+        headers.tcp_flags = int(tcp_packet.flags)
+    elif UDP in packet:
+        udp_packet = packet[UDP]
+        headers.ip_proto = IPPROTO_UDP
+        headers.sport, headers.dport = udp_packet.sport, udp_packet.dport
+    elif ICMP in packet:
+        headers.ip_proto = IPPROTO_ICMP
+    headers.summary_override = str(packet.payload)[:100] if packet.payload else ''
+    return headers
+
+
+def decode_packet(packet: Any, linktype: int = DLT_EN10MB) -> PacketHeaders:
+    """Point d'entrée unique : octets bruts, paquet scapy ou enregistrement déjà décodé"""
+    if isinstance(packet, PacketHeaders):
+        return packet
+    if isinstance(packet, (bytes, bytearray, memoryview)):
+        return decode_raw(packet, None, linktype)
+    # Paquet scapy disséqué : on relit ses octets d'origine plutôt que ses couches
+    original = getattr(packet, 'original', None)
+    packet_linktype = conf.l2types.layer2num.get(type(packet))
+    if original and packet_linktype is not None:
+        timestamp = float(packet.time) if getattr(packet, 'time', None) else None
+        headers = decode_frame(original, timestamp, packet_linktype)
+        if headers is not None:
+            return headers
+    return decode_scapy(packet)
+
+
+def decode_raw(data: Any, timestamp: Optional[float] = None, linktype: int = DLT_EN10MB) -> PacketHeaders:
+    """Décode une trame brute, en passant par scapy seulement si le décodeur rapide échoue"""
+    headers = decode_frame(data, timestamp, linktype)
+    if headers is not None:
+        return headers
+    packet = conf.l2types.num2layer.get(linktype, conf.raw_layer)(bytes(data))
+    return decode_scapy(packet, time.time() if timestamp is None else timestamp)
+
+
+def read_pcap_frames(path: str) -> Iterator[Tuple[bytes, Optional[float], int]]:
+    """Itère (octets, horodatage, type de lien) d'un pcap/pcapng, sans dissection ni chargement complet"""
+    with RawPcapReader(path) as reader:
+        linktype = getattr(reader, 'linktype', DLT_EN10MB)
+        divisor = 1e9 if getattr(reader, 'nano', False) else 1e6
+        for data, meta in reader:
+            if hasattr(meta, 'tshigh'):
+                # pcapng : horodatage sur 64 bits, résolution propre à chaque interface
+                timestamp = ((meta.tshigh << 32) + meta.tslow) / meta.tsresol if meta.tshigh is not None else None
+                yield data, timestamp, meta.linktype
+            else:
+                yield data, meta.sec + meta.usec / divisor, linktype
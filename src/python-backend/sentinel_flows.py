@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Table de flux bidirectionnels
+Regroupe les paquets en connexions (5-tuple dans les deux sens), suit l'état TCP
+et émet un enregistrement par connexion terminée ou point de contrôle, comme les
+enregistrements de connexion NSL-KDD sur lesquels le modèle est entraîné
+"""
+
+import itertools
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sentinel_decode import IPPROTO_TCP, PacketHeaders, TCP_ACK, TCP_FIN, TCP_RST, TCP_SYN, TCP_URG
+
+# Modes de classification : un score par paquet (historique) ou par flux
+CLASSIFICATION_MODES = ('packet', 'flow')
+
+# États de connexion NSL-KDD (colonne `flag`), ordre alphabétique comme un LabelEncoder
+KDD_FLAGS = ['OTH', 'REJ', 'RSTO', 'RSTOS0', 'RSTR', 'S0', 'S1', 'S2', 'S3', 'SF', 'SH']
+# États comptés comme erreurs SYN (serror_rate) et rejets (rerror_rate)
+SYN_ERROR_FLAGS = frozenset(('S0', 'S1', 'S2', 'S3'))
+REJECT_FLAGS = frozenset(('REJ',))
+
+# Raisons d'émission d'un enregistrement de flux
+FLOW_REASONS = ('fin', 'rst', 'idle', 'evicted', 'checkpoint', 'end')
+
+FlowKey = Tuple[int, str, int, str, int]
+
+
+def flow_key(headers: PacketHeaders) -> FlowKey:
+    """Clé identique dans les deux sens : l'extrémité la plus petite vient en premier"""
+    a, b = (headers.src, headers.sport), (headers.dst, headers.dport)
+    if b < a:
+        a, b = b, a
+    return (headers.ip_proto, a[0], a[1], b[0], b[1])
+
+
+class Flow:
+    """Connexion bidirectionnelle : l'initiateur est l'émetteur du premier paquet
+    (ou le destinataire d'un SYN-ACK vu en premier)."""
+
+    __slots__ = ('id', 'key', 'src', 'dst', 'sport', 'dport', 'ip_proto', 'protocol',
+                 'first_seen', 'last_seen', 'last_emit', 'closed_at',
+                 'src_bytes', 'dst_bytes', 'src_packets', 'dst_packets',
+                 'orig_flags', 'resp_flags', 'urgent', 'wrong_fragment',
+                 'recorded', 'verdict', 'features', 'interface')
+
+    def __init__(self, flow_id: str, key: FlowKey, headers: PacketHeaders, interface: Optional[str] = None):
+        self.id = flow_id
+        self.key = key
+        # Interface du premier paquet : un flux vu sur plusieurs interfaces reste un seul flux
+        self.interface = interface
+        self.src, self.dst, self.sport, self.dport = headers.src, headers.dst, headers.sport, headers.dport
+        flags = headers.tcp_flags or 0
+        if flags & TCP_SYN and flags & TCP_ACK:
+            # Début de capture au milieu d'une ouverture : le SYN-ACK vient du répondeur
+            self.src, self.dst, self.sport, self.dport = self.dst, self.src, self.dport, self.sport
+        self.ip_proto = headers.ip_proto
+        self.protocol = headers.protocol
+        self.first_seen = self.last_seen = self.last_emit = headers.timestamp
+        self.closed_at: Optional[float] = None
+        self.src_bytes = self.dst_bytes = 0
+        self.src_packets = self.dst_packets = 0
+        self.orig_flags = self.resp_flags = 0
+        self.urgent = self.wrong_fragment = 0
+        # Compté une seule fois dans les fenêtres de trafic, à sa première émission finale
+        self.recorded = False
+        # Dernier verdict du modèle et features associées, repris par les paquets du flux
+        self.verdict: Optional[Dict[str, Any]] = None
+        self.features: Optional[Dict[str, Any]] = None
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.last_seen - self.first_seen)
+
+    @property
+    def is_tcp(self) -> bool:
+        return self.ip_proto == IPPROTO_TCP
+
+    def connection_flag(self) -> str:
+        """État NSL-KDD de la connexion (SF, S0, REJ...), d'après les flags vus dans chaque sens"""
+        if not self.is_tcp:
+            return 'SF'
+        orig, resp = self.orig_flags, self.resp_flags
+        if not orig & TCP_SYN:
+            return 'OTH'
+        if not (resp & TCP_SYN and resp & TCP_ACK):
+            if orig & TCP_RST: return 'RSTOS0'
+            if resp & TCP_RST: return 'REJ'
+            if orig & TCP_FIN: return 'SH'
+            return 'S0'
+        if orig & TCP_RST: return 'RSTO'
+        if resp & TCP_RST: return 'RSTR'
+        if orig & TCP_FIN and resp & TCP_FIN: return 'SF'
+        if orig & TCP_FIN: return 'S2'
+        if resp & TCP_FIN: return 'S3'
+        return 'S1'
+
+    def logged_in(self) -> int:
+        """Approximation de `logged_in` sans inspection du contenu : connexion TCP établie
+        avec des données dans les deux sens"""
+        established = self.resp_flags & TCP_SYN and self.resp_flags & TCP_ACK
+        return 1 if self.is_tcp and established and self.src_bytes and self.dst_bytes else 0
+
+    def to_record(self, reason: str) -> Dict[str, Any]:
+        """Instantané envoyé au modèle puis au dashboard (mêmes clés que les paquets)"""
+        return {
+            'id': self.id,
+            'reason': reason,
+            'start': datetime.fromtimestamp(self.first_seen).isoformat(),
+            'end': datetime.fromtimestamp(self.last_seen).isoformat(),
+            'duration': round(self.duration, 6),
+            'sourceIp': self.src, 'destinationIp': self.dst,
+            'sourcePort': self.sport, 'destinationPort': self.dport,
+            'protocol': self.protocol.upper() if self.protocol in ('tcp', 'udp', 'icmp') else 'Unknown',
+            'flag': self.connection_flag(),
+            'srcBytes': self.src_bytes, 'dstBytes': self.dst_bytes,
+            'srcPackets': self.src_packets, 'dstPackets': self.dst_packets,
+            'interface': self.interface
+        }
+
+
+class FlowTable:
+    """Table de flux bornée en mémoire.
+
+    Les flux actifs sont rangés du moins au plus récemment actif : l'expiration
+    sur inactivité et l'éviction quand la table est pleine retirent en tête, en
+    O(1). Un flux TCP fermé (FIN des deux côtés ou RST) est émis aussitôt puis
+    gardé `linger` secondes pour absorber les derniers ACK sans recréer de flux.
+    Le temps est celui des paquets, pour un rejeu pcap identique au direct.
+    """
+
+    def __init__(self, max_flows: int = 100000, idle_timeout: float = 30.0,
+                 checkpoint_interval: float = 60.0, linger: float = 2.0):
+        self.max_flows = max(1, max_flows)
+        self.idle_timeout = idle_timeout
+        self.checkpoint_interval = checkpoint_interval
+        self.linger = linger
+        self.active: 'OrderedDict[FlowKey, Flow]' = OrderedDict()
+        self.closing: 'OrderedDict[FlowKey, Flow]' = OrderedDict()
+        self._ids = itertools.count()
+        self._last_sweep = 0.0
+        self._clock = (0.0, time.monotonic())
+        self.stats = {'flows_created': 0, 'records_emitted': 0, **{reason: 0 for reason in FLOW_REASONS}}
+
+    def update(self, headers: PacketHeaders, interface: Optional[str] = None) -> Tuple[Optional[Flow], List[Tuple[Flow, str]]]:
+        """Ajoute un paquet IP à son flux ; renvoie le flux et les enregistrements à émettre"""
+        emitted: List[Tuple[Flow, str]] = []
+        if not headers.ip_version:
+            return None, emitted
+        now = headers.timestamp
+        if now > self._clock[0]:
+            self._clock = (now, time.monotonic())
+        if now - self._last_sweep >= 1.0:
+            self.expire(now, emitted)
+
+        key = flow_key(headers)
+        flags = headers.tcp_flags or 0
+        flow = self.active.get(key)
+        if flow is None:
+            flow = self.closing.get(key)
+            if flow is not None and flags & TCP_SYN and not flags & TCP_ACK:
+                # Réutilisation du 5-tuple par une nouvelle connexion
+                del self.closing[key]
+                flow = None
+            if flow is None:
+                if len(self.active) >= self.max_flows:
+                    _, oldest = self.active.popitem(last=False)
+                    self._emit(oldest, 'evicted', emitted)
+                flow = self.active[key] = Flow(f"flow_{next(self._ids)}", key, headers, interface)
+                self.stats['flows_created'] += 1
+        else:
+            self.active.move_to_end(key)
+
+        forward = headers.src == flow.src and headers.sport == flow.sport
+        if forward:
+            flow.src_bytes += headers.payload_length
+            flow.src_packets += 1
+            flow.orig_flags |= flags
+        else:
+            flow.dst_bytes += headers.payload_length
+            flow.dst_packets += 1
+            flow.resp_flags |= flags
+        if flags & TCP_URG:
+            flow.urgent += 1
+        if headers.fragment:
+            flow.wrong_fragment += 1
+        flow.last_seen = max(flow.last_seen, now)
+
+        if flow.closed_at is not None:
+            return flow, emitted
+        if flags & TCP_RST or (flow.orig_flags & TCP_FIN and flow.resp_flags & TCP_FIN):
+            self._close(flow, 'rst' if flags & TCP_RST else 'fin', emitted)
+        elif self.checkpoint_interval > 0 and now - flow.last_emit >= self.checkpoint_interval:
+            flow.last_emit = now
+            self._emit(flow, 'checkpoint', emitted)
+        return flow, emitted
+
+    def expire(self, now: float, emitted: Optional[List[Tuple[Flow, str]]] = None) -> List[Tuple[Flow, str]]:
+        """Émet les flux inactifs depuis `idle_timeout` et oublie les flux fermés depuis `linger`"""
+        emitted = [] if emitted is None else emitted
+        self._last_sweep = now
+        active = self.active
+        while active:
+            flow = next(iter(active.values()))
+            if flow.last_seen > now - self.idle_timeout:
+                break
+            active.popitem(last=False)
+            self._emit(flow, 'idle', emitted)
+        closing = self.closing
+        while closing and next(iter(closing.values())).closed_at <= now - self.linger:
+            closing.popitem(last=False)
+        return emitted
+
+    def clock(self) -> float:
+        """Heure courante dans le temps des paquets : dernier horodatage vu, avancé du temps écoulé depuis"""
+        timestamp, seen_at = self._clock
+        return timestamp + (time.monotonic() - seen_at)
+
+    def flush(self, reason: str = 'end') -> List[Tuple[Flow, str]]:
+        """Émet tous les flux encore actifs (fin de capture ou de rejeu)"""
+        emitted: List[Tuple[Flow, str]] = []
+        while self.active:
+            _, flow = self.active.popitem(last=False)
+            self._emit(flow, reason, emitted)
+        self.closing.clear()
+        return emitted
+
+    def _close(self, flow: Flow, reason: str, emitted: List[Tuple[Flow, str]]):
+        del self.active[flow.key]
+        flow.closed_at = flow.last_seen
+        self.closing[flow.key] = flow
+        if len(self.closing) > self.max_flows:
+            self.closing.popitem(last=False)
+        self._emit(flow, reason, emitted)
+
+    def _emit(self, flow: Flow, reason: str, emitted: List[Tuple[Flow, str]]):
+        self.stats[reason] += 1
+        self.stats['records_emitted'] += 1
+        emitted.append((flow, reason))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'active_flows': len(self.active),
+            'closing_flows': len(self.closing),
+            'max_flows': self.max_flows,
+            'idle_timeout_s': self.idle_timeout,
+            'checkpoint_interval_s': self.checkpoint_interval,
+            **self.stats
+        }
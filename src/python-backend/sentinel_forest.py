@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Forêt aléatoire compilée
+Aplatit les arbres d'un RandomForestClassifier sklearn en tableaux NumPy
+contigus et évalue un lot de lignes niveau par niveau, de façon vectorisée,
+avec des probabilités identiques à celles de predict_proba
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+import sklearn
+
+# Version du format sur disque : à incrémenter si la disposition des tableaux change
+FORMAT_VERSION = 2
+
+
+def _sklearn_normalizes_leaves() -> bool:
+    """Avant sklearn 1.4, tree_.value contient des effectifs que predict_proba normalise ;
+    depuis, il contient directement les proportions, utilisées telles quelles"""
+    major, minor = (int(part) for part in sklearn.__version__.split('.')[:2])
+    return (major, minor) < (1, 4)
+
+
+class CompiledForest:
+    """Forêt aplatie : un nœud par entrée dans des tableaux partagés par tous les arbres.
+
+    `feature` et `threshold` décrivent le test de chaque nœud interne et
+    `children[2 * nœud + (x > seuil)]` donne le nœud suivant ; une feuille
+    boucle sur elle-même, ce qui permet d'avancer toutes les paires
+    (ligne, arbre) du même pas. `leaf_values` contient les probabilités de
+    classe par nœud, déjà dans la forme que predict_proba de chaque arbre renvoie.
+    """
+
+    # Lignes évaluées ensemble : borne la taille des tableaux de paires (lignes x arbres)
+    CHUNK_ROWS = 256
+    # Les paires arrivées en feuille sont retirées tous les COMPACT_EVERY niveaux
+    COMPACT_EVERY = 4
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, children: np.ndarray,
+                 leaf_values: np.ndarray, roots: np.ndarray, max_depth: int, n_features: int):
+        self.feature = feature.astype(np.intp, copy=False)
+        self.threshold = threshold
+        self.children = children.astype(np.intp, copy=False)
+        self.leaf_values = leaf_values
+        self.roots = roots.astype(np.intp, copy=False)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.is_leaf = self.children[0::2] == np.arange(len(self.feature))
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        estimators = getattr(model, 'estimators_', None)
+        if not estimators or not all(hasattr(estimator, 'tree_') for estimator in estimators):
+            raise ValueError("Le modèle n'est pas une forêt d'arbres sklearn")
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Seules les forêts à une sortie sont compilables")
+        trees = [estimator.tree_ for estimator in estimators]
+        n_classes = int(model.n_classes_)
+        counts = [tree.node_count for tree in trees]
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+        total = int(sum(counts))
+
+        feature = np.zeros(total, dtype=np.intp)
+        threshold = np.zeros(total, dtype=np.float64)
+        children = np.repeat(np.arange(total, dtype=np.intp), 2)
+        leaf_values = np.zeros((total, n_classes), dtype=np.float64)
+        normalize = _sklearn_normalizes_leaves()
+
+        for tree, offset in zip(trees, offsets):
+            nodes = slice(offset, offset + tree.node_count)
+            internal = tree.children_left != -1
+            feature[nodes] = np.where(internal, tree.feature, 0)
+            threshold[nodes] = tree.threshold
+            index = np.flatnonzero(internal) + offset
+            children[2 * index] = tree.children_left[internal] + offset
+            children[2 * index + 1] = tree.children_right[internal] + offset
+            values = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+            if normalize:
+                # Même calcul que DecisionTreeClassifier.predict_proba (sklearn < 1.4)
+                normalizer = values.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                values /= normalizer
+            leaf_values[nodes] = values
+
+        return cls(feature, threshold, children, leaf_values, offsets,
+                   max(tree.max_depth for tree in trees), model.n_features_in_)
+
+    def leaves(self, X: np.ndarray) -> np.ndarray:
+        """Indice de la feuille atteinte par chaque ligne dans chaque arbre, forme (lignes, arbres)"""
+        n_rows = X.shape[0]
+        flat = np.ascontiguousarray(X).reshape(-1)
+        nodes = np.tile(self.roots, n_rows)
+        row_base = np.repeat(np.arange(n_rows, dtype=np.intp) * self.n_features, self.n_trees)
+        pairs = np.arange(len(nodes))
+        result = nodes.copy()
+        feature, threshold, children = self.feature, self.threshold, self.children
+        for depth in range(self.max_depth):
+            if depth and depth % self.COMPACT_EVERY == 0:
+                # Seules les paires encore sur un nœud interne continuent à descendre
+                active = ~self.is_leaf[nodes]
+                result[pairs[~active]] = nodes[~active]
+                pairs, nodes, row_base = pairs[active], nodes[active], row_base[active]
+                if not len(pairs):
+                    break
+            # Même test que sklearn : valeur float32 promue en double, comparée au seuil
+            go_right = flat[row_base + feature[nodes]] > threshold[nodes]
+            nodes = children[2 * nodes + go_right]
+        result[pairs] = nodes
+        return result.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Attendu {self.n_features} features, reçu {X.shape}")
+        if X.shape[0] > self.CHUNK_ROWS:
+            return np.concatenate([self.predict_proba(X[start:start + self.CHUNK_ROWS])
+                                   for start in range(0, X.shape[0], self.CHUNK_ROWS)])
+        values = self.leaf_values[self.leaves(X)]
+        # Somme arbre par arbre dans l'ordre des estimateurs, comme la boucle de sklearn :
+        # cumsum accumule séquentiellement, là où sum ferait une sommation par paires
+        proba = np.cumsum(values, axis=1)[:, -1, :]
+        proba /= self.n_trees
+        return proba
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'feature': self.feature, 'threshold': self.threshold, 'children': self.children,
+            'leaf_values': self.leaf_values, 'roots': self.roots,
+            'shape': np.array([self.max_depth, self.n_features], dtype=np.int64)
+        }
+
+    def save(self, path: str, fingerprint: str):
+        """Écrit la forêt compilée (joblib non compressé) via un fichier temporaire renommé"""
+        temporary = f"{path}.tmp"
+        joblib.dump({'fingerprint': fingerprint, 'format_version': FORMAT_VERSION, **self.to_arrays()}, temporary)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: str, mmap: bool = True) -> Optional['CompiledForest']:
+        """Relit une forêt compilée ; None si absente, illisible ou issue d'un autre modèle.
+
+        Avec `mmap`, les tableaux restent dans le fichier mappé en lecture seule,
+        partagé entre les processus qui servent le même modèle.
+        """
+        try:
+            data = joblib.load(path, mmap_mode='r' if mmap else None)
+            if data.get('format_version') != FORMAT_VERSION or data.get('fingerprint') != fingerprint:
+                return None
+            max_depth, n_features = (int(value) for value in data['shape'])
+            return cls(data['feature'], data['threshold'], data['children'],
+                       data['leaf_values'], data['roots'], max_depth, n_features)
+        except Exception:
+            # Cache tronqué ou d'un autre format : il sera recompilé et réécrit
+            return None
+
+
+def cache_path(model_path: str) -> str:
+    return f"{model_path}.forest.joblib"
+
+
+def model_fingerprint(model, model_path: Optional[str] = None) -> str:
+    """Empreinte du modèle compilé : contenu du fichier modèle s'il existe, structure de la
+    forêt et version de sklearn (l'interprétation de tree_.value en dépend)"""
+    digest = hashlib.sha256()
+    if model_path and os.path.exists(model_path):
+        with open(model_path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(1 << 20), b''):
+                digest.update(chunk)
+    estimators = getattr(model, 'estimators_', None)
+    if not estimators or not all(hasattr(estimator, 'tree_') for estimator in estimators):
+        raise ValueError("Le modèle n'est pas une forêt d'arbres sklearn")
+    trees = [estimator.tree_ for estimator in estimators]
+    structure: Any = (sklearn.__version__, FORMAT_VERSION, int(model.n_features_in_), int(model.n_classes_),
+                      [tree.node_count for tree in trees], getattr(model, 'version', None))
+    digest.update(repr(structure).encode('utf-8'))
+    return digest.hexdigest()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Liaison capture / diffusion
+Flux de trames sur socket Unix entre le processus de capture et d'analyse et
+le processus qui sert les clients WebSocket : les enregistrements y circulent
+déjà encodés en JSON, le processus de diffusion les relaie sans les réencoder
+"""
+
+import asyncio
+import json
+import logging
+import struct
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# En-tête de trame : type, longueur de la charge utile
+FRAME_HEADER = struct.Struct('=cI')
+# Longueur de chaque enregistrement dans une trame de paquets ou de flux
+RECORD_LENGTH = struct.Struct('=I')
+# Identifiant de requête en tête d'une commande ou d'une réponse
+REQUEST_ID = struct.Struct('=I')
+
+# Capture -> diffusion
+FRAME_HELLO = b'H'      # présentation à la connexion (pid, démarrage)
+FRAME_PACKETS = b'P'    # paquets scorés, un lot de flush
+FRAME_FLOWS = b'F'      # enregistrements de flux scorés
+FRAME_STATS = b'S'      # stats de capture, sert aussi de battement de cœur
+FRAME_BROADCAST = b'B'  # message déjà encodé pour tous les clients (model_info...)
+FRAME_REPLY = b'R'      # réponse à une commande : identifiant, message encodé
+# Diffusion -> capture
+FRAME_COMMAND = b'C'    # commande d'un client : identifiant, message JSON
+
+MAX_FRAME_BYTES = 64 << 20
+
+
+def encode_records(texts: List[str]) -> bytes:
+    """Concatène des enregistrements JSON, chacun précédé de sa longueur"""
+    parts = []
+    for text in texts:
+        data = text.encode('utf-8')
+        parts.append(RECORD_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def decode_records(payload: bytes) -> List[str]:
+    texts = []
+    offset, size = 0, len(payload)
+    view = memoryview(payload)
+    while offset < size:
+        (length,) = RECORD_LENGTH.unpack_from(payload, offset)
+        offset += RECORD_LENGTH.size
+        texts.append(str(view[offset:offset + length], 'utf-8'))
+        offset += length
+    return texts
+
+
+def write_frame(writer: asyncio.StreamWriter, kind: bytes, payload: bytes):
+    writer.writelines((FRAME_HEADER.pack(kind, len(payload)), payload))
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    kind, length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ConnectionError(f"Trame trop grande: {length} octets")
+    return kind, await reader.readexactly(length)
+
+
+class CaptureLink:
+    """Côté capture : connexion au socket du processus de diffusion, rétablie s'il
+    disparaît. Les trames ne sont jamais mises en attente au-delà de
+    `max_buffer` octets : un processus de diffusion lent ou absent fait perdre
+    des trames (comptées), il ne ralentit jamais la capture. Les réponses aux
+    commandes (non jetables) passent outre cette limite ; elles ne sont
+    perdues que si la liaison est coupée (`replies_dropped`).
+    """
+
+    def __init__(self, path: str, max_buffer: int = 8 << 20, retry_interval: float = 1.0,
+                 logger: Optional[logging.Logger] = None):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.retry_interval = retry_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.stats = {
+            'connects': 0, 'frames_sent': 0, 'frames_dropped': 0, 'records_dropped': 0,
+            'replies_dropped': 0, 'bytes_sent': 0
+        }
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def run(self, hello: Callable[[], Dict[str, Any]],
+                  on_command: Callable[[int, Dict[str, Any]], Awaitable[None]]):
+        """Se connecte, se présente puis traite les commandes ; reconnexion jusqu'à annulation"""
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (OSError, ConnectionError):
+                await asyncio.sleep(self.retry_interval)
+                continue
+            self.writer = writer
+            self.stats['connects'] += 1
+            self.logger.info(f"Connecté au processus de diffusion ({self.path})")
+            write_frame(writer, FRAME_HELLO, json.dumps(hello()).encode('utf-8'))
+            try:
+                while True:
+                    kind, payload = await read_frame(reader)
+                    if kind == FRAME_COMMAND:
+                        (request_id,) = REQUEST_ID.unpack_from(payload)
+                        await on_command(request_id, json.loads(payload[REQUEST_ID.size:]))
+            except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+                self.logger.warning(f"Liaison avec le processus de diffusion perdue: {e}")
+            finally:
+                self.writer = None
+                writer.close()
+            await asyncio.sleep(self.retry_interval)
+
+    def send(self, kind: bytes, payload: bytes, records: int = 0, droppable: bool = True) -> bool:
+        """Envoie une trame depuis la boucle ; False si elle est perdue (déconnecté, ou tampon
+        plein pour une trame jetable)"""
+        writer = self.writer
+        if (writer is None or writer.is_closing()
+                or (droppable and writer.transport.get_write_buffer_size() > self.max_buffer)):
+            self.stats['frames_dropped'] += 1
+            self.stats['records_dropped'] += records
+            if not droppable:
+                self.stats['replies_dropped'] += 1
+            return False
+        write_frame(writer, kind, payload)
+        self.stats['frames_sent'] += 1
+        self.stats['bytes_sent'] += FRAME_HEADER.size + len(payload)
+        return True
+
+    def send_records(self, kind: bytes, records: List[Dict[str, Any]]) -> bool:
+        """Encode chaque enregistrement en JSON, une seule fois, sauf si la trame serait perdue"""
+        if not self.connected:
+            return self.send(kind, b'', records=len(records))
+        return self.send(kind, encode_records([json.dumps(record) for record in records]), records=len(records))
+
+    def get_stats(self) -> Dict[str, Any]:
+        writer = self.writer
+        return {
+            'connected': self.connected,
+            'socket': self.path,
+            'write_buffer_bytes': writer.transport.get_write_buffer_size() if self.connected else 0,
+            **self.stats
+        }
+
+
+class RemoteSession:
+    """Client WebSocket vu depuis le processus de capture : ses réponses repartent par la liaison"""
+
+    def __init__(self, link: CaptureLink, request_id: int):
+        self.link = link
+        self.request_id = request_id
+        self.address = 'diffusion'
+
+    def enqueue(self, message: str, droppable: bool = True) -> bool:
+        return self.link.send(FRAME_REPLY, REQUEST_ID.pack(self.request_id) + message.encode('utf-8'),
+                              droppable=droppable)
+
+
+class CaptureEndpoint:
+    """Côté diffusion : état de la connexion du processus de capture, pour les stats de santé"""
+
+    def __init__(self, path: str, stale_after: float = 15.0):
+        self.path = path
+        self.stale_after = stale_after
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.hello: Dict[str, Any] = {}
+        self.last_frame: Optional[float] = None
+        self.stats = {'connects': 0, 'frames': 0, 'records': 0, 'restarts': 0, 'last_exit_code': None}
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    def send_command(self, request_id: int, message: Dict[str, Any]) -> bool:
+        if not self.connected:
+            return False
+        write_frame(self.writer, FRAME_COMMAND, REQUEST_ID.pack(request_id) + json.dumps(message).encode('utf-8'))
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        age = time.monotonic() - self.last_frame if self.last_frame is not None else None
+        return {
+            'connected': self.connected,
+            'healthy': self.connected and age is not None and age <= self.stale_after,
+            'pid': self.hello.get('pid'),
+            'started': self.hello.get('started'),
+            'last_frame_age_s': round(age, 3) if age is not None else None,
+            **self.stats
+        }
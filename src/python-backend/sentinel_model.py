@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Artefacts de modèle
+Enregistre et recharge un modèle avec ses métadonnées de schéma (joblib non
+compressé, tableaux mappés en mémoire) et le valide contre l'ordre des features
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+ARTIFACT_FORMAT = 'sentinel-model'
+ARTIFACT_VERSION = 1
+
+
+class ModelValidationError(ValueError):
+    """Le fichier ne contient pas un classifieur utilisable avec les features attendues"""
+
+
+def save_artifact(model, path: str, feature_names: Optional[List[str]] = None,
+                  category_maps: Optional[Dict[str, List[str]]] = None, version: Optional[str] = None,
+                  **metadata):
+    """Enregistre le modèle et son schéma ; sans compression, pour permettre le mapping mémoire"""
+    names = feature_names if feature_names is not None else getattr(model, 'feature_names_in_', None)
+    bundle = {
+        'format': ARTIFACT_FORMAT,
+        'format_version': ARTIFACT_VERSION,
+        'model': model,
+        'feature_names': list(names) if names is not None else None,
+        'category_maps': category_maps or getattr(model, 'category_maps', None),
+        'version': version or getattr(model, 'version', None),
+        'sklearn_version': sklearn.__version__,
+        'created': datetime.now().isoformat(),
+        **metadata
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    joblib.dump(bundle, temporary)
+    os.replace(temporary, path)
+
+
+def predict_proba(model, matrix: np.ndarray) -> np.ndarray:
+    """predict_proba de sklearn sur un lot ordonné selon le schéma du modèle.
+
+    Un modèle qui connaît ses noms de colonnes les reçoit avec le lot (vue
+    DataFrame, sans copie) : sklearn n'émet pas l'avertissement « X does not
+    have valid feature names » à chaque appel, sans filtre global.
+    """
+    names = getattr(model, 'feature_names_in_', None)
+    if names is not None:
+        matrix = pd.DataFrame(matrix, columns=names, copy=False)
+    return model.predict_proba(matrix)
+
+
+def load_artifact(path: str, expected_features: List[str], mmap: bool = True) -> Tuple[Any, Dict[str, Any]]:
+    """Charge un artefact Sentinel ou un estimateur nu (pickle ou joblib) et le valide.
+
+    Avec `mmap`, les tableaux numpy du fichier sont mappés en lecture seule
+    plutôt que copiés : les pages sont partagées entre processus par le cache
+    du noyau. L'ordre des features retenu est rendu dans
+    `metadata['feature_names']`, d'où FeatureSchema le tient : l'estimateur
+    n'est pas modifié (feature_names_in_ n'est pas assignable sur un Pipeline).
+    """
+    loaded = joblib.load(path, mmap_mode='r' if mmap else None)
+    if isinstance(loaded, dict) and loaded.get('format') == ARTIFACT_FORMAT:
+        if loaded.get('format_version', 0) > ARTIFACT_VERSION:
+            raise ModelValidationError(f"Format d'artefact trop récent: {loaded.get('format_version')}")
+        model = loaded['model']
+        metadata = {key: value for key, value in loaded.items() if key != 'model'}
+    else:
+        model, metadata = loaded, {'format': 'estimator'}
+
+    metadata['feature_order'] = validate_model(model, metadata.get('feature_names'), expected_features)
+    names = metadata.get('feature_names') or getattr(model, 'feature_names_in_', None)
+    # Estimateur entraîné sur une matrice sans noms : ordre attendu par défaut
+    metadata['feature_names'] = list(names) if names is not None else list(expected_features)
+    for key in ('category_maps', 'version', 'is_dummy'):
+        if metadata.get(key) is not None:
+            setattr(model, key, metadata[key])
+    return model, metadata
+
+
+def validate_model(model, feature_names: Optional[List[str]], expected_features: List[str]) -> str:
+    """Vérifie classifieur et features ; renvoie 'exact', 'reordered' ou 'assumed' (noms absents)"""
+    if not hasattr(model, 'predict_proba') or not hasattr(model, 'classes_'):
+        raise ModelValidationError(f"Pas de classifieur entraîné dans le fichier ({type(model).__name__})")
+    # Verdict = classe 1 (anomalie), score = colonne 1 de predict_proba
+    classes = list(model.classes_)
+    if classes != [0, 1]:
+        raise ModelValidationError(f"Classifieur binaire 0/1 attendu (1 = anomalie), classes: {classes}")
+    n_features = getattr(model, 'n_features_in_', None)
+    if n_features != len(expected_features):
+        raise ModelValidationError(f"Le modèle attend {n_features} features, {len(expected_features)} attendues")
+    fitted = getattr(model, 'feature_names_in_', None)
+    if feature_names and fitted is not None and list(fitted) != list(feature_names):
+        raise ModelValidationError(f"Noms de features de l'artefact différents de ceux de l'entraînement: {list(fitted)}")
+    names = feature_names if feature_names else fitted
+    if names is None:
+        return 'assumed'
+    names = list(names)
+    missing = [name for name in expected_features if name not in names]
+    unknown = [name for name in names if name not in expected_features]
+    if missing or unknown or len(set(names)) != len(names):
+        raise ModelValidationError(f"Features incompatibles (manquantes: {missing}, inconnues: {unknown})")
+    return 'exact' if names == list(expected_features) else 'reordered'
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Capture par anneau mémoire partagé (Linux)
+Socket AF_PACKET avec anneau de blocs TPACKET_V3 : le noyau remplit des blocs
+de trames que l'on lit directement dans la mémoire mappée, sans appel système
+ni copie par paquet
+"""
+
+import mmap
+import select
+import socket
+import struct
+import sys
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sentinel_decode import DLT_EN10MB, DLT_RAW
+
+# Constantes de <linux/if_packet.h> (absentes du module socket)
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+ETH_P_ALL = 0x0003
+
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1 << 0
+TP_STATUS_VLAN_VALID = 1 << 4
+TP_STATUS_VLAN_TPID_VALID = 1 << 6
+
+# Types matériels (ARPHRD_*) vers type de lien du décodeur
+_LINKTYPES = {1: DLT_EN10MB, 772: DLT_EN10MB, 0xFFFE: DLT_RAW}
+
+# tpacket_req3 : block_size, block_nr, frame_size, frame_nr, retire_blk_tov, sizeof_priv, feature_req_word
+_REQ3 = struct.Struct('=IIIIIII')
+# tpacket_block_desc : version, offset_to_priv, puis tpacket_hdr_v1 (block_status, num_pkts, offset_to_first_pkt)
+_BLOCK_STATUS = struct.Struct('=I')
+_BLOCK_HEADER = struct.Struct('=III')
+_BLOCK_HEADER_OFFSET = 8
+# tpacket3_hdr : next_offset, sec, nsec, snaplen, len, status, mac, net, puis hv1 (rxhash, vlan_tci, vlan_tpid)
+_FRAME_HEADER = struct.Struct('=IIIIIIHHIIH')
+# sockaddr_ll suit l'en-tête, aligné sur 16 octets : sll_hatype est à +8
+_SLL_HATYPE_OFFSET = 48 + 8
+_HATYPE = struct.Struct('=H')
+_STATS = struct.Struct('=III')
+# tpacket_stats : compteurs d'un socket AF_PACKET sans anneau V3 (packets, drops)
+_SOCKET_STATS = struct.Struct('=II')
+
+# Taille d'emplacement nominale : en V3 les trames sont de taille variable dans le bloc
+_FRAME_SIZE = 2048
+
+Frame = Tuple[Any, float, int]
+
+
+def ring_available() -> bool:
+    return sys.platform.startswith('linux') and hasattr(socket, 'AF_PACKET')
+
+
+def read_socket_stats(sock) -> Optional[Tuple[int, int]]:
+    """(paquets, pertes) d'un socket AF_PACKET depuis la dernière lecture ; None hors Linux ou socket fermé"""
+    try:
+        data = sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _SOCKET_STATS.size)
+    except (OSError, AttributeError, ValueError):
+        return None
+    return _SOCKET_STATS.unpack_from(data)
+
+
+class TPacketRing:
+    """Anneau de réception TPACKET_V3 sur une interface (toutes si `interface` vaut None).
+
+    Le filtre BPF est compilé par scapy et attaché avant que le socket ne
+    reçoive du trafic. `blocks()` rend chaque bloc retiré par le noyau sous
+    forme de liste de trames (vues mémoire sur l'anneau, valides jusqu'à
+    l'itération suivante) et le rend au noyau ensuite.
+    """
+
+    def __init__(self, interface: Optional[str] = None, filter_expr: Optional[str] = None,
+                 block_size: int = 1 << 20, block_count: int = 64, block_timeout_ms: int = 10):
+        if block_size % mmap.PAGESIZE or block_size & (block_size - 1):
+            raise ValueError("La taille de bloc doit être une puissance de 2 multiple de la taille de page")
+        if block_count < 1:
+            raise ValueError("L'anneau doit contenir au moins un bloc")
+        self.interface = interface
+        self.filter_expr = filter_expr or None
+        self.block_size = block_size
+        self.block_count = block_count
+        self.block_timeout_ms = block_timeout_ms
+        self.stats = {'packets': 0, 'drops': 0, 'freezes': 0, 'blocks': 0, 'frames': 0}
+        self._stats_lock = Lock()
+        self._socket: Optional[socket.socket] = None
+        self._map: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self._poll = None
+
+    def open(self):
+        # Sans interface, le socket doit écouter ETH_P_ALL dès sa création ; avec une
+        # interface il reste muet jusqu'au bind, fait une fois filtre et anneau en place
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                             0 if self.interface else socket.htons(ETH_P_ALL))
+        try:
+            if self.filter_expr:
+                from scapy.arch.linux import attach_filter
+                attach_filter(sock, self.filter_expr, self.interface)
+            sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            frames_per_block = self.block_size // _FRAME_SIZE
+            sock.setsockopt(SOL_PACKET, PACKET_RX_RING, _REQ3.pack(
+                self.block_size, self.block_count, _FRAME_SIZE, frames_per_block * self.block_count,
+                self.block_timeout_ms, 0, 0
+            ))
+            self._map = mmap.mmap(sock.fileno(), self.block_size * self.block_count,
+                                  mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            if self.interface:
+                sock.bind((self.interface, ETH_P_ALL))
+        except Exception:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            sock.close()
+            raise
+        self._socket = sock
+        self._view = memoryview(self._map)
+        self._poll = select.poll()
+        self._poll.register(sock.fileno(), select.POLLIN | select.POLLERR)
+
+    def close(self):
+        self.read_kernel_stats()
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Une trame est encore référencée : le mapping sera libéré avec elle
+                pass
+            self._map = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def __enter__(self) -> 'TPacketRing':
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def blocks(self, timeout: float = 0.5) -> Iterator[List[Frame]]:
+        """Itère les blocs prêts ; une liste vide signale un délai écoulé sans trafic.
+
+        Les vues rendues pointent dans l'anneau : elles ne doivent pas être
+        conservées au-delà du tour de boucle, le bloc étant rendu au noyau
+        dès l'itération suivante.
+        """
+        index = 0
+        while True:
+            offset = index * self.block_size
+            status = _BLOCK_STATUS.unpack_from(self._view, offset + _BLOCK_HEADER_OFFSET)[0]
+            if not status & TP_STATUS_USER:
+                self._poll.poll(int(timeout * 1000))
+                status = _BLOCK_STATUS.unpack_from(self._view, offset + _BLOCK_HEADER_OFFSET)[0]
+                if not status & TP_STATUS_USER:
+                    yield []
+                    continue
+            try:
+                yield self._read_block(offset)
+            finally:
+                # Rend le bloc au noyau, y compris si le consommateur s'arrête en cours de route
+                if self._view is not None:
+                    _BLOCK_STATUS.pack_into(self._view, offset + _BLOCK_HEADER_OFFSET, TP_STATUS_KERNEL)
+            index = (index + 1) % self.block_count
+
+    def _read_block(self, offset: int) -> List[Frame]:
+        view = self._view
+        _, count, position = _BLOCK_HEADER.unpack_from(view, offset + _BLOCK_HEADER_OFFSET)
+        position += offset
+        frames = []
+        for _ in range(count):
+            (next_offset, sec, nsec, snaplen, _, status, mac, _, _, vlan_tci, vlan_tpid
+             ) = _FRAME_HEADER.unpack_from(view, position)
+            linktype = _LINKTYPES.get(_HATYPE.unpack_from(view, position + _SLL_HATYPE_OFFSET)[0], DLT_EN10MB)
+            start = position + mac
+            data = view[start:start + snaplen]
+            if status & TP_STATUS_VLAN_VALID and linktype == DLT_EN10MB and snaplen >= 12:
+                # Le noyau retire l'étiquette 802.1Q de la trame : on la réinsère (seule copie)
+                tpid = vlan_tpid if status & TP_STATUS_VLAN_TPID_VALID else 0x8100
+                data = b''.join((data[:12], struct.pack('!HH', tpid, vlan_tci & 0xffff), data[12:]))
+            frames.append((data, sec + nsec / 1e9, linktype))
+            position += next_offset
+        self.stats['blocks'] += 1
+        self.stats['frames'] += count
+        return frames
+
+    def read_kernel_stats(self):
+        """Cumule les compteurs du noyau (remis à zéro à chaque lecture)"""
+        with self._stats_lock:
+            if self._socket is None:
+                return
+            try:
+                packets, drops, freezes = _STATS.unpack(
+                    self._socket.getsockopt(SOL_PACKET, PACKET_STATISTICS, _STATS.size))
+            except OSError:
+                return
+            self.stats['packets'] += packets
+            self.stats['drops'] += drops
+            self.stats['freezes'] += freezes
+
+    def get_stats(self) -> Dict[str, Any]:
+        self.read_kernel_stats()
+        return {
+            'block_size': self.block_size,
+            'block_count': self.block_count,
+            **self.stats
+        }
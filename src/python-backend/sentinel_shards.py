@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Extraction des features par shards
+Chaque adresse appartient à un processus selon un hachage stable. Le shard
+propriétaire de la source d'un paquet calcule ses features propres et ses
+fenêtres par source (count, srv_count...) ; celui de sa destination, les
+agrégats dst_host_*. Les lots circulent en tableaux NumPy bruts
+"""
+
+import json
+import logging
+import signal
+import struct
+import time
+import zlib
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from sentinel_windows import SlidingWindowCounter
+
+# Préfixes des messages vers un shard ; un message vide demande l'arrêt
+CMD_STOP = b''
+CMD_SCHEMA = b'S'
+CMD_BATCH = b'B'
+# Premier message d'un shard, une fois prêt à compter
+READY = b'R'
+
+# Un paquet d'un lot : index des adresses dans la table de chaînes du lot, champs bruts
+# des en-têtes (tcp_flags = -1 hors TCP) et rôle du shard (bit 0 : source, bit 1 : destination)
+PACKET_DTYPE = np.dtype([
+    ('src', '<u4'), ('dst', '<u4'), ('dport', '<u2'), ('ip_proto', '<i2'), ('fragment', '<u4'),
+    ('tcp_flags', '<i2'), ('length', '<u4'), ('timestamp', '<f8'), ('role', 'u1')
+])
+ROLE_SOURCE, ROLE_DESTINATION = 1, 2
+# Colonnes rendues par un shard : celles du propriétaire de la source, puis de la destination
+SOURCE_COLUMNS = [
+    'land', 'src_bytes', 'protocol_type', 'service', 'flag', 'urgent', 'wrong_fragment',
+    'count', 'srv_count', 'same_srv_rate', 'diff_srv_rate'
+]
+HOST_COLUMNS = ['dst_host_count', 'dst_host_srv_count', 'dst_host_same_srv_rate', 'dst_host_diff_srv_rate']
+SHARD_COLUMNS = SOURCE_COLUMNS + HOST_COLUMNS
+# Ordre des protocoles et priorité des flags TCP, comme NetworkFeatureExtractor
+SHARD_PROTOCOLS = ['tcp', 'udp', 'icmp', 'other']
+SHARD_FLAGS = ['SYN', 'ACK', 'FIN', 'RST', 'PSH', 'URG', 'NONE']
+_TCP_BITS = (0x02, 0x10, 0x01, 0x04, 0x08, 0x20)  # SYN, ACK, FIN, RST, PSH, URG
+_TCP_URG = 0x20
+
+# En-tête d'un lot : longueur de la table de chaînes
+_BATCH_HEADER = struct.Struct('<I')
+
+
+def shard_of(address: str, shards: int) -> int:
+    """Shard propriétaire d'une adresse : crc32, identique d'un processus et d'un lancement à l'autre"""
+    return zlib.crc32(address.encode('utf-8')) % shards
+
+
+class _ShardExtractor:
+    """État d'un shard : fenêtres de ses sources et de ses destinations, tables d'encodage"""
+
+    def __init__(self, window_seconds: float):
+        self.sources = SlidingWindowCounter(window_seconds)
+        self.hosts = SlidingWindowCounter(window_seconds)
+        self.defaults: Optional[np.ndarray] = None
+
+    def set_schema(self, encoding: Dict[str, Any]):
+        """Codes du schéma en service : protocoles, services (par port), flags et valeurs par défaut"""
+        self.defaults = np.array(encoding['defaults'], dtype=np.float32)
+        self.protocol_codes = np.array(encoding['protocols'], dtype=np.float32)
+        self.service_codes = np.array(encoding['services'], dtype=np.float32)
+        self.flag_codes = np.array(encoding['flags'], dtype=np.float32)
+        self.other_service = len(encoding['services']) - 1
+        self.port_services = np.full(65536, self.other_service, dtype=np.int32)
+        for port, service in encoding['ports'].items():
+            self.port_services[int(port)] = service
+
+    def extract(self, strings: List[str], packets: np.ndarray) -> np.ndarray:
+        out = np.tile(self.defaults, (len(packets), 1))
+        col = {name: j for j, name in enumerate(SHARD_COLUMNS)}
+        # Features propres au paquet, vectorisées
+        ip_proto, fragment, tcp_flags = packets['ip_proto'], packets['fragment'], packets['tcp_flags']
+        protocol = np.select([ip_proto == 6, ip_proto == 17, ip_proto == 1], [0, 1, 2], 3)
+        protocol[fragment != 0] = 3
+        service = np.where(protocol <= 1, self.port_services[packets['dport']], self.other_service)
+        out[:, col['land']] = packets['src'] == packets['dst']
+        out[:, col['src_bytes']] = packets['length']
+        out[:, col['protocol_type']] = self.protocol_codes[protocol]
+        out[:, col['service']] = self.service_codes[service]
+        tcp = tcp_flags >= 0
+        flag = np.select([(tcp_flags & bit) != 0 for bit in _TCP_BITS], range(len(_TCP_BITS)), len(_TCP_BITS))
+        out[tcp, col['flag']] = self.flag_codes[flag[tcp]]
+        out[tcp, col['urgent']] = (tcp_flags[tcp] & _TCP_URG) != 0
+        out[tcp & (fragment > 0), col['wrong_fragment']] = 1
+
+        # Fenêtres, dans l'ordre du lot
+        sources, hosts = self.sources, self.hosts
+        count_col, host_col = col['count'], col['dst_host_count']
+        for i, (src, dst, timestamp, role, service_id) in enumerate(zip(
+                packets['src'].tolist(), packets['dst'].tolist(), packets['timestamp'].tolist(),
+                packets['role'].tolist(), service.tolist())):
+            if role & ROLE_SOURCE:
+                address = strings[src]
+                sources.add(timestamp, address, service_id)
+                count = sources.count(address)
+                srv_count = sources.count_sub(address, service_id)
+                same_srv_rate = srv_count / count
+                out[i, count_col:count_col + 4] = (count, srv_count, same_srv_rate, 1.0 - same_srv_rate)
+            if role & ROLE_DESTINATION:
+                address = strings[dst]
+                hosts.add(timestamp, address, service_id)
+                host_count = hosts.count(address)
+                service_count = hosts.count_sub(address, service_id)
+                same_srv_rate = service_count / host_count
+                out[i, host_col:host_col + 4] = (host_count, service_count, same_srv_rate, 1.0 - same_srv_rate)
+        return out
+
+
+def _shard_main(window_seconds: float, conn):
+    """Boucle d'un shard : schéma, puis pour chaque lot les colonnes SHARD_COLUMNS de ses paquets"""
+    # Ctrl+C est géré par le processus principal, qui arrête les shards proprement
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    extractor = _ShardExtractor(window_seconds)
+    try:
+        conn.send_bytes(READY)
+        while True:
+            message = conn.recv_bytes()
+            if message == CMD_STOP:
+                break
+            if message[:1] == CMD_SCHEMA:
+                extractor.set_schema(json.loads(message[1:]))
+                continue
+            (string_bytes,) = _BATCH_HEADER.unpack_from(message, 1)
+            offset = 1 + _BATCH_HEADER.size
+            strings = message[offset:offset + string_bytes].decode('utf-8').split('\0')
+            packets = np.frombuffer(message, dtype=PACKET_DTYPE, offset=offset + string_bytes)
+            conn.send_bytes(extractor.extract(strings, packets).tobytes())
+    except (EOFError, OSError):
+        # Processus principal disparu : plus personne à servir
+        pass
+
+
+class FeatureShards:
+    """Extraction des features de paquet répartie entre `shards` processus.
+
+    Chaque adresse a un shard propriétaire (crc32). Pour chaque lot, un shard
+    reçoit, dans l'ordre, les paquets dont il possède la source ou la
+    destination : il calcule les features propres et les fenêtres par source
+    des premiers, les agrégats dst_host_* des seconds. Toutes les fenêtres
+    d'une adresse vivent dans un seul shard : les features sont celles d'un
+    extracteur unique tant que les horodatages sont croissants. Le processus
+    principal ne fait qu'indexer les adresses du lot et rassembler les
+    colonnes. Un shard mort est relancé avec des fenêtres vides et son lot
+    lui est renvoyé.
+    """
+
+    def __init__(self, shards: int, window_seconds: float = 120.0, logger: Optional[logging.Logger] = None):
+        self.n_shards = max(1, shards)
+        self.window_seconds = window_seconds
+        self.logger = logger or logging.getLogger(__name__)
+        # spawn : un fork hériterait des threads de capture et de la boucle asyncio
+        self._context = get_context('spawn')
+        self.processes: List[Any] = [None] * self.n_shards
+        self.conns: List[Any] = [None] * self.n_shards
+        self.running = False
+        # Schéma transmis aux shards (renvoyé à un shard relancé)
+        self.schema_key: Any = None
+        self._schema_message: Optional[bytes] = None
+        self.stats = {
+            'batches': 0, 'rows': 0, 'restarts': 0, 'shard_ms': 0.0,
+            'rows_per_shard': [0] * self.n_shards, 'hosts_per_shard': [0] * self.n_shards
+        }
+
+    def start(self):
+        if self.running:
+            return
+        for shard in range(self.n_shards):
+            self._spawn(shard)
+        # Tous les processus démarrent en parallèle ; le premier lot ne paie pas leur lancement
+        for shard in range(self.n_shards):
+            self._wait_ready(shard)
+        self.running = True
+        self.logger.info(f"Extraction shardée: {self.n_shards} processus, partition par adresse")
+
+    def stop(self, timeout: float = 5.0):
+        if not self.running:
+            return
+        self.running = False
+        for shard, process in enumerate(self.processes):
+            try:
+                self.conns[shard].send_bytes(CMD_STOP)
+            except (OSError, AttributeError):
+                pass
+            if process is not None:
+                process.join(timeout=timeout)
+                if process.is_alive():
+                    process.terminate()
+        for conn in self.conns:
+            if conn is not None:
+                conn.close()
+        self.processes = [None] * self.n_shards
+        self.conns = [None] * self.n_shards
+
+    def set_schema(self, key: Any, encoding: Dict[str, Any]):
+        """Transmet aux shards les codes du schéma `key` (voir _ShardExtractor.set_schema)"""
+        self.schema_key = key
+        self._schema_message = CMD_SCHEMA + json.dumps(encoding).encode('utf-8')
+        for shard in range(self.n_shards):
+            self._send(shard, self._schema_message)
+
+    def extract(self, addresses: Sequence[str], packets: np.ndarray) -> np.ndarray:
+        """Colonnes SHARD_COLUMNS de chaque paquet du lot (PACKET_DTYPE, adresses indexées dans `addresses`)"""
+        started = time.perf_counter()
+        owners = np.array([shard_of(address, self.n_shards) for address in addresses], dtype=np.int32)
+        src_owner, dst_owner = owners[packets['src']], owners[packets['dst']]
+        string_bytes = '\0'.join(addresses).encode('utf-8')
+        prefix = CMD_BATCH + _BATCH_HEADER.pack(len(string_bytes)) + string_bytes
+        parts = []
+        for shard in range(self.n_shards):
+            is_source, is_destination = src_owner == shard, dst_owner == shard
+            indices = np.flatnonzero(is_source | is_destination)
+            if not len(indices):
+                parts.append(None)
+                continue
+            part = packets[indices]
+            part['role'] = is_source[indices] * ROLE_SOURCE + is_destination[indices] * ROLE_DESTINATION
+            message = prefix + part.tobytes()
+            self._send(shard, message)
+            parts.append((indices, part['role'], message))
+
+        values = np.empty((len(packets), len(SHARD_COLUMNS)), dtype=np.float32)
+        sources = len(SOURCE_COLUMNS)
+        for shard, part in enumerate(parts):
+            if part is None:
+                continue
+            indices, roles, message = part
+            block = self._receive(shard, message, len(indices))
+            owned = (roles & ROLE_SOURCE) != 0
+            values[indices[owned], :sources] = block[owned, :sources]
+            hosted = (roles & ROLE_DESTINATION) != 0
+            values[indices[hosted], sources:] = block[hosted, sources:]
+            self.stats['rows_per_shard'][shard] += int(owned.sum())
+            self.stats['hosts_per_shard'][shard] += int(hosted.sum())
+        self.stats['batches'] += 1
+        self.stats['rows'] += len(packets)
+        self.stats['shard_ms'] += (time.perf_counter() - started) * 1000.0
+        return values
+
+    def _receive(self, shard: int, message: bytes, rows: int) -> np.ndarray:
+        while True:
+            conn, process = self.conns[shard], self.processes[shard]
+            try:
+                if conn.poll(0.1):
+                    return np.frombuffer(conn.recv_bytes(), dtype=np.float32).reshape(rows, len(SHARD_COLUMNS))
+                if process.is_alive():
+                    continue
+            except (EOFError, OSError):
+                pass
+            self.logger.warning(f"Shard {shard} arrêté (code {process.exitcode}), relancé avec des fenêtres vides")
+            self.stats['restarts'] += 1
+            self._spawn(shard)
+            self._wait_ready(shard)
+            if self._schema_message is not None:
+                self._send(shard, self._schema_message)
+            self._send(shard, message)
+
+    def _wait_ready(self, shard: int, timeout: float = 30.0):
+        try:
+            if self.conns[shard].poll(timeout):
+                self.conns[shard].recv_bytes()
+        except (EOFError, OSError):
+            # Mort au démarrage : _receive le relancera au premier lot
+            pass
+
+    def _send(self, shard: int, message: bytes):
+        try:
+            self.conns[shard].send_bytes(message)
+        except (OSError, AttributeError):
+            # Shard mort : détecté et relancé par _receive, qui renvoie le lot
+            pass
+
+    def _spawn(self, shard: int):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_shard_main, name=f"sentinel-shard-{shard}", daemon=True,
+            args=(self.window_seconds, child_conn)
+        )
+        process.start()
+        child_conn.close()
+        if self.conns[shard] is not None:
+            self.conns[shard].close()
+        self.processes[shard] = process
+        self.conns[shard] = parent_conn
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats['batches']
+        return {
+            'shards': self.n_shards,
+            'alive': sum(1 for process in self.processes if process is not None and process.is_alive()),
+            'batches': batches,
+            'rows': self.stats['rows'],
+            'rows_per_shard': list(self.stats['rows_per_shard']),
+            'hosts_per_shard': list(self.stats['hosts_per_shard']),
+            'restarts': self.stats['restarts'],
+            'avg_shard_ms': round(self.stats['shard_ms'] / batches, 3) if batches else 0.0
+        }
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Fenêtres glissantes des features de trafic
+Compteurs par clé et sous-clé sur une fenêtre temporelle, partagés par
+l'extracteur du service et par les shards d'extraction
+"""
+
+from collections import deque
+from typing import Any, Dict
+
+
+class SlidingWindowCounter:
+    """Fenêtre glissante temporelle avec compteurs par clé et sous-clé.
+
+    Les entrées sont conservées dans l'ordre d'arrivée et expirées
+    incrémentalement : chaque ajout ou requête coûte O(1) amorti, quel que
+    soit le volume d'historique dans la fenêtre.
+    """
+
+    def __init__(self, window_seconds: float = 120.0):
+        self.window_seconds = window_seconds
+        self._entries = deque()  # (timestamp, clé, sous-clé)
+        self._totals: Dict[Any, int] = {}
+        self._subtotals: Dict[Any, Dict[Any, int]] = {}
+
+    def add(self, timestamp: float, key: Any, subkey: Any):
+        self.expire(timestamp)
+        self._entries.append((timestamp, key, subkey))
+        self._totals[key] = self._totals.get(key, 0) + 1
+        subtotals = self._subtotals.setdefault(key, {})
+        subtotals[subkey] = subtotals.get(subkey, 0) + 1
+
+    def expire(self, now: float):
+        """Retire les entrées sorties de la fenêtre (timestamp <= now - fenêtre)"""
+        cutoff = now - self.window_seconds
+        entries = self._entries
+        while entries and entries[0][0] <= cutoff:
+            _, key, subkey = entries.popleft()
+            remaining = self._totals[key] - 1
+            if remaining:
+                self._totals[key] = remaining
+                subtotals = self._subtotals[key]
+                if subtotals[subkey] > 1:
+                    subtotals[subkey] -= 1
+                else:
+                    del subtotals[subkey]
+            else:
+                # Plus aucune entrée pour cette clé : on libère son état
+                del self._totals[key]
+                del self._subtotals[key]
+
+    def count(self, key: Any) -> int:
+        return self._totals.get(key, 0)
+
+    def count_sub(self, key: Any, subkey: Any) -> int:
+        subtotals = self._subtotals.get(key)
+        return subtotals.get(subkey, 0) if subtotals else 0
+
+    def totals(self):
+        return self._totals.items()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Formats de diffusion des paquets
+Encodage JSON historique et trame binaire colonnaire négociée par client
+"""
+
+import json
+import struct
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Encodages proposés aux clients WebSocket (JSON reste le défaut)
+WIRE_ENCODINGS = ('json', 'columnar')
+
+COLUMNAR_MAGIC = b'SNTB'
+COLUMNAR_VERSION = 4
+FLAG_FEATURES = 0x01
+# Mode flux : identifiant de connexion et verdict en attente de chaque paquet
+FLAG_FLOWS = 0x02
+# Index de chaîne d'une valeur absente (None), rendue telle quelle au décodage
+NO_STRING = 0xffffffff
+
+# Bits du masque de flags TCP, dans l'ordre de PacketHeaders.tcp_flag_names
+TCP_FLAG_BITS = {'SYN': 0x01, 'ACK': 0x02, 'FIN': 0x04, 'RST': 0x08, 'PSH': 0x10, 'URG': 0x20}
+
+# En-tête : magic, version, flags, nombre de paquets, nombre de chaînes, nombre de features
+_HEADER = struct.Struct('<4sBBIIH')
+
+
+def strip_features(packet: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in packet.items() if key != 'features'}
+
+
+def encode_json_frame(packets: List[Dict[str, Any]]) -> str:
+    return json.dumps({'type': 'packets', 'data': packets})
+
+
+class _StringTable:
+    """Dictionnaire de chaînes : chaque valeur distincte n'est écrite qu'une fois par trame"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+
+    def code(self, value: Any) -> int:
+        if value is None:
+            return NO_STRING
+        value = str(value)
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.index)
+        return code
+
+    def to_bytes(self) -> bytes:
+        parts = []
+        for value in self.index:
+            raw = value.encode('utf-8')
+            if len(raw) > 0xffff:
+                # Coupe sur une frontière de caractère : un caractère multi-octets tronqué ne se décode plus
+                raw = raw[:0xffff].decode('utf-8', errors='ignore').encode('utf-8')
+            parts.append(struct.pack('<H', len(raw)))
+            parts.append(raw)
+        return b''.join(parts)
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def encode_columnar_frame(packets: List[Dict[str, Any]], include_features: bool = False) -> bytes:
+    """Encode un lot de paquets en trame binaire colonnaire.
+
+    Disposition (little-endian) : en-tête, table de chaînes (u16 longueur +
+    UTF-8), puis une colonne par champ. IP, protocoles, prédictions, niveaux
+    de menace, identifiants, aperçus de payload et interfaces sont des index u32 dans la
+    table de chaînes (NO_STRING pour None) ; les flags TCP sont un masque u8. Si demandé, un bloc
+    de features suit : noms et type de chaque colonne, puis une matrice
+    float32 paquets x features (colonnes catégorielles = index de chaîne).
+    En mode flux, un dernier bloc donne le flowId (index de chaîne) et
+    verdictPending (u8) de chaque paquet.
+    """
+    count = len(packets)
+    strings = _StringTable()
+    timestamps = np.empty(count, dtype='<f8')
+    sizes = np.empty(count, dtype='<u4')
+    ports = np.empty((count, 2), dtype='<u2')
+    scores = np.empty(count, dtype='<f4')
+    flags = np.zeros(count, dtype='u1')
+    # id, sourceIp, destinationIp, protocol, prediction, threat_level, payloadPreview, interface
+    codes = np.empty((count, 8), dtype='<u4')
+
+    for i, packet in enumerate(packets):
+        timestamps[i] = _timestamp(packet.get('timestamp'))
+        sizes[i] = packet.get('size', 0)
+        ports[i, 0] = packet.get('sourcePort', 0) or 0
+        ports[i, 1] = packet.get('destinationPort', 0) or 0
+        scores[i] = packet.get('anomaly_score', 0.0)
+        mask = 0
+        for flag in packet.get('flags', ()):
+            mask |= TCP_FLAG_BITS.get(flag, 0)
+        flags[i] = mask
+        codes[i] = (
+            strings.code(packet.get('id')), strings.code(packet.get('sourceIp')),
+            strings.code(packet.get('destinationIp')), strings.code(packet.get('protocol')),
+            strings.code(packet.get('prediction')), strings.code(packet.get('threat_level')),
+            strings.code(packet.get('payloadPreview')), strings.code(packet.get('interface'))
+        )
+
+    feature_block = b''
+    feature_names: List[str] = []
+    if include_features and count:
+        first = packets[0].get('features', {})
+        feature_names = list(first.keys())
+        kinds = np.array([isinstance(first[name], str) for name in feature_names], dtype='u1')
+        categorical = [j for j, kind in enumerate(kinds) if kind]
+        rows = []
+        for packet in packets:
+            features = packet.get('features', {})
+            values = [features.get(name, 0.0) for name in feature_names]
+            for j in categorical:
+                values[j] = strings.code(values[j])
+            rows.append(values)
+        matrix = np.array(rows, dtype='<f4')
+        name_codes = np.array([strings.code(name) for name in feature_names], dtype='<u4')
+        feature_block = name_codes.tobytes() + kinds.tobytes() + matrix.tobytes()
+
+    flow_block = b''
+    if count and 'flowId' in packets[0]:
+        flow_ids = np.array([
+            strings.code(packet.get('flowId')) for packet in packets
+        ], dtype='<u4')
+        pending = np.array([bool(packet.get('verdictPending')) for packet in packets], dtype='u1')
+        flow_block = flow_ids.tobytes() + pending.tobytes()
+
+    string_bytes = strings.to_bytes()
+    header = _HEADER.pack(
+        COLUMNAR_MAGIC, COLUMNAR_VERSION,
+        (FLAG_FEATURES if feature_names else 0) | (FLAG_FLOWS if flow_block else 0),
+        count, len(strings.index), len(feature_names)
+    )
+    return b''.join((
+        header, string_bytes, timestamps.tobytes(), sizes.tobytes(), ports.tobytes(),
+        scores.tobytes(), flags.tobytes(), codes.tobytes(), feature_block, flow_block
+    ))
+
+
+def decode_columnar_frame(data: bytes) -> List[Dict[str, Any]]:
+    """Décode une trame colonnaire (référence pour les clients et les benchmarks)"""
+    magic, version, frame_flags, count, string_count, feature_count = _HEADER.unpack_from(data, 0)
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError("Trame colonnaire invalide")
+    offset = _HEADER.size
+    strings = []
+    for _ in range(string_count):
+        (length,) = struct.unpack_from('<H', data, offset)
+        offset += 2
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+    def string(code: int) -> Optional[str]:
+        # Une catégorie NO_STRING relue depuis la matrice float32 arrondit au-dessus
+        return None if code >= NO_STRING else strings[code]
+
+    def column(dtype: str, shape: Tuple[int, ...]) -> np.ndarray:
+        nonlocal offset
+        array = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        offset += array.nbytes
+        return array
+
+    timestamps = column('<f8', (count,))
+    sizes = column('<u4', (count,))
+    ports = column('<u2', (count, 2))
+    scores = column('<f4', (count,))
+    flags = column('u1', (count,))
+    codes = column('<u4', (count, 8))
+    features = None
+    if frame_flags & FLAG_FEATURES:
+        names = [strings[code] for code in column('<u4', (feature_count,))]
+        kinds = column('u1', (feature_count,))
+        matrix = column('<f4', (count, feature_count))
+        features = (names, kinds, matrix)
+    flows = None
+    if frame_flags & FLAG_FLOWS:
+        flows = (column('<u4', (count,)), column('u1', (count,)))
+
+    packets = []
+    for i in range(count):
+        id_code, src, dst, protocol, prediction, threat_level, payload, interface = codes[i]
+        packet = {
+            'id': string(id_code),
+            'timestamp': datetime.fromtimestamp(float(timestamps[i])).isoformat(),
+            'size': int(sizes[i]),
+            'sourceIp': string(src), 'destinationIp': string(dst),
+            'sourcePort': int(ports[i, 0]), 'destinationPort': int(ports[i, 1]),
+            'protocol': string(protocol),
+            'flags': [flag for flag, bit in TCP_FLAG_BITS.items() if flags[i] & bit],
+            'payloadPreview': string(payload),
+            'prediction': string(prediction),
+            'anomaly_score': float(scores[i]),
+            'threat_level': string(threat_level),
+            'interface': string(interface)
+        }
+        if features is not None:
+            names, kinds, matrix = features
+            packet['features'] = {
+                name: string(int(value)) if kind else float(value)
+                for name, kind, value in zip(names, kinds, matrix[i])
+            }
+        if flows is not None:
+            packet['flowId'] = string(int(flows[0][i]))
+            packet['verdictPending'] = bool(flows[1][i])
+        packets.append(packet)
+    return packets
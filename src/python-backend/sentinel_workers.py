@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Sentinel IDS - Inférence multi-processus
+Des processus de travail, chacun avec sa propre copie du modèle, scorent les
+lots de features écrits dans un anneau de mémoire partagée : seuls des
+en-têtes de quelques octets passent par les pipes, jamais les lignes
+"""
+
+import logging
+import pickle
+import signal
+import struct
+import time
+from collections import deque
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from threading import Condition, Event, Thread
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sentinel_model import predict_proba
+
+# Commandes envoyées à un processus : premier octet, puis charge utile
+CMD_BATCH, CMD_MODEL, CMD_STOP = b'B', b'M', b'Q'
+# Lot à scorer : emplacement dans l'anneau, nombre de lignes
+_BATCH = struct.Struct('=II')
+# Réponse : emplacement, statut (0 = scoré), durée du calcul en ms
+_REPLY = struct.Struct('=IId')
+
+# Appelé dans l'ordre de soumission : (lignes, anomalies, scores, durée ms) ; anomalies None en cas d'échec
+Completion = Callable[[np.ndarray, Optional[np.ndarray], Optional[np.ndarray], float], None]
+
+
+def _ring_views(buffer, slots: int, rows: int, n_features: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Entrées float32 (emplacement, ligne, feature) puis sorties float64 (emplacement, ligne, [anomalie, score])"""
+    inputs = np.ndarray((slots, rows, n_features), dtype=np.float32, buffer=buffer)
+    outputs = np.ndarray((slots, rows, 2), dtype=np.float64, buffer=buffer, offset=inputs.nbytes)
+    return inputs, outputs
+
+
+def _ring_size(slots: int, rows: int, n_features: int) -> int:
+    return slots * rows * (n_features * 4 + 2 * 8)
+
+
+def _worker_main(shm_name: str, slots: int, rows: int, n_features: int, conn):
+    """Boucle d'un processus de travail : modèle reçu une fois, puis un lot par en-tête"""
+    # Ctrl+C est géré par le processus principal, qui arrête les workers proprement
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Le segment appartient au processus principal, qui le libère à l'arrêt du pool
+    shm = SharedMemory(name=shm_name)
+    inputs, outputs = _ring_views(shm.buf, slots, rows, n_features)
+    model = forest = None
+    try:
+        while True:
+            message = conn.recv_bytes()
+            command = message[:1]
+            if command == CMD_STOP:
+                break
+            if command == CMD_MODEL:
+                model, forest = pickle.loads(message[1:])
+                continue
+            slot, count = _BATCH.unpack_from(message, 1)
+            started = time.perf_counter()
+            status = 0
+            try:
+                matrix = inputs[slot, :count]
+                # Même évaluation que SentinelPacketCapture._predict_batch
+                if forest is not None and np.isfinite(matrix).all():
+                    probabilities = forest.predict_proba(matrix)
+                else:
+                    probabilities = predict_proba(model, matrix)
+                outputs[slot, :count, 0] = model.classes_[probabilities.argmax(axis=1)] == 1
+                outputs[slot, :count, 1] = probabilities[:, 1] if probabilities.shape[1] > 1 else probabilities[:, 0]
+            except Exception:
+                status = 1
+            conn.send_bytes(_REPLY.pack(slot, status, (time.perf_counter() - started) * 1000.0))
+    except (EOFError, OSError):
+        # Processus principal disparu : plus personne à servir
+        pass
+    finally:
+        del inputs, outputs
+        shm.close()
+
+
+class _Batch:
+    __slots__ = ('worker', 'slot', 'rows', 'callback', 'attempts')
+
+    def __init__(self, worker: Optional[int], slot: Optional[int], rows: int, callback: Completion):
+        self.worker = worker
+        self.slot = slot
+        self.rows = rows
+        self.callback = callback
+        self.attempts = 0
+
+
+class InferencePool:
+    """Pool de processus de scoring alimenté par un anneau de mémoire partagée.
+
+    Chaque processus possède `SLOTS_PER_WORKER` emplacements de `batch_rows`
+    lignes : le thread d'inférence y copie un lot et envoie un en-tête
+    (emplacement, lignes) ; le processus écrit anomalies et scores dans la
+    partie sortie du même emplacement. Un thread de collecte rend les
+    résultats dans l'ordre de soumission, quel que soit le processus le plus
+    rapide. Un processus mort est relancé et reçoit à nouveau le modèle et ses
+    lots en attente ; un lot qui le tue `MAX_ATTEMPTS` fois est abandonné.
+    """
+
+    SLOTS_PER_WORKER = 2
+    MAX_ATTEMPTS = 2
+
+    def __init__(self, workers: int, n_features: int, batch_rows: int = 256,
+                 logger: Optional[logging.Logger] = None):
+        self.n_workers = max(1, workers)
+        self.n_features = n_features
+        self.batch_rows = max(1, batch_rows)
+        self.slots = self.n_workers * self.SLOTS_PER_WORKER
+        self.logger = logger or logging.getLogger(__name__)
+        # spawn : un fork hériterait des threads de capture et de la boucle asyncio
+        self._context = get_context('spawn')
+        self.shm: Optional[SharedMemory] = None
+        self.inputs: Optional[np.ndarray] = None
+        self.outputs: Optional[np.ndarray] = None
+        self.processes: List[Any] = [None] * self.n_workers
+        self.conns: List[Any] = [None] * self.n_workers
+        self.free: List[Deque[int]] = [deque() for _ in range(self.n_workers)]
+        self.pending: Deque[_Batch] = deque()
+        self.cond = Condition()
+        self.running = Event()
+        self.collector: Optional[Thread] = None
+        self._next_worker = 0
+        self._model_payload: Optional[bytes] = None
+        self.stats = {'batches': 0, 'rows': 0, 'restarts': 0, 'failed_batches': 0, 'worker_ms': 0.0}
+
+    def start(self, model, forest=None):
+        if self.running.is_set():
+            return
+        self.shm = SharedMemory(create=True, size=_ring_size(self.slots, self.batch_rows, self.n_features))
+        self.inputs, self.outputs = _ring_views(self.shm.buf, self.slots, self.batch_rows, self.n_features)
+        self._model_payload = pickle.dumps((model, forest), protocol=pickle.HIGHEST_PROTOCOL)
+        with self.cond:
+            for worker in range(self.n_workers):
+                self.free[worker].extend(range(worker * self.SLOTS_PER_WORKER, (worker + 1) * self.SLOTS_PER_WORKER))
+                self._spawn(worker, send_model=False)
+            # Tous les processus démarrent en parallèle avant de recevoir le modèle
+            for worker in range(self.n_workers):
+                self._send(worker, CMD_MODEL + self._model_payload)
+        self.running.set()
+        self.collector = Thread(target=self._collect, daemon=True)
+        self.collector.start()
+        self.logger.info(f"Pool d'inférence: {self.n_workers} processus, {self.slots} emplacements de {self.batch_rows} lignes")
+
+    def stop(self, timeout: float = 5.0):
+        if not self.running.is_set():
+            return
+        self.drain(timeout)
+        self.running.clear()
+        with self.cond:
+            self.cond.notify_all()
+        if self.collector is not None:
+            self.collector.join(timeout=timeout)
+        for worker, process in enumerate(self.processes):
+            try:
+                self.conns[worker].send_bytes(CMD_STOP)
+            except (OSError, AttributeError):
+                pass
+            if process is not None:
+                process.join(timeout=timeout)
+                if process.is_alive():
+                    process.terminate()
+        for conn in self.conns:
+            if conn is not None:
+                conn.close()
+        self.processes = [None] * self.n_workers
+        self.conns = [None] * self.n_workers
+        self.free = [deque() for _ in range(self.n_workers)]
+        self.inputs = self.outputs = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Attend que tous les lots soumis aient été rendus"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while self.pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def set_model(self, model, forest=None):
+        """Nouveau modèle pour tous les processus, pris en compte après les lots déjà envoyés"""
+        payload = pickle.dumps((model, forest), protocol=pickle.HIGHEST_PROTOCOL)
+        with self.cond:
+            self._model_payload = payload
+            for worker in range(self.n_workers):
+                self._send(worker, CMD_MODEL + payload)
+
+    def submit(self, matrix: Optional[np.ndarray], callback: Completion):
+        """Copie le lot dans un emplacement libre et l'envoie à un processus ; bloque si tous sont occupés.
+
+        Un lot vide (None) ne va à aucun processus : son rappel est seulement
+        ordonné après ceux des lots déjà soumis.
+        """
+        rows = 0 if matrix is None else len(matrix)
+        if rows > self.batch_rows:
+            raise ValueError(f"Lot de {rows} lignes pour des emplacements de {self.batch_rows}")
+        with self.cond:
+            if not rows:
+                self.pending.append(_Batch(None, None, 0, callback))
+                self.cond.notify_all()
+                return
+            worker, slot = self._acquire_slot()
+            self.inputs[slot, :rows] = matrix
+            self.pending.append(_Batch(worker, slot, rows, callback))
+            self._send(worker, CMD_BATCH + _BATCH.pack(slot, rows))
+            self.cond.notify_all()
+
+    def call_in_order(self, callback: Callable[[], None]):
+        """Exécute `callback` dans le thread de collecte, après les rappels des lots déjà soumis"""
+        self.submit(None, lambda *_: callback())
+
+    def _acquire_slot(self) -> Tuple[int, int]:
+        # Appelé sous self.cond : tourniquet sur les processus ayant un emplacement libre
+        while True:
+            for offset in range(self.n_workers):
+                worker = (self._next_worker + offset) % self.n_workers
+                if self.free[worker]:
+                    self._next_worker = worker + 1
+                    return worker, self.free[worker].popleft()
+            self.cond.wait(0.1)
+
+    def _send(self, worker: int, message: bytes):
+        try:
+            self.conns[worker].send_bytes(message)
+        except OSError:
+            # Processus mort : le thread de collecte le relance et renvoie ses lots
+            pass
+
+    def _spawn(self, worker: int, send_model: bool = True):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name=f"sentinel-inference-{worker}", daemon=True,
+            args=(self.shm.name, self.slots, self.batch_rows, self.n_features, child_conn)
+        )
+        process.start()
+        child_conn.close()
+        if self.conns[worker] is not None:
+            self.conns[worker].close()
+        self.processes[worker] = process
+        self.conns[worker] = parent_conn
+        if send_model:
+            self._send(worker, CMD_MODEL + self._model_payload)
+
+    def _restart(self, worker: int, skip: Optional[_Batch] = None):
+        """Relance un processus mort et lui renvoie, dans l'ordre, ses lots sans réponse"""
+        with self.cond:
+            exitcode = self.processes[worker].exitcode if self.processes[worker] is not None else None
+            self.logger.warning(f"Processus d'inférence {worker} arrêté (code {exitcode}), relance")
+            self.stats['restarts'] += 1
+            self._spawn(worker)
+            for batch in self.pending:
+                if batch.worker == worker and batch is not skip:
+                    self._send(worker, CMD_BATCH + _BATCH.pack(batch.slot, batch.rows))
+
+    def _collect(self):
+        empty = np.empty((0, self.n_features), dtype=np.float32)
+        while True:
+            with self.cond:
+                while not self.pending and self.running.is_set():
+                    self.cond.wait(0.1)
+                if not self.pending:
+                    return
+                batch = self.pending[0]
+            rows = self.inputs[batch.slot, :batch.rows] if batch.rows else empty
+            anomalous = scores = None
+            worker_ms = 0.0
+            if batch.rows:
+                reply = self._wait_reply(batch)
+                if reply is not None:
+                    worker_ms = reply
+                    outputs = self.outputs[batch.slot, :batch.rows]
+                    anomalous = outputs[:, 0] > 0.5
+                    scores = outputs[:, 1].copy()
+                    self.stats['batches'] += 1
+                    self.stats['rows'] += batch.rows
+                    self.stats['worker_ms'] += worker_ms
+            else:
+                anomalous, scores = np.zeros(0, dtype=bool), np.zeros(0)
+            try:
+                batch.callback(rows, anomalous, scores, worker_ms)
+            except Exception as e:
+                self.logger.error(f"Erreur lors du traitement d'un lot scoré: {e}")
+            with self.cond:
+                self.pending.popleft()
+                if batch.slot is not None:
+                    self.free[batch.worker].append(batch.slot)
+                self.cond.notify_all()
+
+    def _wait_reply(self, batch: _Batch) -> Optional[float]:
+        """Durée du calcul en ms, ou None si le lot n'a pas pu être scoré"""
+        while True:
+            conn, process = self.conns[batch.worker], self.processes[batch.worker]
+            try:
+                if conn.poll(0.1):
+                    slot, status, worker_ms = _REPLY.unpack(conn.recv_bytes())
+                    if slot != batch.slot or status:
+                        self.stats['failed_batches'] += 1
+                        return None
+                    return worker_ms
+                if process.is_alive():
+                    continue
+            except (EOFError, OSError):
+                pass
+            batch.attempts += 1
+            give_up = batch.attempts >= self.MAX_ATTEMPTS
+            self._restart(batch.worker, skip=batch if give_up else None)
+            if give_up:
+                self.logger.error(f"Lot abandonné après {batch.attempts} arrêts du processus d'inférence")
+                self.stats['failed_batches'] += 1
+                return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats['batches']
+        return {
+            'workers': self.n_workers,
+            'alive': sum(1 for process in self.processes if process is not None and process.is_alive()),
+            'slots': self.slots,
+            'in_flight': len(self.pending),
+            'batches': batches,
+            'rows': self.stats['rows'],
+            'restarts': self.stats['restarts'],
+            'failed_batches': self.stats['failed_batches'],
+            'avg_worker_ms': round(self.stats['worker_ms'] / batches, 3) if batches else 0.0
+        }
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Les modules du service sont à plat dans le dossier parent
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def replay_pcap(tmp_path):
+    """Petit pcap : quelques sources vers quelques destinations et services, horodatages croissants"""
+    from scapy.all import IP, TCP, UDP, Ether, wrpcap
+
+    packets = []
+    for i in range(400):
+        layer = TCP(sport=1024 + i % 37, dport=(80, 443, 22)[i % 3], flags='S' if i % 5 == 0 else 'A')
+        if i % 7 == 0:
+            layer = UDP(sport=5353, dport=53)
+        packet = Ether() / IP(src=f'10.0.{i % 3}.{i % 11}', dst=f'192.168.1.{i % 5}') / layer
+        packet.time = 1700000000.0 + i * 0.01
+        packets.append(packet)
+    path = tmp_path / 'replay.pcap'
+    wrpcap(str(path), packets)
+    return str(path)
+
+
+@pytest.fixture
+def service_config(tmp_path):
+    """Configuration minimale d'un service de test : rien n'est écrit hors de tmp_path"""
+    return {
+        'log_level': 'WARNING', 'queue_policy': 'drop-oldest', 'max_packet_queue': 100000,
+        'verdict_cache_size': 0, 'dummy_model_path': str(tmp_path / 'dummy_model.joblib'),
+        'model_path': str(tmp_path / 'ids_model.joblib')
+    }
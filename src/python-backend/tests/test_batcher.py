@@ -0,0 +1,31 @@
+import threading
+import time
+
+import numpy as np
+
+from sentinel_capture import InferenceBatcher
+
+
+def test_latency_covers_asynchronous_scoring():
+    finished = threading.Event()
+
+    def score_batch(items, matrix, done):
+        # Comme le pool de processus : les verdicts arrivent plus tard, depuis un autre thread
+        def complete():
+            time.sleep(0.05)
+            done()
+            finished.set()
+        threading.Thread(target=complete).start()
+
+    batcher = InferenceBatcher(score_batch, n_features=4, batch_size=8, max_delay_ms=1.0)
+    batcher.start()
+    try:
+        for i in range(8):
+            batcher.submit(i, np.zeros(4, dtype=np.float32))
+        assert finished.wait(5)
+    finally:
+        batcher.stop()
+    stats = batcher.get_stats()
+    assert stats['batches_scored'] == 1
+    assert stats['last_batch_size'] == 8
+    assert stats['last_batch_latency_ms'] >= 50.0
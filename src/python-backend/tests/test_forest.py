@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import sentinel_forest
+from sentinel_forest import CompiledForest, cache_path, model_fingerprint
+
+RNG = np.random.default_rng(7)
+# Features continues et entières mélangées, comme les lignes KDD ; plus de CHUNK_ROWS lignes à scorer
+TRAIN = np.hstack([RNG.random((1500, 30)), RNG.integers(0, 70, (1500, 11))]).astype(np.float32)
+LABELS = (TRAIN[:, 0] + TRAIN[:, 31] / 70 + RNG.normal(0, 0.3, 1500) > 1.0).astype(int)
+ROWS = np.hstack([RNG.random((700, 30)), RNG.integers(0, 70, (700, 11))]).astype(np.float32)
+
+
+@pytest.fixture(scope='module')
+def model():
+    return RandomForestClassifier(n_estimators=25, min_samples_leaf=3, random_state=0).fit(TRAIN, LABELS)
+
+
+def test_predict_proba_is_identical_to_sklearn(model):
+    forest = CompiledForest.from_sklearn(model)
+    assert np.array_equal(forest.predict_proba(ROWS), model.predict_proba(ROWS))
+    assert np.array_equal(forest.predict_proba(ROWS[:1]), model.predict_proba(ROWS[:1]))
+
+
+def test_cache_round_trip_is_identical(model, tmp_path):
+    model_path = str(tmp_path / 'model.joblib')
+    fingerprint = model_fingerprint(model)
+    CompiledForest.from_sklearn(model).save(cache_path(model_path), fingerprint)
+    for mmap in (True, False):
+        forest = CompiledForest.load(cache_path(model_path), fingerprint, mmap=mmap)
+        assert np.array_equal(forest.predict_proba(ROWS), model.predict_proba(ROWS))
+    assert CompiledForest.load(cache_path(model_path), 'autre modèle') is None
+
+
+def _count_valued(model):
+    """Forêt dont tree_.value contient des effectifs, comme avant sklearn 1.4"""
+    estimators = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        counts = np.rint(tree.value * tree.weighted_n_node_samples[:, np.newaxis, np.newaxis])
+        estimators.append(SimpleNamespace(tree_=SimpleNamespace(
+            node_count=tree.node_count, max_depth=tree.max_depth, children_left=tree.children_left,
+            children_right=tree.children_right, feature=tree.feature, threshold=tree.threshold, value=counts,
+            apply=tree.apply
+        )))
+    return SimpleNamespace(estimators_=estimators, n_classes_=model.n_classes_, n_features_in_=model.n_features_in_)
+
+
+def _legacy_predict_proba(forest, X):
+    """predict_proba de sklearn < 1.4 : effectifs de la feuille normalisés arbre par arbre, puis moyenne"""
+    proba = np.zeros((len(X), forest.n_classes_))
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        leaf = tree.value[tree.apply(X), 0, :forest.n_classes_]
+        normalizer = leaf.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba += leaf / normalizer
+    return proba / len(forest.estimators_)
+
+
+def test_normalized_leaves_match_legacy_sklearn(model, monkeypatch):
+    monkeypatch.setattr(sentinel_forest, '_sklearn_normalizes_leaves', lambda: True)
+    legacy = _count_valued(model)
+    forest = CompiledForest.from_sklearn(legacy)
+    assert np.array_equal(forest.predict_proba(ROWS), _legacy_predict_proba(legacy, ROWS))
+    # Les effectifs normalisés redonnent les proportions de sklearn actuel
+    assert np.allclose(forest.predict_proba(ROWS), model.predict_proba(ROWS))
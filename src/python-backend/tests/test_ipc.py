@@ -0,0 +1,24 @@
+import asyncio
+
+from sentinel_ipc import FRAME_PACKETS, CaptureLink, RemoteSession
+
+
+def test_replies_bypass_full_link_buffer(tmp_path):
+    async def scenario():
+        # Processus de diffusion qui ne lit plus rien : le tampon d'écriture se remplit
+        server = await asyncio.start_unix_server(lambda reader, writer: None, path=str(tmp_path / 'ipc.sock'))
+        link = CaptureLink(str(tmp_path / 'ipc.sock'), max_buffer=1024)
+        _, link.writer = await asyncio.open_unix_connection(link.path)
+        while link.send(FRAME_PACKETS, b'x' * 65536):
+            pass
+        dropped = link.send(FRAME_PACKETS, b'x')
+        replied = RemoteSession(link, 7).enqueue('{"type": "model_info"}', droppable=False)
+        link.writer.close()
+        server.close()
+        return dropped, replied, link.stats
+
+    dropped, replied, stats = asyncio.run(scenario())
+    assert not dropped
+    assert replied
+    assert stats['replies_dropped'] == 0
+    assert stats['frames_dropped'] == 2
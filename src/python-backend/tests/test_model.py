@@ -0,0 +1,82 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from sentinel_capture import FEATURE_ORDER, FeatureSchema, SentinelPacketCapture
+from sentinel_model import ARTIFACT_VERSION, ModelValidationError, load_artifact, predict_proba, save_artifact
+
+ROWS = np.random.default_rng(0).random((200, len(FEATURE_ORDER)))
+LABELS = np.arange(200) % 2
+
+
+def _forest(X=ROWS, y=LABELS):
+    return RandomForestClassifier(n_estimators=3, max_depth=4, random_state=0).fit(X, y)
+
+
+def _save(tmp_path, model, **metadata):
+    path = str(tmp_path / 'model.joblib')
+    save_artifact(model, path, **metadata)
+    return path
+
+
+def test_named_artifact_loads_exact(tmp_path):
+    model, metadata = load_artifact(_save(tmp_path, _forest(), feature_names=FEATURE_ORDER), FEATURE_ORDER)
+    assert metadata['feature_order'] == 'exact'
+    assert metadata['feature_names'] == list(FEATURE_ORDER)
+    # Les noms restent dans les métadonnées : l'estimateur entraîné sans noms n'est pas modifié
+    assert not hasattr(model, 'feature_names_in_')
+
+
+def test_reordered_names_drive_the_schema(tmp_path):
+    names = list(reversed(FEATURE_ORDER))
+    model, metadata = load_artifact(_save(tmp_path, _forest(pd.DataFrame(ROWS, columns=names))), FEATURE_ORDER)
+    assert metadata['feature_order'] == 'reordered'
+    schema = FeatureSchema.from_model(model, names=metadata['feature_names'])
+    assert schema.names == names
+    batch = schema.new_batch(4)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert predict_proba(model, batch).shape == (4, 2)
+
+
+def test_pipeline_loads_without_touching_the_estimator(tmp_path, service_config):
+    pipeline = make_pipeline(StandardScaler(), _forest()).fit(pd.DataFrame(ROWS, columns=FEATURE_ORDER), LABELS)
+    path = _save(tmp_path, pipeline)
+    model, metadata = load_artifact(path, FEATURE_ORDER)
+    assert metadata['feature_names'] == list(FEATURE_ORDER)
+    assert predict_proba(model, FeatureSchema().new_batch(2)).shape == (2, 2)
+
+    service = SentinelPacketCapture(service_config)
+    assert service.load_model(path)
+    assert service.forest is None
+    assert service.get_model_info()['features'] == list(FEATURE_ORDER)
+
+
+def test_metadata_names_must_match_fitted_names(tmp_path):
+    model = _forest(pd.DataFrame(ROWS, columns=FEATURE_ORDER))
+    with pytest.raises(ModelValidationError):
+        load_artifact(_save(tmp_path, model, feature_names=list(reversed(FEATURE_ORDER))), FEATURE_ORDER)
+
+
+@pytest.mark.parametrize('model', [
+    _forest(ROWS[:, :10]),
+    _forest(pd.DataFrame(ROWS, columns=[f'f{i}' for i in range(len(FEATURE_ORDER))])),
+    RandomForestRegressor(n_estimators=2, random_state=0).fit(ROWS, LABELS),
+    _forest(y=np.arange(200) % 3),
+    _forest(y=np.where(LABELS == 1, 'anomaly', 'normal')),
+    _forest(y=LABELS + 1),
+], ids=['feature-count', 'unknown-names', 'regressor', 'multiclass', 'string-labels', 'labels-1-2'])
+def test_invalid_models_are_refused(tmp_path, model):
+    with pytest.raises(ModelValidationError):
+        load_artifact(_save(tmp_path, model), FEATURE_ORDER)
+
+
+def test_newer_format_is_refused(tmp_path):
+    path = _save(tmp_path, _forest(), format_version=ARTIFACT_VERSION + 1)
+    with pytest.raises(ModelValidationError, match='trop récent'):
+        load_artifact(path, FEATURE_ORDER)
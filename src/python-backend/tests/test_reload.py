@@ -0,0 +1,60 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from sentinel_capture import FEATURE_ORDER, SentinelPacketCapture
+from sentinel_model import save_artifact
+
+
+def _publish_model(path, version):
+    rng = np.random.default_rng(0)
+    model = RandomForestClassifier(n_estimators=3, max_depth=4, random_state=0)
+    model.fit(rng.random((200, len(FEATURE_ORDER))), np.arange(200) % 2)
+    save_artifact(model, path, feature_names=FEATURE_ORDER, version=version)
+
+
+def _reload(service):
+    async def reload():
+        assert service.request_model_reload('test')
+        await service._reload_task
+
+    asyncio.run(reload())
+
+
+def test_reload_applies_after_replay_finishes(replay_pcap, service_config):
+    service = SentinelPacketCapture({**service_config, 'pcap': replay_pcap})
+    _publish_model(service_config['model_path'], 'v1')
+    assert service.load_model(service_config['model_path'])
+    service.start_capture()
+    try:
+        for source in service.sources:
+            source.thread.join(timeout=30)
+        # Rejeu terminé, capture toujours active : plus aucun thread de capture
+        assert service.replay_stats['finished'] and service.is_capturing.is_set()
+        previous, generation = service.model, service.model_generation
+        _publish_model(service_config['model_path'], 'v2')
+        _reload(service)
+        deadline = time.monotonic() + 10
+        while service.model_generation == generation and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert service.model_generation == generation + 1
+        assert service.model is not previous and service.model.version == 'v2'
+        assert service._pending_release is None
+    finally:
+        service.stop_capture()
+
+
+def test_reload_refuses_missing_file(service_config):
+    service = SentinelPacketCapture(service_config)
+    _publish_model(service_config['model_path'], 'v1')
+    assert service.load_model(service_config['model_path'])
+    previous, generation = service.model, service.model_generation
+    os.remove(service_config['model_path'])
+    _reload(service)
+    # Pas de repli sur le modèle factice : le modèle en service est conservé
+    assert service.model is previous and service.model_generation == generation
+    assert service.reload_stats['failed'] == 1 and service.reload_stats['reloads'] == 0
+    assert not getattr(service.model, 'is_dummy', False)
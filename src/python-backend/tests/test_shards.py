@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from scapy.all import rdpcap
+
+from sentinel_capture import FEATURE_ORDER, FeatureSchema, NetworkFeatureExtractor
+from sentinel_decode import decode_packet
+from sentinel_shards import FeatureShards
+
+
+def _reference(headers, window_seconds, schema):
+    extractor = NetworkFeatureExtractor(window_seconds, schema)
+    matrix = schema.new_batch(len(headers))
+    for packet, row in zip(headers, matrix):
+        extractor.extract_features_into(packet, row)
+    return matrix
+
+
+def _sharded(headers, window_seconds, schema, shards, batch_size=64):
+    extractor = NetworkFeatureExtractor(window_seconds, schema)
+    matrix = schema.new_batch(len(headers))
+    for i in range(0, len(headers), batch_size):
+        extractor.extract_batch_into(headers[i:i + batch_size], matrix[i:i + batch_size], shards, schema)
+    return matrix
+
+
+@pytest.mark.parametrize('window_seconds', [120.0, 0.5])
+def test_sharded_features_match_single_extractor(replay_pcap, window_seconds):
+    headers = [decode_packet(packet) for packet in rdpcap(replay_pcap)]
+    # Colonnes dans un autre ordre et catégories partielles, comme un modèle réentraîné
+    schema = FeatureSchema(list(reversed(FEATURE_ORDER)), {
+        'protocol_type': ['tcp', 'udp'], 'service': ['http', 'domain_u'], 'flag': ['SYN', 'ACK']
+    })
+    expected = _reference(headers, window_seconds, schema)
+    for count in (1, 2, 3):
+        shards = FeatureShards(count, window_seconds)
+        shards.start()
+        try:
+            np.testing.assert_array_equal(_sharded(headers, window_seconds, schema, shards), expected)
+            stats = shards.get_stats()
+        finally:
+            shards.stop()
+        assert sum(stats['rows_per_shard']) == sum(stats['hosts_per_shard']) == len(headers)
+
+
+def test_dead_shard_is_restarted(replay_pcap):
+    headers = [decode_packet(packet) for packet in rdpcap(replay_pcap)]
+    schema = FeatureSchema()
+    shards = FeatureShards(2)
+    shards.start()
+    try:
+        _sharded(headers[:100], 120.0, schema, shards)
+        shards.processes[0].kill()
+        shards.processes[0].join()
+        matrix = _sharded(headers[100:], 120.0, schema, shards)
+        stats = shards.get_stats()
+    finally:
+        shards.stop()
+    assert stats['restarts'] == 1
+    # Fenêtres perdues, mais les features propres aux paquets restent exactes
+    expected = _reference(headers[100:], 120.0, schema)
+    assert np.array_equal(matrix[:, schema.index['service']], expected[:, schema.index['service']])
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from sentinel_capture import SentinelPacketCapture, Subscription
+
+
+def _packet(**fields):
+    packet = {
+        'protocol': 'TCP', 'sourceIp': '10.0.0.1', 'destinationIp': '192.168.1.1', 'sourcePort': 40000,
+        'destinationPort': 80, 'interface': 'eth0', 'prediction': 'Normal', 'anomaly_score': 0.1
+    }
+    packet.update(fields)
+    return packet
+
+
+@pytest.mark.parametrize('streams, filters, kept, dropped', [
+    (['anomalies'], {}, {'prediction': 'Anomalie'}, {}),
+    (['packets'], {'protocol': 'udp'}, {'protocol': 'UDP'}, {}),
+    (['packets'], {'cidr': ['192.168.0.0/16']}, {}, {'destinationIp': '172.16.0.1'}),
+    (['packets'], {'port': [22, 443]}, {'sourcePort': 443}, {}),
+    (['packets'], {'interface': 'eth1'}, {'interface': 'eth1'}, {}),
+    (['packets'], {'min_anomaly_score': 0.5}, {'anomaly_score': 0.7}, {}),
+])
+def test_select_applies_predicates(streams, filters, kept, dropped):
+    subscription = Subscription(streams, filters)
+    kept, dropped = _packet(**kept), _packet(**dropped)
+    assert subscription.select([kept, dropped], {}) == [kept]
+
+
+def test_unknown_filter_is_refused():
+    with pytest.raises(ValueError):
+        Subscription(['packets'], {'color': 'red'})
+
+
+def test_max_rate_caps_each_stream():
+    subscription = Subscription(['packets', 'flows'], {'max_rate': 5})
+    packets = [_packet() for _ in range(20)]
+    assert len(subscription.select(packets, {})) == 5
+    assert subscription.select(packets, {}) == []
+    # Les enregistrements de flux ont leur propre seau
+    assert len(subscription.select(packets, {}, stream='flows')) == 5
+
+
+class _Session:
+    def __init__(self, subscription, include_features=False):
+        self.subscription = subscription
+        self.include_features = include_features
+        self.sent = []
+
+    def enqueue(self, message):
+        self.sent.append(json.loads(message))
+
+
+def test_flows_honour_filters_and_max_rate(service_config):
+    service = SentinelPacketCapture(service_config)
+    subscription = Subscription(['flows'], {'protocol': 'TCP', 'max_rate': 3})
+    # Deux clients du même abonnement, l'un avec les features : un seul seau pour le groupe
+    sessions = [_Session(subscription), _Session(subscription, include_features=True)]
+    service.connected_clients = {index: session for index, session in enumerate(sessions)}
+    records = [_packet(flowId=f'f{i}', features={}) for i in range(10)] + [_packet(protocol='UDP')]
+    service._broadcast_flows(records)
+    for session in sessions:
+        assert [len(message['data']) for message in session.sent] == [3]
+        assert all(record['protocol'] == 'TCP' for record in session.sent[0]['data'])
+    service._broadcast_flows(records)
+    assert [len(message['data']) for message in sessions[0].sent] == [3]
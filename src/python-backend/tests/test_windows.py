@@ -0,0 +1,43 @@
+import random
+
+import numpy as np
+
+from sentinel_capture import NetworkFeatureExtractor
+
+
+class ListHistory:
+    """Référence : listes par source filtrées à chaque connexion, comme l'extracteur d'origine"""
+
+    def __init__(self, window_seconds):
+        self.window_seconds = window_seconds
+        self.connections = {}
+
+    def add(self, now, src_ip, service):
+        cutoff = now - self.window_seconds
+        kept = [conn for conn in self.connections.get(src_ip, []) if conn['time'] > cutoff]
+        kept.append({'time': now, 'service': service})
+        self.connections[src_ip] = kept
+
+    def features(self, src_ip, service):
+        connections = self.connections[src_ip]
+        same_service = [conn for conn in connections if conn['service'] == service]
+        same_srv_rate = len(same_service) / len(connections)
+        return [len(connections), len(same_service), same_srv_rate, 1.0 - same_srv_rate]
+
+
+def test_traffic_features_match_list_reference():
+    rng = random.Random(1)
+    extractor = NetworkFeatureExtractor(window_seconds=120.0)
+    reference = ListHistory(120.0)
+    columns = [extractor.schema.index[name] for name in ('count', 'srv_count', 'same_srv_rate', 'diff_srv_rate')]
+    row = extractor.schema.new_row()
+    now = 1700000000.0
+    for _ in range(20000):
+        # Pas multiples de 0,5 s : des entrées tombent exactement sur la borne de la fenêtre
+        now += rng.choice((0.0, 0.0, 0.5, 1.0, 4.0))
+        src_ip = f'10.0.0.{rng.randrange(40)}'
+        service = rng.choice(('http', 'ssh', 'domain_u', 'smtp'))
+        extractor._update_connection_history(src_ip, '192.168.1.1', service, 'tcp', now)
+        extractor._write_traffic_features(row, src_ip, service)
+        reference.add(now, src_ip, service)
+        assert row[columns].tolist() == np.array(reference.features(src_ip, service), dtype=np.float32).tolist()
@@ -0,0 +1,45 @@
+from sentinel_wire import decode_columnar_frame, encode_columnar_frame
+
+
+def _packet(i, **extra):
+    packet = {
+        'id': f'pkt_{i}', 'timestamp': '2024-01-01T12:00:00', 'size': 60 + i,
+        'sourceIp': '10.0.0.1', 'destinationIp': '10.0.0.2', 'sourcePort': 1000 + i, 'destinationPort': 80,
+        'protocol': 'TCP', 'flags': ['SYN'], 'payloadPreview': '', 'prediction': 'Normal',
+        'anomaly_score': 0.25, 'threat_level': 'Informationnel', 'interface': 'eth0',
+        'features': {'duration': 0.0, 'service': 'http'}
+    }
+    packet.update(extra)
+    return packet
+
+
+def test_columnar_round_trip():
+    packets = [_packet(i) for i in range(3)]
+    decoded = decode_columnar_frame(encode_columnar_frame(packets, include_features=True))
+    assert decoded == packets
+
+
+def test_columnar_keeps_flow_fields():
+    packets = [
+        _packet(0, flowId='flow_1', verdictPending=True),
+        _packet(1, flowId='flow_1', verdictPending=False),
+        _packet(2, flowId=None, verdictPending=True)
+    ]
+    decoded = decode_columnar_frame(encode_columnar_frame(packets))
+    assert [(p['flowId'], p['verdictPending']) for p in decoded] == [
+        ('flow_1', True), ('flow_1', False), (None, True)
+    ]
+    assert all('flowId' not in p for p in decode_columnar_frame(encode_columnar_frame([_packet(0)])))
+
+
+def test_columnar_keeps_nulls_like_json():
+    packets = [_packet(0, interface=None, payloadPreview=None)]
+    decoded = decode_columnar_frame(encode_columnar_frame(packets, include_features=True))
+    assert decoded == packets
+
+
+def test_long_string_is_cut_on_a_character_boundary():
+    # 0xffff octets tombent au milieu d'un caractère de 2 octets
+    preview = 'é' * 40000
+    decoded = decode_columnar_frame(encode_columnar_frame([_packet(0, payloadPreview=preview)]))
+    assert decoded[0]['payloadPreview'] == 'é' * 32767